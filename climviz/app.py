@@ -1,3 +1,5 @@
+import uuid
+
 import dash
 import dash_mantine_components as dmc
 from dash import (
@@ -12,8 +14,14 @@ from dash import (
     State,
 )
 from dash_iconify import DashIconify
+from flask import g, request
 
+from climviz.helpers.archive import archive
+from climviz.helpers.datasets import datasets
+from climviz.helpers.export import register_export_routes
 from climviz.helpers.layout import create_appshell, make_footer, make_navbar
+from climviz.models.execution import execution_metrics
+from climviz.models.scheduler import current_session
 
 # Initialize the Dash app
 _dash_renderer._set_react_version("18.2.0")
@@ -25,6 +33,33 @@ app = Dash(
     suppress_callback_exceptions=True,
 )
 
+# Streaming download endpoint for server-side datasets and archived sweeps
+register_export_routes(app.server, sources=(datasets, archive))
+
+
+# Sessions, for the per-session limits of the model scheduler
+SESSION_COOKIE = "climviz-session"
+
+
+@app.server.before_request
+def bind_session():
+    g.session = request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
+    current_session.set(g.session)
+
+
+@app.server.after_request
+def keep_session(response):
+    if request.cookies.get(SESSION_COOKIE) != g.get("session"):
+        response.set_cookie(SESSION_COOKIE, g.session, httponly=True, samesite="Lax")
+    return response
+
+
+# Counters of model executions (including coalesced duplicate requests)
+@app.server.route("/metrics/models")
+def model_metrics():
+    return execution_metrics()
+
+
 theme_toggle = dmc.Switch(
     offLabel=DashIconify(
         icon="radix-icons:sun", width=15, color=dmc.DEFAULT_THEME["colors"]["yellow"][8]
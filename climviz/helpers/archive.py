@@ -0,0 +1,510 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+from climviz.helpers.export import flatten_metadata
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+# Where the sweep archive lives on disk
+ARCHIVE_DIR = Path(
+    os.environ.get("CLIMVIZ_ARCHIVE_DIR", Path.home() / ".climviz" / "archive")
+)
+
+# Table column name -> archived variable (one value per sweep cell)
+SCALAR_COLUMNS = {
+    "OLR": "OLR",
+    "ASR": "ASR",
+    "Net Flux": "net_flux",
+    "Equilibrium Surface Temperature": "Ts_eq",
+}
+TABLE_COLUMNS = [
+    "param1_label",
+    "param2_label",
+    "param1_value",
+    "param2_value",
+    *SCALAR_COLUMNS,
+]
+
+# Vertical profiles stored for every sweep cell, with their vertical dimension
+PROFILE_VARIABLES = {
+    "Tatm": "lev",
+    "LW_flux_up": "lev_bounds",
+    "LW_flux_down": "lev_bounds",
+    "SW_flux_up": "lev_bounds",
+    "SW_flux_down": "lev_bounds",
+}
+
+# Per-row flag (1 when the row is written) used to resume interrupted sweeps
+COMPLETED_VARIABLE = "completed"
+
+
+class DatasetBusyError(RuntimeError):
+    """
+    A sweep is already being written (by another writer of this process).
+    """
+
+
+class _ZarrStore:
+    """
+    Minimal writer for a chunked, compressed Zarr group readable by xarray.
+    """
+
+    suffix = ".zarr"
+
+    def __init__(self, path: Path, attrs: dict | None = None):
+        # Without attrs, reopen an existing group to fill it further
+        self.path = path
+        self.group = zarr.open_group(str(path), mode="w" if attrs else "r+")
+        if attrs:
+            self.group.attrs.update(attrs)
+
+    def create_coordinate(self, name: str, values: np.ndarray):
+        array = self.group.create_array(
+            name, shape=values.shape, dtype=values.dtype, dimension_names=[name]
+        )
+        array[:] = values
+
+    def create_variable(
+        self,
+        name: str,
+        dims: tuple,
+        shape: tuple,
+        chunks: tuple,
+        dtype="f8",
+        fill_value=np.nan,
+    ):
+        self.group.create_array(
+            name,
+            shape=shape,
+            chunks=chunks,
+            dtype=dtype,
+            fill_value=fill_value,
+            dimension_names=list(dims),
+        )
+
+    def write(self, name: str, index, values):
+        self.group[name][index] = values
+
+    def read(self, name: str) -> np.ndarray:
+        return self.group[name][:] if name in self.group else None
+
+    def checkpoint(self):
+        # Array writes are stored as soon as they are made
+        pass
+
+    def sync(self):
+        zarr.consolidate_metadata(str(self.path))
+
+    def close(self):
+        self.sync()
+
+
+class _NetCDFStore:
+    """
+    Same interface as _ZarrStore, backed by a chunked, compressed NetCDF4 file.
+    """
+
+    suffix = ".nc"
+
+    def __init__(self, path: Path, attrs: dict | None = None):
+        self.path = path
+        self.nc = netCDF4.Dataset(str(path), "w" if attrs else "a")
+        if attrs:
+            self.nc.setncatts(attrs)
+
+    def create_coordinate(self, name: str, values: np.ndarray):
+        self.nc.createDimension(name, len(values))
+        self.nc.createVariable(name, values.dtype, (name,))[:] = values
+
+    def create_variable(
+        self,
+        name: str,
+        dims: tuple,
+        shape: tuple,
+        chunks: tuple,
+        dtype="f8",
+        fill_value=np.nan,
+    ):
+        self.nc.createVariable(
+            name, dtype, dims, zlib=True, chunksizes=chunks, fill_value=fill_value
+        )
+
+    def write(self, name: str, index, values):
+        self.nc[name][index] = values
+
+    def read(self, name: str) -> np.ndarray:
+        return self.nc[name][:].filled() if name in self.nc.variables else None
+
+    def checkpoint(self):
+        self.nc.sync()
+
+    def sync(self):
+        self.nc.sync()
+
+    def close(self):
+        self.nc.close()
+
+
+class SweepWriter:
+    """
+    Incremental writer for one sweep, filled one param1 row at a time.
+
+    Every row is checkpointed: it is flagged in the COMPLETED_VARIABLE mask once
+    all its values are written, so an interrupted sweep can be resumed (see
+    SweepArchive.resume) by computing only the rows still missing.
+    """
+
+    def __init__(self, store, dataset_id: str, shape: tuple[int, int], on_close=None):
+        self.store = store
+        self.dataset_id = dataset_id
+        self.shape = shape
+        self.on_close = on_close
+
+    def write_row(self, i: int, values: dict):
+        """
+        Write row i of the sweep. values maps variable names to arrays of shape
+        (n2,) for scalars or (n2, n_vertical) for profiles.
+        """
+        for name, row in values.items():
+            self.store.write(name, i, np.asarray(row))
+        self.store.write(COMPLETED_VARIABLE, i, 1)
+        # Only the data is flushed: the metadata is consolidated on close
+        self.store.checkpoint()
+
+    def completed_rows(self) -> np.ndarray:
+        """
+        Boolean mask of the rows already written.
+        """
+        completed = self.store.read(COMPLETED_VARIABLE)
+        if completed is None:
+            # Sweeps archived before checkpointing were only kept when complete
+            return np.ones(self.shape[0], dtype=bool)
+        return np.asarray(completed) == 1
+
+    @property
+    def missing_rows(self) -> list[int]:
+        return np.flatnonzero(~self.completed_rows()).tolist()
+
+    def close(self):
+        try:
+            self.store.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+
+class SweepArchive:
+    """
+    On-disk archive of sensitivity sweeps.
+
+    Each sweep is a chunked, compressed Zarr group (or NetCDF4 file when zarr is
+    not installed) with the scalar results on the (param1, param2) grid and the
+    full vertical profiles of every cell. Datasets are opened lazily, so only the
+    slices that are displayed are ever read. A sweep has at most one writer at a
+    time: create and resume raise DatasetBusyError while it is being written.
+    """
+
+    def __init__(self, root: Path | str = ARCHIVE_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._writing = set()
+
+    def _claim_writer(self, dataset_id: str):
+        # Called with self._lock held
+        if dataset_id in self._writing:
+            raise DatasetBusyError(f"Sweep {dataset_id!r} is already being written")
+        self._writing.add(dataset_id)
+
+    def _release_writer(self, dataset_id: str):
+        with self._lock:
+            self._writing.discard(dataset_id)
+
+    def is_writing(self, dataset_id: str) -> bool:
+        with self._lock:
+            return dataset_id in self._writing
+
+    @property
+    def store_class(self):
+        if zarr is not None:
+            return _ZarrStore
+        if netCDF4 is not None:
+            return _NetCDFStore
+        raise ImportError("The sweep archive needs either zarr or netCDF4.")
+
+    def _path(self, dataset_id: str) -> Path | None:
+        for store_class in (_ZarrStore, _NetCDFStore):
+            path = self.root / f"{dataset_id}{store_class.suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return self._path(dataset_id) is not None
+
+    def create(
+        self,
+        name: str,
+        param1: str,
+        values1,
+        param2: str,
+        values2,
+        lev,
+        lev_bounds,
+        metadata: dict | None = None,
+        dataset_id: str | None = None,
+        owner: str | None = None,
+    ) -> SweepWriter:
+        """
+        Create an empty sweep on disk and return a writer to fill it. owner
+        (e.g. the session creating it) restricts list_datasets.
+        """
+        if dataset_id is None:
+            dataset_id = uuid.uuid4().hex
+        metadata = metadata or {}
+        values1 = np.asarray(values1, dtype=float)
+        values2 = np.asarray(values2, dtype=float)
+        lev = np.asarray(lev, dtype=float)
+        lev_bounds = np.asarray(lev_bounds, dtype=float)
+
+        attrs = {
+            **flatten_metadata(metadata),
+            "name": name,
+            "param1_label": param1,
+            "param2_label": param2,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "metadata": json.dumps(metadata),
+        }
+        if owner is not None:
+            attrs["owner"] = owner
+
+        store_class = self.store_class
+        with self._lock:
+            self._claim_writer(dataset_id)
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                store = store_class(
+                    self.root / f"{dataset_id}{store_class.suffix}", attrs
+                )
+            except BaseException:
+                self._writing.discard(dataset_id)
+                raise
+
+        store.create_coordinate("param1", values1)
+        store.create_coordinate("param2", values2)
+        store.create_coordinate("lev", lev)
+        store.create_coordinate("lev_bounds", lev_bounds)
+
+        # One param1 row per chunk, as the rows are written one at a time
+        n1, n2 = len(values1), len(values2)
+        for var in SCALAR_COLUMNS.values():
+            store.create_variable(var, ("param1", "param2"), (n1, n2), (1, n2))
+        for var, vertical in PROFILE_VARIABLES.items():
+            n_vertical = len(lev) if vertical == "lev" else len(lev_bounds)
+            store.create_variable(
+                var,
+                ("param1", "param2", vertical),
+                (n1, n2, n_vertical),
+                (1, n2, n_vertical),
+            )
+        store.create_variable(
+            COMPLETED_VARIABLE, ("param1",), (n1,), (n1,), dtype="i1", fill_value=0
+        )
+        # Make the empty sweep readable (and resumable) straight away
+        store.sync()
+
+        return SweepWriter(
+            store, dataset_id, (n1, n2), lambda: self._release_writer(dataset_id)
+        )
+
+    def resume(self, dataset_id: str) -> SweepWriter:
+        """
+        Reopen an archived sweep to write its missing rows.
+        """
+        path = self._path(dataset_id)
+        if path is None:
+            raise KeyError(dataset_id)
+        store_class = _ZarrStore if path.suffix == _ZarrStore.suffix else _NetCDFStore
+        with self._lock:
+            self._claim_writer(dataset_id)
+        try:
+            store = store_class(path)
+            with self.open(dataset_id) as ds:
+                shape = (ds.sizes["param1"], ds.sizes["param2"])
+        except BaseException:
+            self._release_writer(dataset_id)
+            raise
+        return SweepWriter(
+            store, dataset_id, shape, lambda: self._release_writer(dataset_id)
+        )
+
+    def open(self, dataset_id: str) -> xr.Dataset:
+        """
+        Open a sweep lazily; data is only read when a slice is accessed.
+        """
+        path = self._path(dataset_id)
+        if path is None:
+            raise KeyError(dataset_id)
+
+        engine = "zarr" if path.suffix == ".zarr" else "netcdf4"
+        return xr.open_dataset(path, engine=engine, chunks=None, cache=False)
+
+    def list_datasets(self, owner: str | None = None) -> list[dict]:
+        """
+        Id, name and creation time of every archived sweep (of an owner when
+        given), newest first.
+        """
+        if not self.root.exists():
+            return []
+
+        entries = []
+        for path in self.root.iterdir():
+            if path.suffix not in (_ZarrStore.suffix, _NetCDFStore.suffix):
+                continue
+            try:
+                with self.open(path.stem) as ds:
+                    if owner is not None and ds.attrs.get("owner") != owner:
+                        continue
+                    entries.append(
+                        {
+                            "id": path.stem,
+                            "name": ds.attrs.get("name", path.stem),
+                            "created": ds.attrs.get("created", ""),
+                        }
+                    )
+            except (OSError, ValueError, KeyError):
+                # Skip sweeps that are still being created or are corrupted
+                continue
+
+        return sorted(entries, key=lambda entry: entry["created"], reverse=True)
+
+    def owner(self, dataset_id: str) -> str | None:
+        with self.open(dataset_id) as ds:
+            return ds.attrs.get("owner")
+
+    def delete(self, dataset_id: str) -> None:
+        path = self._path(dataset_id)
+        if path is None:
+            return
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+
+    def content_hash(self, dataset_id: str) -> str:
+        """
+        Hash of the content of a sweep: its identity and the rows written so
+        far (rows are written once, so they determine the data).
+        """
+        with self.open(dataset_id) as ds:
+            digest = hashlib.sha256(
+                json.dumps([ds.attrs.get("created", ""), dict(ds.sizes)]).encode()
+            )
+            if COMPLETED_VARIABLE in ds:
+                digest.update(np.ascontiguousarray(ds[COMPLETED_VARIABLE]).tobytes())
+        return digest.hexdigest()[:16]
+
+    # Tabular access, same interface as the DatasetRegistry (used by exports)
+    def columns(self, dataset_id: str) -> list[str]:
+        return TABLE_COLUMNS
+
+    def metadata(self, dataset_id: str) -> dict:
+        with self.open(dataset_id) as ds:
+            return json.loads(ds.attrs.get("metadata", "{}"))
+
+    def num_rows(self, dataset_id: str) -> int:
+        with self.open(dataset_id) as ds:
+            return ds.sizes["param1"] * ds.sizes["param2"]
+
+    def read_rows(self, dataset_id: str, start: int, stop: int) -> dict:
+        """
+        Rows [start, stop) of the flattened (param1, param2) grid, as columns.
+        """
+        with self.open(dataset_id) as ds:
+            n2 = ds.sizes["param2"]
+            stop = min(stop, ds.sizes["param1"] * n2)
+            if stop <= start:
+                return {col: [] for col in TABLE_COLUMNS}
+
+            # Only read the param1 rows that overlap the requested range
+            rows = slice(start // n2, (stop - 1) // n2 + 1)
+            offset = start - rows.start * n2
+            block = ds.isel(param1=rows)
+            n_block = block.sizes["param1"] * n2
+
+            chunk = {
+                "param1_label": [ds.attrs["param1_label"]] * (stop - start),
+                "param2_label": [ds.attrs["param2_label"]] * (stop - start),
+                "param1_value": np.repeat(block["param1"].values, n2),
+                "param2_value": np.tile(block["param2"].values, block.sizes["param1"]),
+            }
+            for col, var in SCALAR_COLUMNS.items():
+                chunk[col] = block[var].values.reshape(n_block)
+
+            return {
+                col: values[offset : offset + stop - start]
+                for col, values in chunk.items()
+            }
+
+    def read_records(self, dataset_id: str, start: int, stop: int) -> list[dict]:
+        """
+        read_rows as table records. Each column is converted to Python values
+        in one go, rather than value by value.
+        """
+        columns = self.read_rows(dataset_id, start, stop)
+        values = [
+            values.tolist() if isinstance(values, np.ndarray) else values
+            for values in columns.values()
+        ]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def read_grid(self, dataset_id: str, max_points: int | None = None) -> dict:
+        """
+        The scalar variables of a sweep as 2-D arrays of shape (param2, param1)
+        (C-contiguous float64, ready to be drawn as the z of a contour), with
+        the 1-D param1 and param2 axes and their labels. Sweeps larger than
+        max_points along an axis are read with a stride.
+        """
+        with self.open(dataset_id) as ds:
+            steps = {
+                dim: max(1, ds.sizes[dim] // max_points) if max_points else 1
+                for dim in ("param1", "param2")
+            }
+            view = ds[list(SCALAR_COLUMNS.values())].isel(
+                {dim: slice(None, None, step) for dim, step in steps.items()}
+            )
+            view = view.transpose("param2", "param1").load()
+
+            grid = {
+                "param1": view["param1"].values.astype(float),
+                "param2": view["param2"].values.astype(float),
+                "param1_label": ds.attrs["param1_label"],
+                "param2_label": ds.attrs["param2_label"],
+            }
+            for var in SCALAR_COLUMNS.values():
+                grid[var] = np.ascontiguousarray(view[var].values, dtype=float)
+            return grid
+
+    def iter_chunks(self, dataset_id: str, chunk_size: int = 1000):
+        n_rows = self.num_rows(dataset_id)
+        for start in range(0, n_rows, chunk_size):
+            yield self.read_rows(dataset_id, start, start + chunk_size)
+
+
+archive = SweepArchive()
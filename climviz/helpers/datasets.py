@@ -0,0 +1,61 @@
+import threading
+import uuid
+
+
+class DatasetRegistry:
+    """
+    Server-side registry of tabular datasets (sensitivity runs, saved points).
+
+    The browser only keeps the dataset id, so downloads can be served directly
+    from the server without shipping every row through the client.
+    """
+
+    def __init__(self):
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    def register(
+        self,
+        rows: list[dict],
+        columns: list[str],
+        metadata: dict | None = None,
+        dataset_id: str | None = None,
+    ) -> str:
+        if dataset_id is None:
+            dataset_id = uuid.uuid4().hex
+
+        with self._lock:
+            self._datasets[dataset_id] = {
+                "rows": rows,
+                "columns": columns,
+                "metadata": metadata or {},
+            }
+
+        return dataset_id
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return dataset_id in self._datasets
+
+    def delete(self, dataset_id: str) -> None:
+        with self._lock:
+            self._datasets.pop(dataset_id, None)
+
+    def columns(self, dataset_id: str) -> list[str]:
+        return self._datasets[dataset_id]["columns"]
+
+    def metadata(self, dataset_id: str) -> dict:
+        return self._datasets[dataset_id]["metadata"]
+
+    def iter_chunks(self, dataset_id: str, chunk_size: int = 1000):
+        """
+        Yield the dataset as column-oriented chunks of at most chunk_size rows.
+        """
+        dataset = self._datasets[dataset_id]
+        rows, columns = dataset["rows"], dataset["columns"]
+
+        for start in range(0, len(rows), chunk_size):
+            block = rows[start : start + chunk_size]
+            yield {col: [row[col] for row in block] for col in columns}
+
+
+datasets = DatasetRegistry()
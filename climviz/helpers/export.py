@@ -0,0 +1,254 @@
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+import xarray as xr
+from flask import Response, abort, request, stream_with_context
+from werkzeug.utils import secure_filename
+
+from climviz.helpers.datasets import datasets
+from climviz.models.scheduler import current_session
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows per chunk pulled from the dataset while streaming
+EXPORT_CHUNK_SIZE = 5000
+# Size of the blocks used when streaming a finished file back to the client
+FILE_BLOCK_SIZE = 1 << 16
+
+
+def flatten_metadata(metadata: dict, prefix: str = "") -> dict:
+    """
+    Flatten nested metadata (e.g. absorber_vmr) into scalar file attributes.
+    """
+    flat = {}
+    for key, value in metadata.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metadata(value, prefix=f"{name}_"))
+        elif value is None:
+            flat[name] = ""
+        elif isinstance(value, (list, tuple, np.ndarray)):
+            flat[name] = json.dumps(np.asarray(value).tolist())
+        else:
+            flat[name] = value
+    return flat
+
+
+def _variable_name(column: str) -> str:
+    return re.sub(r"\W+", "_", column).strip("_")
+
+
+def stream_csv(chunks, columns: list[str], metadata: dict):
+    """
+    Stream a dataset as CSV, with the metadata written as leading comment lines.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    for key, value in flatten_metadata(metadata).items():
+        buffer.write(f"# {key}: {value}\n")
+    writer.writerow(columns)
+
+    for chunk in chunks:
+        writer.writerows(zip(*(chunk[col] for col in columns)))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header-only datasets still produce a file
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _stream_file(path: str):
+    try:
+        with open(path, "rb") as f:
+            while block := f.read(FILE_BLOCK_SIZE):
+                yield block
+    finally:
+        os.remove(path)
+
+
+def stream_netcdf(chunks, columns: list[str], metadata: dict):
+    """
+    Stream a dataset as NetCDF.
+
+    Chunks are appended along an unlimited ``row`` dimension of a temporary
+    file, which is then sent back in fixed-size blocks.
+    """
+    if netCDF4 is None:
+        # xarray can still write NetCDF3 through scipy, but only in one go
+        data = {col: [] for col in columns}
+        for chunk in chunks:
+            for col in columns:
+                data[col].extend(chunk[col])
+        ds = xr.Dataset(
+            {
+                _variable_name(col): ("row", np.asarray(values), {"long_name": col})
+                for col, values in data.items()
+            },
+            attrs=flatten_metadata(metadata),
+        )
+        yield ds.to_netcdf()
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".nc")
+    os.close(fd)
+
+    # The file is removed by _stream_file once sent, or here if writing fails
+    try:
+        with netCDF4.Dataset(path, "w") as nc:
+            nc.createDimension("row", None)
+            nc.setncatts(flatten_metadata(metadata))
+
+            variables = {}
+            offset = 0
+            for chunk in chunks:
+                n_rows = len(chunk[columns[0]])
+                for col in columns:
+                    values = np.asarray(chunk[col])
+                    if col not in variables:
+                        is_text = values.dtype.kind in "OUS"
+                        variables[col] = nc.createVariable(
+                            _variable_name(col),
+                            str if is_text else values.dtype,
+                            ("row",),
+                            zlib=not is_text,
+                        )
+                        variables[col].long_name = col
+                    if values.dtype.kind in "US":
+                        values = values.astype(object)
+                    variables[col][offset : offset + n_rows] = values
+                offset += n_rows
+    except BaseException:
+        os.remove(path)
+        raise
+
+    yield from _stream_file(path)
+
+
+class _DrainableSink(io.RawIOBase):
+    """
+    Write-only file object whose contents can be taken out as they are written.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def stream_parquet(chunks, columns: list[str], metadata: dict):
+    """
+    Stream a dataset as Parquet, one row group per chunk.
+    """
+    sink = _DrainableSink()
+    writer = None
+    schema_metadata = {
+        key: str(value) for key, value in flatten_metadata(metadata).items()
+    }
+
+    for chunk in chunks:
+        table = pa.table({col: chunk[col] for col in columns})
+        if writer is None:
+            schema = table.schema.with_metadata(schema_metadata)
+            writer = pq.ParquetWriter(sink, schema)
+        writer.write_table(table.cast(schema))
+        yield sink.drain()
+
+    if writer is None:
+        # Empty dataset: write a file with an all-null schema
+        schema = pa.schema([(col, pa.null()) for col in columns]).with_metadata(
+            schema_metadata
+        )
+        writer = pq.ParquetWriter(sink, schema)
+    writer.close()
+    yield sink.drain()
+
+
+# Format name -> (writer, mimetype, file extension)
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv", "csv"),
+    "netcdf": (stream_netcdf, "application/x-netcdf", "nc"),
+}
+if pa is not None:
+    EXPORT_FORMATS["parquet"] = (
+        stream_parquet,
+        "application/vnd.apache.parquet",
+        "parquet",
+    )
+
+
+def export_url(dataset_id: str, fmt: str, name: str | None = None) -> str:
+    url = f"/export/{dataset_id}/{fmt}"
+    if name:
+        url += f"?name={secure_filename(name)}"
+    return url
+
+
+def register_export_routes(server, sources=(datasets,)):
+    """
+    Add the ``/export/<dataset_id>/<fmt>`` download endpoint to the Flask server.
+
+    sources are looked up in order for the dataset id; each must provide
+    ``columns``, ``metadata`` and ``iter_chunks`` like the DatasetRegistry.
+    Sources with an ``owner`` (like the SweepArchive) only serve the datasets
+    of the current session.
+    """
+
+    @server.route("/export/<dataset_id>/<fmt>")
+    def export_dataset(dataset_id, fmt):
+        source = next((src for src in sources if dataset_id in src), None)
+        if source is None or fmt not in EXPORT_FORMATS:
+            abort(404)
+        owner = getattr(source, "owner", None)
+        if owner is not None and owner(dataset_id) != current_session.get():
+            abort(404)
+
+        writer, mimetype, extension = EXPORT_FORMATS[fmt]
+        filename = secure_filename(request.args.get("name", "")) or dataset_id
+
+        body = writer(
+            source.iter_chunks(dataset_id, chunk_size=EXPORT_CHUNK_SIZE),
+            source.columns(dataset_id),
+            source.metadata(dataset_id),
+        )
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}.{extension}"'
+            },
+        )
+
+    return export_dataset
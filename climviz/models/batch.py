@@ -0,0 +1,348 @@
+"""
+Batched radiation: many independent columns in a single RRTMG call.
+
+climlab runs RRTMG on every column of a state at once, so N columns built with
+column_state(num_lat=N) (the "latitudes" are only used as a column index here)
+cost about as much Python overhead as one. Column parameters (SST, gases,
+humidity, ...) are given per column as arrays of length N, or as scalars shared
+by all columns.
+"""
+
+import climlab
+import numpy as np
+import scipy.integrate as sp
+from climlab.utils.thermo import pseudoadiabat
+
+from climviz.models.grid import get_grid
+from climviz.models.result import ModelResult
+from climviz.models.rrtm import make_radiation
+
+# Surface temperature search range (K) of the batched equilibrium solver
+EQUILIBRIUM_BRACKET = (250.0, 300.0)
+EQUILIBRIUM_LIMITS = (150.0, 400.0)
+
+
+def _per_column(value, shape) -> float | np.ndarray:
+    """
+    A scalar, or an array of one value per column reshaped to broadcast
+    against the column fields (shape is the shape of Ts). Arrays of shape
+    (N, num_lev) are passed through.
+    """
+    value = np.asarray(value, dtype=float)
+    if value.ndim == 0:
+        return float(value)
+    if value.ndim == 1:
+        return value.reshape(shape)
+    # Already one profile per column
+    return value
+
+
+def _num_columns(*values) -> int:
+    sizes = {np.size(v) for v in values if np.ndim(v) > 0}
+    if len(sizes) > 1:
+        raise ValueError(f"Per-column parameters have different lengths: {sizes}")
+    return sizes.pop() if sizes else 1
+
+
+def make_column_state(num_columns: int, num_lev: int = 100):
+    """
+    climlab state with num_columns independent columns.
+    """
+    return climlab.column_state(num_lev=num_lev, num_lat=num_columns)
+
+
+def generate_idealized_temp_profiles(SST, plevs, Tstrat=190) -> np.ndarray:
+    """
+    generate_idealized_temp_profile for several SSTs at once, shape (N, num_lev).
+
+    The pseudoadiabats of all columns are integrated as one ODE system.
+    """
+    SST = np.atleast_1d(np.asarray(SST, dtype=float))
+    solution = sp.odeint(pseudoadiabat, SST, np.flip(plevs))
+    temp = np.flip(solution, axis=0).T
+    Tstrat = np.broadcast_to(np.asarray(Tstrat, dtype=float), SST.shape)
+    return np.maximum(temp, Tstrat[:, None])
+
+
+def calc_radiation_batch(
+    Ts,
+    Tatm,
+    specific_humidity,
+    absorber_vmr: dict,
+    bands: str = "both",
+    engine: str = "rrtmg",
+):
+    """
+    Run RRTMG (or another engine) once on N columns given explicitly.
+
+    Ts has shape (N,), Tatm and specific_humidity (N, num_lev); absorber_vmr
+    values are scalars or arrays of length N. Returns the radiation process.
+    """
+    Tatm = np.atleast_2d(Tatm)
+    num_columns, num_lev = Tatm.shape
+    state = make_column_state(num_columns, num_lev)
+    shape = state["Ts"].shape
+    state["Ts"][:] = np.reshape(Ts, shape)
+    state["Tatm"][:] = Tatm.reshape(state["Tatm"].shape)
+
+    absorbers = {gas: _per_column(value, shape) for gas, value in absorber_vmr.items()}
+    q = np.reshape(specific_humidity, state["Tatm"].shape)
+    rad = make_radiation(state, q, absorbers, bands, engine=engine)
+    rad.compute_diagnostics()
+    return rad
+
+
+def make_idealized_columns(SST, RH=0.8, Tstrat=195, qStrat=5e-06, num_lev=100):
+    """
+    make_idealized_column and its fixed relative humidity for N SSTs.
+
+    Returns (state, h2o); h2o.q is the specific humidity of the columns.
+    """
+    SST = np.atleast_1d(np.asarray(SST, dtype=float))
+    state = make_column_state(len(SST), num_lev)
+    shape = state["Ts"].shape
+    state["Ts"][:] = SST.reshape(shape)
+    state["Tatm"][:] = generate_idealized_temp_profiles(
+        SST, get_grid(num_lev).lev, Tstrat=Tstrat
+    ).reshape(state["Tatm"].shape)
+
+    h2o = climlab.radiation.water_vapor.FixedRelativeHumidity(
+        state=state,
+        relative_humidity=_per_column(RH, shape),
+        qStrat=qStrat,
+    )
+    return state, h2o
+
+
+def calc_olr_batch(
+    SST,
+    absorber_vmr: dict,
+    RH=0.8,
+    Tstrat=195,
+    qStrat=5e-06,
+    num_lev=100,
+    bands="both",
+    insolation=None,
+    coszen=None,
+    engine="rrtmg",
+):
+    """
+    calc_olr for N idealized columns in a single RRTMG call.
+
+    SST, RH, Tstrat and the absorber_vmr values are scalars or arrays of length
+    N, as are insolation (W/m²) and coszen when given (the climlab defaults are
+    used otherwise). Returns (state, h2o, rad) like calc_olr, with a leading
+    column dimension.
+    """
+    num_columns = _num_columns(
+        SST, RH, Tstrat, insolation, coszen, *absorber_vmr.values()
+    )
+    state, h2o = make_idealized_columns(
+        np.broadcast_to(np.asarray(SST, dtype=float), (num_columns,)),
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+    shape = state["Ts"].shape
+    absorbers = {gas: _per_column(value, shape) for gas, value in absorber_vmr.items()}
+    solar = {
+        name: _per_column(value, shape)
+        for name, value in (("insolation", insolation), ("coszen", coszen))
+        if value is not None
+    }
+    rad = make_radiation(state, h2o.q, absorbers, bands, engine=engine, **solar)
+    rad.compute_diagnostics()
+    return state, h2o, rad
+
+
+def summarize_columns(rad) -> ModelResult:
+    """
+    summarize_column for a batched run: the arrays get a leading column
+    dimension (OLR and ASR have shape (N,), profiles (N, n_vertical)).
+    """
+    grid = get_grid(len(rad.lev))
+    num_columns = np.size(rad.Ts)
+    diagnostics = rad.diagnostics
+
+    def columns(name, per_level=True):
+        if name not in diagnostics:
+            return None
+        values = np.asarray(diagnostics[name])
+        return values.reshape(num_columns, -1) if per_level else values.reshape(-1)
+
+    return ModelResult(
+        OLR=columns("OLR", per_level=False),
+        ASR=columns("ASR", per_level=False),
+        LW_flux_up=columns("LW_flux_up"),
+        LW_flux_down=columns("LW_flux_down"),
+        SW_flux_up=columns("SW_flux_up"),
+        SW_flux_down=columns("SW_flux_down"),
+        Tatm=np.asarray(rad.Tatm).reshape(num_columns, -1),
+        lev=grid.lev,
+        lev_bounds=grid.lev_bounds,
+        altitude=grid.altitude,
+    )
+
+
+def find_equilibrium_batch(
+    absorber_vmr: dict,
+    Tstrat=195.0,
+    rel_humidity=0.8,
+    qStrat=5e-06,
+    num_lev=100,
+    bracket=EQUILIBRIUM_BRACKET,
+    tol=1e-3,
+    max_iter=50,
+    insolation=None,
+    coszen=None,
+) -> np.ndarray:
+    """
+    Equilibrium surface temperatures of N columns, solved simultaneously.
+
+    Parameters are scalars or arrays of length N. Every iteration evaluates the
+    net flux of all unconverged columns in one batched RRTMG call: the brackets
+    are first widened until they hold a root, then narrowed with the Illinois
+    variant of regula falsi. Columns without an equilibrium in
+    EQUILIBRIUM_LIMITS are NaN. insolation and coszen are optional per-column
+    shortwave inputs (see calc_olr_batch).
+    """
+    num_columns = _num_columns(
+        rel_humidity, Tstrat, insolation, coszen, *absorber_vmr.values()
+    )
+    solar = {
+        name: np.broadcast_to(np.asarray(value, dtype=float), (num_columns,))
+        for name, value in (("insolation", insolation), ("coszen", coszen))
+        if value is not None
+    }
+    params = {
+        "RH": np.broadcast_to(np.asarray(rel_humidity, dtype=float), (num_columns,)),
+        "Tstrat": np.broadcast_to(np.asarray(Tstrat, dtype=float), (num_columns,)),
+        **{
+            gas: np.broadcast_to(np.asarray(value, dtype=float), (num_columns,))
+            for gas, value in absorber_vmr.items()
+        },
+    }
+
+    def net_flux(Ts, index):
+        _, _, rad = calc_olr_batch(
+            Ts,
+            {gas: params[gas][index] for gas in absorber_vmr},
+            RH=params["RH"][index],
+            Tstrat=params["Tstrat"][index],
+            qStrat=qStrat,
+            num_lev=num_lev,
+            **{name: value[index] for name, value in solar.items()},
+        )
+        return np.ravel(rad.ASR - rad.OLR)
+
+    lower, upper = EQUILIBRIUM_LIMITS
+    bracket = np.broadcast_to(np.asarray(bracket, dtype=float), (num_columns, 2))
+    a, b = bracket[:, 0].copy(), bracket[:, 1].copy()
+    everything = np.arange(num_columns)
+    # Both ends of all brackets in one call
+    f = net_flux(np.concatenate([a, b]), np.concatenate([everything, everything]))
+    fa, fb = f[:num_columns], f[num_columns:]
+
+    # Widen the brackets without a sign change. The net flux decreases with
+    # Ts on the stable branch, so move up while it is positive, down otherwise.
+    step = b - a
+    for _ in range(max_iter):
+        same = (np.sign(fa) == np.sign(fb)) & np.where(fb > 0, b < upper, a > lower)
+        if not same.any():
+            break
+        index = np.flatnonzero(same)
+        step[index] *= 2
+        up = fb[index] > 0
+        new = np.where(
+            up,
+            np.minimum(b[index] + step[index], upper),
+            np.maximum(a[index] - step[index], lower),
+        )
+        f_new = net_flux(new, index)
+        # The old end nearest to the new one becomes the other end
+        a[index], fa[index], b[index], fb[index] = (
+            np.where(up, b[index], new),
+            np.where(up, fb[index], f_new),
+            np.where(up, new, a[index]),
+            np.where(up, f_new, fa[index]),
+        )
+
+    Ts = np.full(num_columns, np.nan)
+    active = np.sign(fa) != np.sign(fb)
+    # Which end was kept at the last iteration (for the Illinois correction)
+    side = np.zeros(num_columns)
+    for _ in range(max_iter):
+        index = np.flatnonzero(active)
+        if index.size == 0:
+            break
+        c = (a[index] * fb[index] - b[index] * fa[index]) / (fb[index] - fa[index])
+        fc = net_flux(c, index)
+
+        done = np.abs(fc) < tol
+        Ts[index[done]] = c[done]
+        active[index[done]] = False
+
+        # Replace the end with the same sign as f(c), halving the other end's
+        # value when the same end is kept twice in a row
+        same_as_a = np.sign(fc) == np.sign(fa[index])
+        keep_b = index[same_as_a & ~done]
+        keep_a = index[~same_as_a & ~done]
+        a[keep_b], fa[keep_b] = c[same_as_a & ~done], fc[same_as_a & ~done]
+        b[keep_a], fb[keep_a] = c[~same_as_a & ~done], fc[~same_as_a & ~done]
+        fb[keep_b[side[keep_b] == 1]] /= 2
+        fa[keep_a[side[keep_a] == -1]] /= 2
+        side[keep_b], side[keep_a] = 1, -1
+
+    # Columns that did not reach the tolerance: best estimate from the bracket
+    Ts[active] = (a[active] + b[active]) / 2
+    return Ts
+
+
+def evaluate_points(
+    SST,
+    absorber_vmr: dict,
+    RH=0.8,
+    Tstrat=195.0,
+    qStrat=5e-06,
+    num_lev=100,
+    equilibrium=True,
+) -> dict:
+    """
+    N independent configurations (e.g. saved points to compare): their
+    radiation at their SST in one RRTMG call, and their equilibrium surface
+    temperatures solved together.
+
+    SST, RH, Tstrat and the absorber_vmr values are scalars or arrays of length
+    N; equilibrium is a bool or a mask of the points to solve. Returns the
+    batched result (see summarize_columns) and Ts_eq (K, NaN where there is no
+    equilibrium or it was not solved).
+    """
+    num_columns = _num_columns(SST, RH, Tstrat, *absorber_vmr.values())
+    _, _, rad = calc_olr_batch(
+        np.broadcast_to(np.asarray(SST, dtype=float), (num_columns,)),
+        absorber_vmr,
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+
+    solve = np.broadcast_to(np.asarray(equilibrium, dtype=bool), (num_columns,))
+    Ts_eq = np.full(num_columns, np.nan)
+    if solve.any():
+
+        def points(value):
+            value = np.asarray(value, dtype=float)
+            if value.ndim == 0:
+                return float(value)
+            return np.broadcast_to(value, (num_columns,))[solve]
+
+        Ts_eq[solve] = find_equilibrium_batch(
+            {gas: points(value) for gas, value in absorber_vmr.items()},
+            Tstrat=points(Tstrat),
+            rel_humidity=points(RH),
+            qStrat=qStrat,
+            num_lev=num_lev,
+        )
+    return {"result": summarize_columns(rad), "Ts_eq": Ts_eq}
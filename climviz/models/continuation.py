@@ -0,0 +1,264 @@
+"""
+Numerical continuation of the radiative equilibrium.
+
+Traces the branch of equilibrium surface temperatures F(x, Ts) = ASR - OLR = 0
+as a parameter x varies, with pseudo-arclength predictor-corrector steps: each
+solution seeds the next one, so a dense curve costs a few radiation runs per
+point instead of a cold root-find each. The step size adapts to the curvature
+of the branch. Folds (turning points, where the branch turns back and the
+equilibrium jumps) and runaway warming are detected and reported.
+"""
+
+import numpy as np
+
+from climviz.models.rrtm import (
+    NoSignChangeError,
+    calc_olr,
+    find_equilibrium_surface_temperature,
+)
+
+# Non-gas parameters that can be continued in, with their typical step size.
+# Gases (any key of absorber_vmr) are continued in log(vmr), with unit steps.
+PARAMETER_SCALES = {"rel_humidity": 0.05, "Tstrat": 5.0}
+# Valid range of the non-gas parameters (gases must be strictly positive)
+PARAMETER_RANGES = {"rel_humidity": (0.0, 1.0), "Tstrat": (0.0, 400.0)}
+# Temperature scale (K) of the arclength
+TEMPERATURE_SCALE = 10.0
+# Surface temperature (K) above which the column is considered in runaway
+RUNAWAY_TEMPERATURE = 350.0
+
+
+class _Branch:
+    """
+    Net flux as a function of the scaled parameter and surface temperature.
+    """
+
+    def __init__(self, parameter, absorber_vmr, Tstrat, rel_humidity):
+        self.parameter = parameter
+        self.is_gas = parameter in absorber_vmr
+        if not self.is_gas and parameter not in PARAMETER_SCALES:
+            raise ValueError(
+                f"Cannot continue in {parameter!r}: expected a gas or one of "
+                f"{list(PARAMETER_SCALES)}"
+            )
+        self.settings = {
+            "absorber_vmr": absorber_vmr,
+            "Tstrat": Tstrat,
+            "rel_humidity": rel_humidity,
+        }
+        self.evaluations = 0
+
+    def check(self, value):
+        """
+        Raise ValueError if the parameter cannot take the value.
+        """
+        if self.is_gas:
+            if not value > 0:
+                raise ValueError(
+                    f"{self.parameter} must be positive along the curve "
+                    f"(it is continued in log scale), got {value}"
+                )
+            return
+        low, high = PARAMETER_RANGES[self.parameter]
+        if not low <= value <= high:
+            raise ValueError(
+                f"{self.parameter} must be within [{low}, {high}], got {value}"
+            )
+
+    def to_scaled(self, value):
+        if self.is_gas:
+            return np.log(value)
+        return value / PARAMETER_SCALES[self.parameter]
+
+    def from_scaled(self, x):
+        if self.is_gas:
+            return float(np.exp(x))
+        return float(x * PARAMETER_SCALES[self.parameter])
+
+    def settings_at(self, x) -> dict:
+        settings = dict(self.settings)
+        if self.is_gas:
+            settings["absorber_vmr"] = {
+                **settings["absorber_vmr"],
+                self.parameter: self.from_scaled(x),
+            }
+        else:
+            settings[self.parameter] = self.from_scaled(x)
+        return settings
+
+    def net_flux(self, x, T) -> float:
+        """
+        ASR - OLR at the scaled point (x, T), T being Ts / TEMPERATURE_SCALE.
+        """
+        settings = self.settings_at(x)
+        Ts = T * TEMPERATURE_SCALE
+        _, _, rad = calc_olr(
+            Ts,
+            settings["absorber_vmr"],
+            RH=settings["rel_humidity"],
+            Tstrat=settings["Tstrat"],
+        )
+        self.evaluations += 1
+        return rad.ASR[0] - rad.OLR[0]
+
+    def jacobian(self, x, T, F, dx=1e-3, dT=1e-3) -> np.ndarray:
+        """
+        (dF/dx, dF/dT) by forward differences, F being the value at (x, T).
+        """
+        return np.array(
+            [
+                (self.net_flux(x + dx, T) - F) / dx,
+                (self.net_flux(x, T + dT) - F) / dT,
+            ]
+        )
+
+
+def _tangent(jacobian, previous=None) -> np.ndarray:
+    # Unit vector along the branch, orthogonal to the gradient of F
+    tangent = np.array([jacobian[1], -jacobian[0]])
+    tangent /= np.linalg.norm(tangent)
+    if previous is not None and tangent @ previous < 0:
+        tangent = -tangent
+    return tangent
+
+
+def trace_equilibrium(
+    parameter: str,
+    start: float,
+    stop: float,
+    absorber_vmr: dict,
+    Tstrat: float = 195.0,
+    rel_humidity: float = 0.8,
+    step: float | None = None,
+    tol: float = 1e-3,
+    max_points: int = 200,
+    max_corrector_iterations: int = 6,
+    stop_at_turning_point: bool = True,
+) -> dict:
+    """
+    Equilibrium surface temperature along a parameter, from start to stop.
+
+    parameter is a gas of absorber_vmr (values are volume mixing ratios),
+    "rel_humidity" or "Tstrat"; the other settings stay fixed. step is the
+    initial arclength step (in scaled units, see PARAMETER_SCALES and
+    TEMPERATURE_SCALE) and tol the tolerance on the net flux (W/m²). Past a
+    turning point the branch is unstable; it is only followed further when
+    stop_at_turning_point is False.
+
+    Returns the points of the branch (parameter values, Ts and whether each
+    equilibrium is stable, i.e. d(ASR - OLR)/dTs < 0), the events met along the
+    way ("turning_point", "runaway", "step_failure", or "no_equilibrium" when
+    the column keeps cooling at start) and the number of radiation evaluations
+    after the initial root-find. start == stop gives a single point. Raises ValueError for
+    an unknown parameter or values out of its range (see PARAMETER_RANGES).
+    """
+    branch = _Branch(parameter, absorber_vmr, Tstrat, rel_humidity)
+    branch.check(start)
+    branch.check(stop)
+    x_start, x_stop = branch.to_scaled(start), branch.to_scaled(stop)
+    x = x_start
+    direction = np.sign(x_stop - x) or 1.0
+    if step is None:
+        step = max(abs(x_stop - x), 1.0) / 20
+    min_step, max_step = step / 1000, step * 5
+
+    # First point from a (bracketed) root-find
+    try:
+        Ts = find_equilibrium_surface_temperature(**branch.settings_at(x))
+    except NoSignChangeError as err:
+        return {
+            "parameter": [],
+            "Ts": [],
+            "stable": [],
+            "events": [
+                {
+                    "type": "runaway" if err.sign > 0 else "no_equilibrium",
+                    "parameter": start,
+                    "Ts": None,
+                }
+            ],
+            "evaluations": branch.evaluations,
+        }
+    u = np.array([x, Ts / TEMPERATURE_SCALE])
+    F = branch.net_flux(*u)
+    J = branch.jacobian(*u, F)
+    tangent = _tangent(J, previous=np.array([direction, 0.0]))
+
+    points = [u]
+    stable = [J[1] < 0]
+    events = []
+
+    def event(kind, u):
+        events.append(
+            {
+                "type": kind,
+                "parameter": branch.from_scaled(u[0]),
+                "Ts": float(u[1] * TEMPERATURE_SCALE),
+            }
+        )
+
+    while len(points) < max_points and x_stop != x_start:
+        # Do not step past the end of the range
+        remaining = (x_stop - u[0]) * direction
+        h = step
+        last = tangent[0] * direction > 0 and h * tangent[0] * direction >= remaining
+        if last:
+            h = remaining / (tangent[0] * direction)
+
+        # Predictor along the tangent, corrector with Newton iterations on
+        # F(u) = 0 and tangent . (u - predicted) = 0, reusing the Jacobian
+        # computed at the last point (chord method)
+        predicted = u + h * tangent
+        system = np.array([J, tangent])
+        candidate = predicted
+        converged = False
+        for iteration in range(1, max_corrector_iterations + 1):
+            F_new = branch.net_flux(*candidate)
+            if abs(F_new) < tol:
+                converged = True
+                break
+            residual = np.array([F_new, tangent @ (candidate - predicted)])
+            candidate = candidate - np.linalg.solve(system, residual)
+
+        if not converged:
+            step /= 2
+            if step < min_step:
+                event("step_failure", u)
+                break
+            continue
+
+        J_new = branch.jacobian(*candidate, F_new)
+        new_tangent = _tangent(J_new, previous=tangent)
+
+        # The parameter reverses along the branch: a fold
+        fold = np.sign(new_tangent[0]) != np.sign(tangent[0])
+        if fold:
+            event("turning_point", candidate)
+
+        u, J, tangent = candidate, J_new, new_tangent
+        points.append(u)
+        stable.append(J[1] < 0)
+
+        if u[1] * TEMPERATURE_SCALE > RUNAWAY_TEMPERATURE:
+            event("runaway", u)
+            break
+        # Reached the end of the range, or folded back out of it
+        if last or (u[0] - x_start) * direction < 0:
+            break
+        if fold and stop_at_turning_point:
+            break
+
+        # Adapt the step to how hard the correction was
+        if iteration <= 2:
+            step = min(step * 1.5, max_step)
+        elif iteration >= 4:
+            step = max(step / 2, min_step)
+
+    points = np.array(points)
+    return {
+        "parameter": [branch.from_scaled(x) for x in points[:, 0]],
+        "Ts": (points[:, 1] * TEMPERATURE_SCALE).tolist(),
+        "stable": [bool(s) for s in stable],
+        "events": events,
+        "evaluations": branch.evaluations,
+    }
@@ -0,0 +1,135 @@
+"""
+Standard radiative diagnostics of a configuration.
+
+- instantaneous radiative forcing of a gas perturbation (e.g. CO2 doubling),
+- equilibrium climate sensitivity (ECS) to that perturbation,
+- Planck response (change in OLR for a uniform 1 K warming, humidity fixed),
+- total climate feedback parameter (-forcing / ECS).
+
+The baseline equilibrium column is cached and shared by all the diagnostics,
+and the perturbed columns are evaluated together in one batched RRTMG call.
+"""
+
+import functools
+
+import numpy as np
+
+from climviz.models.batch import (
+    calc_radiation_batch,
+    find_equilibrium_batch,
+    make_idealized_columns,
+)
+from climviz.models.rrtm import hashable, unhashable
+
+# Uniform warming (K) of the Planck response
+PLANCK_WARMING = 1.0
+# Width (K) of the bracket above the baseline for the perturbed equilibrium
+ECS_BRACKET = 10.0
+
+
+@functools.lru_cache(maxsize=128)
+def _baseline(absorbers, rel_humidity, Tstrat, qStrat, num_lev):
+    absorber_vmr = {gas: unhashable(value) for gas, value in absorbers}
+    Ts = find_equilibrium_batch(
+        absorber_vmr,
+        Tstrat=Tstrat,
+        rel_humidity=rel_humidity,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )[0]
+    if np.isnan(Ts):
+        raise ValueError("The baseline configuration has no equilibrium.")
+
+    state, h2o = make_idealized_columns(
+        Ts, RH=rel_humidity, Tstrat=Tstrat, qStrat=qStrat, num_lev=num_lev
+    )
+    Tatm = np.asarray(state["Tatm"]).reshape(1, -1)
+    q = np.asarray(h2o.q).reshape(1, -1)
+    Tatm.flags.writeable = q.flags.writeable = False
+    return Ts, Tatm, q
+
+
+def baseline_column(
+    absorber_vmr: dict,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+):
+    """
+    Equilibrium surface temperature, temperature and specific humidity profiles
+    (shape (1, num_lev), read-only) of a configuration, cached.
+    """
+    absorbers = tuple(
+        sorted((gas, hashable(value)) for gas, value in absorber_vmr.items())
+    )
+    return _baseline(
+        absorbers, float(rel_humidity), float(Tstrat), float(qStrat), int(num_lev)
+    )
+
+
+def radiative_diagnostics(
+    absorber_vmr: dict,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+    gas: str = "CO2",
+    factor: float = 2.0,
+) -> dict:
+    """
+    Forcing, ECS, Planck response and feedback parameter for multiplying the
+    amount of gas by factor (CO2 doubling by default).
+
+    Fluxes are in W/m², temperatures in K; the forcing is the change in net
+    downward flux (ASR - OLR) at the top of the atmosphere.
+    """
+    if not np.any(absorber_vmr.get(gas, 0.0)):
+        raise ValueError(f"The baseline has no {gas} to perturb.")
+
+    Ts, Tatm, q = baseline_column(absorber_vmr, rel_humidity, Tstrat, qStrat, num_lev)
+    perturbed_vmr = {**absorber_vmr, gas: np.asarray(absorber_vmr[gas]) * factor}
+
+    # One call for: the baseline, the perturbed gas at fixed temperature
+    # (forcing) and the uniformly warmed column at fixed humidity (Planck)
+    rad = calc_radiation_batch(
+        Ts=np.array([Ts, Ts, Ts + PLANCK_WARMING]),
+        Tatm=np.concatenate([Tatm, Tatm, Tatm + PLANCK_WARMING]),
+        specific_humidity=np.concatenate([q, q, q]),
+        absorber_vmr={
+            name: np.stack(
+                [
+                    np.asarray(absorber_vmr[name]),
+                    np.asarray(perturbed_vmr[name]),
+                    np.asarray(absorber_vmr[name]),
+                ]
+            )
+            for name in absorber_vmr
+        },
+    )
+    net_flux = np.ravel(rad.ASR - rad.OLR)
+    OLR = np.ravel(rad.OLR)
+    forcing = net_flux[1] - net_flux[0]
+    planck_response = (OLR[2] - OLR[0]) / PLANCK_WARMING
+
+    # The perturbed equilibrium is searched for just above the baseline
+    Ts_perturbed = find_equilibrium_batch(
+        perturbed_vmr,
+        Tstrat=Tstrat,
+        rel_humidity=rel_humidity,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        bracket=(Ts, Ts + ECS_BRACKET),
+    )[0]
+    ecs = Ts_perturbed - Ts
+
+    return {
+        "gas": gas,
+        "factor": factor,
+        "Ts_baseline": float(Ts),
+        "Ts_perturbed": float(Ts_perturbed),
+        "forcing": float(forcing),
+        "ecs": float(ecs),
+        "planck_response": float(planck_response),
+        "feedback_parameter": float(-forcing / ecs) if ecs else float("nan"),
+    }
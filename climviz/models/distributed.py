@@ -0,0 +1,382 @@
+"""
+Distributed sweeps: a coordinator and workers sharing a task queue.
+
+The coordinator splits a sweep plan into chunks (one row of the plan each, the
+unit that is checkpointed in the archive) and pushes them to a queue. Workers on
+any node pull chunks, evaluate them with the batched model and push the results
+back. Chunks are independent, so throughput grows with the number of workers.
+
+Chunks are claimed with a lease: a chunk whose worker died or hung is handed to
+another worker when its lease expires, up to MAX_ATTEMPTS times. Only the
+first result of a chunk is kept, so retries are idempotent. Each run of a sweep
+is its own job (spec hash and a run id): two coordinators running the same
+sweep never take each other's results or cancel each other's chunks.
+
+Queues are pluggable: open_queue picks the implementation registered for the
+scheme of a URL. SQLiteQueue ("sqlite:///path/to/queue.db") needs nothing but a
+file shared by the nodes. A worker is started with
+
+    python -m climviz.models.distributed sqlite:///path/to/queue.db
+"""
+
+import abc
+import argparse
+import os
+import pickle
+import socket
+import sqlite3
+import time
+import uuid
+
+from climviz.models.sweep import SweepPlan, evaluate_plan, sweep_spec_hash
+
+# Seconds a worker has to finish a chunk before it is handed to another one
+CHUNK_LEASE = 900.0
+# Attempts of a chunk before it is reported as failed
+MAX_ATTEMPTS = 3
+# Seconds between two polls of the queue
+POLL_INTERVAL = 0.5
+# Seconds a distributed sweep may take in total
+SWEEP_TIMEOUT = 24 * 3600.0
+# Seconds a sweep may wait with none of its chunks claimed (i.e. no worker)
+UNCLAIMED_TIMEOUT = 600.0
+
+
+class ChunkFailedError(RuntimeError):
+    """
+    A chunk failed on every attempt.
+    """
+
+
+class SweepTimeoutError(TimeoutError):
+    """
+    A distributed sweep did not complete in time, or no worker took its chunks.
+    """
+
+
+class TaskQueue(abc.ABC):
+    """
+    Interface of the queues: chunks of jobs, claimed with a lease.
+
+    Payloads and results are arbitrary picklable objects. They are unpickled
+    from the shared store, which every node can write: anyone able to write to
+    the queue can run code in the coordinator and the workers, so it must only
+    be shared between trusted nodes.
+    """
+
+    @abc.abstractmethod
+    def submit(self, job: str, chunks: dict):
+        """
+        Add the chunks (chunk id -> payload) of a job; chunks that are already
+        queued are left as they are.
+        """
+
+    @abc.abstractmethod
+    def claim(self, worker: str, lease: float = CHUNK_LEASE):
+        """
+        Take the next available chunk as (job, chunk, payload), or None.
+        """
+
+    @abc.abstractmethod
+    def complete(self, job: str, chunk: int, result):
+        """
+        Store the result of a chunk (only the first result of a chunk is kept).
+        """
+
+    @abc.abstractmethod
+    def fail(self, job: str, chunk: int, error: str):
+        """
+        Report a failed attempt of a chunk; it is retried until MAX_ATTEMPTS.
+        """
+
+    @abc.abstractmethod
+    def take_results(self, job: str) -> dict:
+        """
+        Remove and return the results of the completed chunks of a job.
+        """
+
+    @abc.abstractmethod
+    def failures(self, job: str) -> dict:
+        """
+        Errors of the chunks of a job that failed on every attempt.
+        """
+
+    @abc.abstractmethod
+    def cancel(self, job: str):
+        """
+        Remove all the chunks of a job.
+        """
+
+    @abc.abstractmethod
+    def expire(self, job: str):
+        """
+        Fail the chunks of a job whose lease expired on their last attempt
+        (claim does it too, but only when some worker is polling).
+        """
+
+    @abc.abstractmethod
+    def running(self, job: str) -> int:
+        """
+        Number of chunks of a job currently claimed by a worker.
+        """
+
+
+class SQLiteQueue(TaskQueue):
+    """
+    Queue in a SQLite database, usable by processes on several nodes sharing
+    the file (claims are serialized by SQLite's write lock).
+    """
+
+    def __init__(self, path: str, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS chunks (
+                    job TEXT NOT NULL,
+                    chunk INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    worker TEXT,
+                    result BLOB,
+                    error TEXT,
+                    PRIMARY KEY (job, chunk)
+                )
+                """)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        return _Transaction(db)
+
+    def submit(self, job, chunks):
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO chunks (job, chunk, payload) VALUES (?, ?, ?)",
+                [
+                    (job, int(chunk), pickle.dumps(payload))
+                    for chunk, payload in chunks.items()
+                ],
+            )
+
+    def claim(self, worker, lease=CHUNK_LEASE):
+        now = time.time()
+        with self._connect() as db:
+            # Chunks whose lease expired on their last attempt have failed
+            db.execute(
+                "UPDATE chunks SET state = 'failed', error = 'lease expired' "
+                "WHERE state = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT job, chunk, payload FROM chunks "
+                "WHERE state = 'pending' OR (state = 'running' AND lease_until < ?) "
+                "ORDER BY job, chunk LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job, chunk, payload = row
+            db.execute(
+                "UPDATE chunks SET state = 'running', attempts = attempts + 1, "
+                "lease_until = ?, worker = ? WHERE job = ? AND chunk = ?",
+                (now + lease, worker, job, chunk),
+            )
+        return job, chunk, pickle.loads(payload)
+
+    def complete(self, job, chunk, result):
+        with self._connect() as db:
+            # The first result wins: a retried chunk may complete twice
+            db.execute(
+                "UPDATE chunks SET state = 'done', result = ?, payload = x'' "
+                "WHERE job = ? AND chunk = ? AND state IN ('pending', 'running')",
+                (pickle.dumps(result), job, chunk),
+            )
+
+    def fail(self, job, chunk, error):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE chunks SET error = ?, "
+                "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE job = ? AND chunk = ? AND state = 'running'",
+                (error, self.max_attempts, job, chunk),
+            )
+
+    def take_results(self, job):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT chunk, result FROM chunks WHERE job = ? AND state = 'done'",
+                (job,),
+            ).fetchall()
+            db.execute("DELETE FROM chunks WHERE job = ? AND state = 'done'", (job,))
+        return {chunk: pickle.loads(result) for chunk, result in rows}
+
+    def failures(self, job):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT chunk, error FROM chunks WHERE job = ? AND state = 'failed'",
+                (job,),
+            ).fetchall()
+        return dict(rows)
+
+    def cancel(self, job):
+        with self._connect() as db:
+            db.execute("DELETE FROM chunks WHERE job = ?", (job,))
+
+    def expire(self, job):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE chunks SET state = 'failed', error = 'lease expired' "
+                "WHERE job = ? AND state = 'running' AND lease_until < ? "
+                "AND attempts >= ?",
+                (job, time.time(), self.max_attempts),
+            )
+
+    def running(self, job):
+        with self._connect() as db:
+            (count,) = db.execute(
+                "SELECT COUNT(*) FROM chunks WHERE job = ? AND state = 'running' "
+                "AND lease_until >= ?",
+                (job, time.time()),
+            ).fetchone()
+        return count
+
+
+class _Transaction:
+    """
+    Connection used as an immediate (write-locked) transaction.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        self.db.close()
+
+
+# URL scheme -> queue class (taking the rest of the URL as argument)
+QUEUE_BACKENDS = {"sqlite": SQLiteQueue}
+
+
+def open_queue(url: str) -> TaskQueue:
+    """
+    Queue for a URL like "sqlite:///path/to/queue.db".
+    """
+    scheme, _, location = url.partition("://")
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(
+            f"Unknown queue {url!r}, expected a URL with one of the schemes "
+            f"{list(QUEUE_BACKENDS)}"
+        )
+    # sqlite:///tmp/queue.db -> /tmp/queue.db
+    return QUEUE_BACKENDS[scheme](location)
+
+
+def run_distributed_sweep(
+    queue: TaskQueue,
+    plan,
+    on_row,
+    rows=None,
+    equilibrium: bool = True,
+    poll_interval: float = POLL_INTERVAL,
+    timeout: float = SWEEP_TIMEOUT,
+    unclaimed_timeout: float = UNCLAIMED_TIMEOUT,
+):
+    """
+    Coordinator side of run_sweep: push one chunk per row of the plan, then
+    hand each row's results to on_row(i, results) as they come back (in any
+    order). Raises ChunkFailedError if a chunk failed on every attempt, and
+    SweepTimeoutError if the sweep takes more than timeout seconds or no chunk
+    is claimed or completed for unclaimed_timeout seconds.
+    """
+    job = f"{sweep_spec_hash(plan, equilibrium)}-{uuid.uuid4().hex}"
+    rows = list(range(plan.shape[0]) if rows is None else rows)
+    queue.submit(
+        job,
+        {
+            i: {"plan": plan.select(i).to_dict(), "equilibrium": equilibrium}
+            for i in rows
+        },
+    )
+
+    remaining = set(rows)
+    start = last_activity = time.monotonic()
+    try:
+        while remaining:
+            results = queue.take_results(job)
+            for i, result in results.items():
+                if i in remaining:
+                    remaining.discard(i)
+                    on_row(i, {name: values[0] for name, values in result.items()})
+
+            now = time.monotonic()
+            if results or queue.running(job):
+                last_activity = now
+            elif now - last_activity > unclaimed_timeout:
+                raise SweepTimeoutError(
+                    f"No worker took a chunk of the sweep for {unclaimed_timeout:g}s"
+                )
+            if now - start > timeout:
+                raise SweepTimeoutError(
+                    f"The sweep did not complete within {timeout:g}s"
+                )
+
+            # Fail chunks whose workers died, even if no worker is left to notice
+            queue.expire(job)
+            failures = queue.failures(job)
+            if failures:
+                i, error = next(iter(failures.items()))
+                raise ChunkFailedError(f"Row {i} of the sweep failed: {error}")
+            if remaining and not results:
+                time.sleep(poll_interval)
+    finally:
+        queue.cancel(job)
+
+
+def serve(
+    queue: TaskQueue,
+    worker: str | None = None,
+    lease: float = CHUNK_LEASE,
+    poll_interval: float = POLL_INTERVAL,
+    max_idle: float | None = None,
+):
+    """
+    Worker loop: claim chunks, evaluate them and push their results, until the
+    queue has been empty for max_idle seconds (forever by default).
+    """
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    idle_since = time.monotonic()
+    while True:
+        claimed = queue.claim(worker, lease)
+        if claimed is None:
+            if max_idle is not None and time.monotonic() - idle_since > max_idle:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        job, chunk, payload = claimed
+        try:
+            result = evaluate_plan(
+                SweepPlan.from_dict(payload["plan"]),
+                equilibrium=payload["equilibrium"],
+            )
+        except Exception as err:
+            queue.fail(job, chunk, f"{type(err).__name__}: {err}")
+        else:
+            queue.complete(job, chunk, result)
+        idle_since = time.monotonic()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a distributed sweep worker.")
+    parser.add_argument("queue", help="queue URL, e.g. sqlite:///path/to/queue.db")
+    parser.add_argument("--lease", type=float, default=CHUNK_LEASE)
+    parser.add_argument("--max-idle", type=float, default=None)
+    args = parser.parse_args()
+    serve(open_queue(args.queue), lease=args.lease, max_idle=args.max_idle)
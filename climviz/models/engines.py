@@ -0,0 +1,532 @@
+"""
+Radiation engines: the radiation codes a column can be run with.
+
+An engine builds, from a climlab state, its specific humidity and absorbers, a
+radiation process with the interface the models rely on: compute_diagnostics(),
+the diagnostics dict (OLR, ASR and the flux profiles on the interfaces), Ts,
+Tatm and lev, and the diagnostics as attributes. calc_olr and the batched path
+pick one by name from ENGINES:
+
+- "rrtmg": climlab's clear-sky RRTMG, the reference.
+- "gray": a NumPy two-stream model with a few longwave bands of gray absorbers
+  and a gray shortwave. It is vectorized over columns and orders of magnitude
+  faster than RRTMG, but only approximate: it is meant for previews (e.g. while
+  a slider is dragged), with RRTMG run for the final values.
+
+validate_engine measures the error of an engine against RRTMG over a grid of
+surface temperatures, humidities and CO2 concentrations, and fit_gray_engine
+fits the gray coefficients to RRTMG on that grid; they can be run with
+
+    python -m climviz.models.engines gray [--fit]
+
+Previews only show the quantities whose error is within VALIDATION_TOLERANCE
+(see within_tolerance).
+"""
+
+import argparse
+import pprint
+
+import climlab
+import numpy as np
+import scipy.optimize
+
+# Gravity (m/s²) and Stefan-Boltzmann constant (W/m²/K⁴)
+GRAVITY = 9.80665
+STEFAN_BOLTZMANN = 5.670374e-8
+# Diffusivity factor of the two-stream approximation
+DIFFUSIVITY = 1.66
+# climlab's defaults for RRTMG: mean insolation (W/m²), cosine of the zenith
+# angle and surface albedo
+DEFAULT_INSOLATION = 341.3
+DEFAULT_COSZEN = 0.25
+SURFACE_ALBEDO = 0.3
+
+# Longwave bands of the gray engine: fraction of the Planck emission in the
+# band and absorption coefficients. "H2O" is per water vapour path (m²/kg); for
+# the well-mixed gases the column optical depth is coefficient * sqrt(vmr), the
+# square root standing for the saturation of the band centres.
+LW_BANDS = {
+    "h2o": (0.40, {"H2O": 0.15}),
+    "co2": (0.20, {"H2O": 0.02, "CO2": 360.0}),
+    "ch4_n2o": (0.10, {"H2O": 0.05, "CH4": 750.0, "N2O": 900.0}),
+    "window": (
+        0.30,
+        {
+            "H2O": 0.02,
+            "O3": 1000.0,
+            "CFC11": 3000.0,
+            "CFC12": 3000.0,
+            "CFC22": 3000.0,
+            "CCL4": 3000.0,
+        },
+    ),
+}
+# Shortwave bands of the gray engine: fraction of the insolation in the band
+# and absorption coefficients. Water vapour only absorbs in the near infrared,
+# in strong lines: its slant optical depth grows with the square root of the
+# water vapour path above (H2O in (m²/kg)^1/2), so the band saturates and the
+# ASR depends little on the humidity, as in RRTMG.
+SW_BANDS = {
+    "visible": (0.8, {"O3": 100.0}),
+    "near_ir": (0.2, {"H2O": 0.035}),
+}
+
+# Parameter grid of validate_engine: SST (K), relative humidity, CO2 (ppm)
+VALIDATION_GRID = {
+    "SST": np.arange(250.0, 311.0, 10.0),
+    "RH": np.array([0.2, 0.5, 0.8, 1.0]),
+    "CO2": np.array([0.0, 140.0, 280.0, 560.0, 1120.0, 2240.0]),
+}
+# Quantities compared by validate_engine
+VALIDATION_QUANTITIES = ("OLR", "ASR", "net_flux")
+# RMS error (W/m²) against RRTMG up to which a quantity of an approximate
+# engine is shown in previews
+VALIDATION_TOLERANCE = {"OLR": 5.0, "ASR": 5.0, "net_flux": 5.0}
+
+
+class RadiationEngine:
+    """
+    Interface of the engines.
+    """
+
+    def make(
+        self,
+        state,
+        specific_humidity,
+        absorber_vmr: dict,
+        bands: str = "both",
+        return_spectral_olr: bool = False,
+        **solar,
+    ):
+        """
+        Radiation process for the bands "both", "lw" or "sw".
+
+        solar are extra shortwave inputs (e.g. insolation and coszen per
+        column), ignored by the longwave.
+        """
+        raise NotImplementedError
+
+
+class RRTMGEngine(RadiationEngine):
+    """
+    climlab's clear-sky RRTMG.
+    """
+
+    def make(
+        self,
+        state,
+        specific_humidity,
+        absorber_vmr,
+        bands="both",
+        return_spectral_olr=False,
+        **solar,
+    ):
+        if bands == "both":
+            return climlab.radiation.rrtm.RRTMG(
+                state=state,
+                specific_humidity=specific_humidity,
+                icld=0,  # Clear-sky only!
+                return_spectral_olr=return_spectral_olr,
+                absorber_vmr=absorber_vmr,
+                **solar,
+            )
+        if bands == "lw":
+            return climlab.radiation.rrtm.RRTMG_LW(
+                state=state,
+                specific_humidity=specific_humidity,
+                icld=0,
+                return_spectral_olr=return_spectral_olr,
+                absorber_vmr=absorber_vmr,
+            )
+        if bands == "sw":
+            return climlab.radiation.rrtm.RRTMG_SW(
+                state=state,
+                specific_humidity=specific_humidity,
+                icld=0,
+                absorber_vmr=absorber_vmr,
+                **solar,
+            )
+        raise ValueError(f"bands must be 'both', 'lw' or 'sw', got {bands!r}")
+
+
+class GrayEngine(RadiationEngine):
+    """
+    Two-stream gray band model in NumPy (see LW_BANDS and SW_BANDS, the
+    default coefficients).
+    """
+
+    def __init__(self, lw_bands: dict = LW_BANDS, sw_bands: dict = SW_BANDS):
+        self.lw_bands = lw_bands
+        self.sw_bands = sw_bands
+
+    def make(
+        self,
+        state,
+        specific_humidity,
+        absorber_vmr,
+        bands="both",
+        return_spectral_olr=False,
+        **solar,
+    ):
+        if bands not in ("both", "lw", "sw"):
+            raise ValueError(f"bands must be 'both', 'lw' or 'sw', got {bands!r}")
+        return GrayRadiation(
+            state,
+            specific_humidity,
+            absorber_vmr,
+            bands,
+            return_spectral_olr=return_spectral_olr,
+            lw_bands=self.lw_bands,
+            sw_bands=self.sw_bands,
+            **solar,
+        )
+
+
+class GrayRadiation:
+    """
+    Radiation process of the gray engine.
+
+    Like climlab's processes, the diagnostics are filled in by
+    compute_diagnostics and can be read as attributes (rad.OLR, rad.ASR...).
+    Single columns and batched columns (one per "latitude") are supported.
+    """
+
+    def __init__(
+        self,
+        state,
+        specific_humidity,
+        absorber_vmr: dict,
+        bands: str = "both",
+        return_spectral_olr: bool = False,
+        insolation=DEFAULT_INSOLATION,
+        coszen=DEFAULT_COSZEN,
+        lw_bands: dict = LW_BANDS,
+        sw_bands: dict = SW_BANDS,
+    ):
+        self.state = state
+        self.Ts = state["Ts"]
+        self.Tatm = state["Tatm"]
+        lev_axis = state["Tatm"].domain.axes["lev"]
+        self.lev = lev_axis.points
+        self.lev_bounds = lev_axis.bounds
+        self.specific_humidity = specific_humidity
+        self.absorber_vmr = absorber_vmr
+        self.bands = bands
+        self.return_spectral_olr = return_spectral_olr
+        self.insolation = insolation
+        self.coszen = coszen
+        self.lw_bands = lw_bands
+        self.sw_bands = sw_bands
+        self.diagnostics = {}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["diagnostics"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def compute_diagnostics(self):
+        num_lev = len(self.lev)
+        Ts = np.asarray(self.Ts, dtype=float).reshape(-1)
+        num_columns = Ts.size
+        Tatm = np.asarray(self.Tatm, dtype=float).reshape(num_columns, num_lev)
+        q = np.asarray(self.specific_humidity, dtype=float).reshape(Tatm.shape)
+
+        # Water vapour path (kg/m²) of the layers, and the weights spreading
+        # the column optical depth of a well-mixed gas over them (pressure
+        # broadening makes the absorption grow linearly with pressure)
+        p_surface = self.lev_bounds[-1]
+        dp = np.diff(self.lev_bounds)
+        water_path = q * dp * 100.0 / GRAVITY
+        weights = 2.0 * self.lev * dp / p_surface**2
+
+        vmr = {
+            gas: self._per_layer(value, num_columns, num_lev)
+            for gas, value in self.absorber_vmr.items()
+        }
+
+        # Water vapour path above each interface, for the saturated lines
+        sqrt_path = np.sqrt(
+            np.concatenate(
+                [np.zeros((num_columns, 1)), np.cumsum(water_path, axis=-1)], axis=-1
+            )
+        )
+
+        def optical_depth(coefficients, strong_lines=False):
+            tau = np.zeros_like(Tatm)
+            for absorber, coefficient in coefficients.items():
+                if absorber == "H2O" and strong_lines:
+                    tau += coefficient * np.diff(sqrt_path, axis=-1)
+                elif absorber == "H2O":
+                    tau += coefficient * water_path
+                elif absorber in vmr:
+                    tau += (
+                        coefficient * np.sqrt(np.maximum(vmr[absorber], 0.0)) * weights
+                    )
+            return tau
+
+        interfaces = self.Tatm.shape[:-1] + (num_lev + 1,)
+        diagnostics = {}
+        if self.bands in ("both", "lw"):
+            fractions = np.array([fraction for fraction, _ in self.lw_bands.values()])
+            tau = np.stack([optical_depth(c) for _, c in self.lw_bands.values()])
+            up, down = _longwave_fluxes(fractions, tau, Tatm, Ts)
+            diagnostics["OLR"] = up[..., 0].sum(axis=0).reshape(self.Ts.shape)
+            diagnostics["LW_flux_up"] = up.sum(axis=0).reshape(interfaces)
+            diagnostics["LW_flux_down"] = down.sum(axis=0).reshape(interfaces)
+            diagnostics["LW_flux_net"] = (
+                diagnostics["LW_flux_up"] - diagnostics["LW_flux_down"]
+            )
+            if self.return_spectral_olr:
+                diagnostics["OLR_bands"] = dict(zip(self.lw_bands, up[..., 0]))
+        if self.bands in ("both", "sw"):
+            insolation = np.broadcast_to(
+                np.asarray(self.insolation, dtype=float).reshape(-1), (num_columns,)
+            )
+            coszen = np.broadcast_to(
+                np.asarray(self.coszen, dtype=float).reshape(-1), (num_columns,)
+            )
+            fractions = np.array([fraction for fraction, _ in self.sw_bands.values()])
+            tau = np.stack(
+                [optical_depth(c, strong_lines=True) for _, c in self.sw_bands.values()]
+            )
+            up, down = _shortwave_fluxes(fractions, tau, insolation, coszen)
+            diagnostics["ASR"] = (down[:, 0] - up[:, 0]).reshape(self.Ts.shape)
+            diagnostics["SW_flux_up"] = up.reshape(interfaces)
+            diagnostics["SW_flux_down"] = down.reshape(interfaces)
+            diagnostics["SW_flux_net"] = (
+                diagnostics["SW_flux_down"] - diagnostics["SW_flux_up"]
+            )
+        self.diagnostics = diagnostics
+
+    @staticmethod
+    def _per_layer(value, num_columns, num_lev) -> np.ndarray:
+        """
+        A scalar, one value per column or one profile per column, broadcast to
+        shape (num_columns, num_lev).
+        """
+        value = np.asarray(value, dtype=float)
+        if value.size > 1:
+            value = value.reshape(num_columns, -1)
+        return np.broadcast_to(value, (num_columns, num_lev))
+
+
+def _longwave_fluxes(fractions, tau, Tatm, Ts):
+    """
+    Upward and downward fluxes on the interfaces (top first) of each band,
+    shape (num_bands, num_columns, num_lev + 1), for isothermal layers of
+    optical depth tau (num_bands, num_columns, num_lev).
+    """
+    num_lev = Tatm.shape[-1]
+    transmission = np.exp(-DIFFUSIVITY * tau)
+    emission = (1.0 - transmission) * (
+        fractions[:, None, None] * STEFAN_BOLTZMANN * Tatm**4
+    )
+
+    up = np.empty(tau.shape[:-1] + (num_lev + 1,))
+    down = np.empty_like(up)
+    up[..., num_lev] = fractions[:, None] * STEFAN_BOLTZMANN * Ts**4
+    down[..., 0] = 0.0
+    for k in range(num_lev - 1, -1, -1):
+        up[..., k] = up[..., k + 1] * transmission[..., k] + emission[..., k]
+    for k in range(num_lev):
+        down[..., k + 1] = down[..., k] * transmission[..., k] + emission[..., k]
+    return up, down
+
+
+def _shortwave_fluxes(fractions, tau, insolation, coszen):
+    """
+    Upward and downward shortwave fluxes on the interfaces (top first), summed
+    over the bands, shape (num_columns, num_lev + 1), for layers of optical
+    depth tau (num_bands, num_columns, num_lev): the direct beam is absorbed
+    along its slant path, reflected by the surface and absorbed again as a
+    diffuse beam.
+    """
+    num_lev = tau.shape[-1]
+    slant = np.exp(-tau / np.maximum(coszen, 1e-3)[:, None])
+    diffuse = np.exp(-DIFFUSIVITY * tau)
+
+    up = np.empty(tau.shape[:-1] + (num_lev + 1,))
+    down = np.empty_like(up)
+    down[..., 0] = fractions[:, None] * np.where(coszen > 0, insolation, 0.0)
+    down[..., 1:] = down[..., :1] * np.cumprod(slant, axis=-1)
+    up[..., num_lev] = SURFACE_ALBEDO * down[..., num_lev]
+    up[..., :-1] = up[..., -1:] * np.cumprod(diffuse[..., ::-1], axis=-1)[..., ::-1]
+    return up.sum(axis=0), down.sum(axis=0)
+
+
+# Engine name -> engine
+ENGINES = {"rrtmg": RRTMGEngine(), "gray": GrayEngine()}
+
+
+def get_engine(name) -> RadiationEngine:
+    """
+    The engine of that name (an engine instance is returned as is).
+    """
+    if not isinstance(name, str):
+        return name
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name!r}, expected one of {list(ENGINES)}")
+    return ENGINES[name]
+
+
+def _validation_columns(absorber_vmr, SST, RH, CO2, Tstrat, qStrat, num_lev):
+    """
+    The columns of the validation grid: surface temperatures, temperature and
+    humidity profiles, absorbers and grid shape.
+    """
+    from climviz.models.batch import make_idealized_columns
+    from climviz.models.rrtm import absorber_vmr as default_absorber_vmr
+
+    absorber_vmr = dict(default_absorber_vmr if absorber_vmr is None else absorber_vmr)
+    SST, RH, CO2 = (np.atleast_1d(np.asarray(v, dtype=float)) for v in (SST, RH, CO2))
+    grid = np.meshgrid(SST, RH, CO2, indexing="ij")
+    cells_SST, cells_RH, cells_CO2 = (g.ravel() for g in grid)
+
+    state, h2o = make_idealized_columns(
+        cells_SST, RH=cells_RH, Tstrat=Tstrat, qStrat=qStrat, num_lev=num_lev
+    )
+    Tatm = np.asarray(state["Tatm"]).reshape(len(cells_SST), num_lev)
+    q = np.asarray(h2o.q).reshape(Tatm.shape)
+    absorbers = {**absorber_vmr, "CO2": cells_CO2 * 1e-6}
+    return cells_SST, Tatm, q, absorbers, grid[0].shape
+
+
+def _validation_values(engine, columns) -> dict:
+    from climviz.models.batch import calc_radiation_batch
+
+    SST, Tatm, q, absorbers, _ = columns
+    rad = calc_radiation_batch(SST, Tatm, q, absorbers, engine=engine)
+    OLR, ASR = np.ravel(rad.OLR), np.ravel(rad.ASR)
+    return {"OLR": OLR, "ASR": ASR, "net_flux": ASR - OLR}
+
+
+def validate_engine(
+    engine,
+    absorber_vmr: dict | None = None,
+    SST=VALIDATION_GRID["SST"],
+    RH=VALIDATION_GRID["RH"],
+    CO2=VALIDATION_GRID["CO2"],
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+    reference: str = "rrtmg",
+) -> dict:
+    """
+    Error of an engine (a name or a RadiationEngine) against the reference
+    engine over the grid of SST (K), relative humidity and CO2 (ppm), the other
+    gases being those of absorber_vmr.
+
+    Returns, for each of VALIDATION_QUANTITIES (net_flux is ASR - OLR), the
+    bias, RMS and maximum absolute error (W/m²) and the errors on the grid
+    (shape (len(SST), len(RH), len(CO2))).
+    """
+    columns = _validation_columns(absorber_vmr, SST, RH, CO2, Tstrat, qStrat, num_lev)
+    values = _validation_values(engine, columns)
+    reference_values = _validation_values(reference, columns)
+
+    report = {}
+    for quantity in VALIDATION_QUANTITIES:
+        error = values[quantity] - reference_values[quantity]
+        report[quantity] = {
+            "bias": float(np.mean(error)),
+            "rmse": float(np.sqrt(np.mean(error**2))),
+            "max_abs": float(np.max(np.abs(error))),
+            "errors": error.reshape(columns[-1]),
+        }
+    return report
+
+
+def within_tolerance(report: dict, tolerance: dict = VALIDATION_TOLERANCE) -> set:
+    """
+    The quantities of a validate_engine report whose RMS error is within the
+    tolerance (W/m²).
+    """
+    return {
+        quantity
+        for quantity, errors in report.items()
+        if errors["rmse"] <= tolerance.get(quantity, 0.0)
+    }
+
+
+def _gray_coefficients(lw_bands: dict, sw_bands: dict) -> list:
+    """
+    (kind, band, absorber) of the coefficients of the gray engine.
+    """
+    return [
+        (kind, band, absorber)
+        for kind, bands in (("lw", lw_bands), ("sw", sw_bands))
+        for band, (_, coefficients) in bands.items()
+        for absorber in coefficients
+    ]
+
+
+def fit_gray_engine(
+    absorber_vmr: dict | None = None,
+    SST=VALIDATION_GRID["SST"],
+    RH=VALIDATION_GRID["RH"],
+    CO2=VALIDATION_GRID["CO2"],
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+    reference: str = "rrtmg",
+    lw_bands: dict = LW_BANDS,
+    sw_bands: dict = SW_BANDS,
+) -> GrayEngine:
+    """
+    Gray engine whose absorption coefficients minimize the error of OLR and
+    ASR against the reference engine over the validation grid (least squares
+    on the logarithm of the coefficients, starting from lw_bands and
+    sw_bands; the band fractions are kept).
+    """
+    columns = _validation_columns(absorber_vmr, SST, RH, CO2, Tstrat, qStrat, num_lev)
+    reference_values = _validation_values(reference, columns)
+    target = np.concatenate([reference_values["OLR"], reference_values["ASR"]])
+    keys = _gray_coefficients(lw_bands, sw_bands)
+
+    def make_engine(log_coefficients):
+        bands = {
+            "lw": {b: (f, dict(c)) for b, (f, c) in lw_bands.items()},
+            "sw": {b: (f, dict(c)) for b, (f, c) in sw_bands.items()},
+        }
+        for (kind, band, absorber), value in zip(keys, np.exp(log_coefficients)):
+            bands[kind][band][1][absorber] = float(value)
+        return GrayEngine(bands["lw"], bands["sw"])
+
+    def residuals(log_coefficients):
+        values = _validation_values(make_engine(log_coefficients), columns)
+        return np.concatenate([values["OLR"], values["ASR"]]) - target
+
+    bands = {"lw": lw_bands, "sw": sw_bands}
+    start = np.log([bands[kind][band][1][absorber] for kind, band, absorber in keys])
+    fit = scipy.optimize.least_squares(residuals, start)
+    return make_engine(fit.x)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report the error of a radiation engine against RRTMG."
+    )
+    parser.add_argument("engine", choices=list(ENGINES))
+    parser.add_argument("--num-lev", type=int, default=100)
+    parser.add_argument(
+        "--fit",
+        action="store_true",
+        help="fit the gray coefficients to RRTMG first and print them",
+    )
+    args = parser.parse_args()
+
+    engine = args.engine
+    if args.fit:
+        engine = fit_gray_engine(num_lev=args.num_lev)
+        print("LW_BANDS =", pprint.pformat(engine.lw_bands))
+        print("SW_BANDS =", pprint.pformat(engine.sw_bands))
+    report = validate_engine(engine, num_lev=args.num_lev)
+    passed = within_tolerance(report)
+    print(f"{'':10} {'bias':>9} {'rmse':>9} {'max_abs':>9}  (W/m², vs RRTMG)")
+    for quantity, errors in report.items():
+        print(
+            f"{quantity:10} {errors['bias']:9.2f} {errors['rmse']:9.2f} "
+            f"{errors['max_abs']:9.2f}  "
+            f"{'ok' if quantity in passed else 'out of tolerance'}"
+        )
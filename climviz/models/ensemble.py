@@ -0,0 +1,311 @@
+"""
+Monte Carlo ensembles: uncertainty of OLR, net flux and equilibrium Ts.
+
+Parameters (relative humidity, gases, stratospheric temperature, ...) are drawn
+from distributions given as plain dicts, e.g.
+
+    {
+        "rel_humidity": {"dist": "uniform", "low": 0.6, "high": 0.9},
+        "CO2": {"dist": "lognormal", "median": 400e-6, "sigma": 0.3},
+        "Tstrat": {"dist": "normal", "mean": 195.0, "std": 5.0},
+    }
+
+Members are evaluated by batches, each batch in one batched RRTMG call (see
+climviz.models.batch), and folded into streaming statistics as they complete:
+mean and variance (Welford), quantiles (P² algorithm) and fixed-bin histograms,
+so that memory does not grow with the size of the ensemble.
+"""
+
+import math
+
+import numpy as np
+
+from climviz.models.batch import calc_olr_batch, find_equilibrium_batch
+
+# Supported distributions and their parameters
+DISTRIBUTIONS = {
+    "uniform": ("low", "high"),
+    "normal": ("mean", "std"),
+    "lognormal": ("median", "sigma"),
+}
+# Parameters that can be sampled, besides the gases of absorber_vmr
+SAMPLED_PARAMETERS = ("rel_humidity", "Tstrat")
+# Quantities computed for each member, with their histogram range
+ENSEMBLE_QUANTITIES = {
+    "OLR": (100.0, 400.0),
+    "net_flux": (-150.0, 150.0),
+    "Ts": (200.0, 350.0),
+}
+ENSEMBLE_PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+HISTOGRAM_BINS = 60
+
+
+def sample_parameters(distributions: dict, size: int, seed=None) -> dict:
+    """
+    Draw size values of each parameter of distributions.
+    """
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name, spec in distributions.items():
+        dist = spec.get("dist")
+        if dist not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown distribution {dist!r} for {name}, "
+                f"expected one of {list(DISTRIBUTIONS)}"
+            )
+        a, b = (float(spec[key]) for key in DISTRIBUTIONS[dist])
+        if dist == "uniform":
+            samples[name] = rng.uniform(a, b, size)
+        elif dist == "normal":
+            samples[name] = rng.normal(a, b, size)
+        else:
+            samples[name] = a * np.exp(rng.normal(0.0, b, size))
+    return samples
+
+
+def evaluate_members(
+    distributions: dict,
+    size: int,
+    seed: int,
+    absorber_vmr: dict,
+    SST: float = 288.0,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+) -> dict:
+    """
+    Draw size members and compute their OLR and net flux (OLR - ASR, W/m²) at
+    the surface temperature SST, and their equilibrium Ts (K, NaN when there is
+    none). Parameters without a distribution keep the value given here.
+    """
+    unknown = set(distributions) - set(SAMPLED_PARAMETERS) - set(absorber_vmr)
+    if unknown:
+        raise ValueError(f"Cannot sample {sorted(unknown)}")
+
+    samples = sample_parameters(distributions, size, seed)
+    # Mixing ratios and relative humidity cannot be negative
+    for name in samples:
+        if name != "Tstrat":
+            samples[name] = np.maximum(samples[name], 0.0)
+    if "rel_humidity" in samples:
+        samples["rel_humidity"] = np.minimum(samples["rel_humidity"], 1.0)
+
+    gases = {
+        gas: samples.get(gas, np.full(size, float(value)))
+        for gas, value in absorber_vmr.items()
+    }
+    RH = samples.get("rel_humidity", np.full(size, rel_humidity))
+    Tstrat = samples.get("Tstrat", np.full(size, Tstrat))
+
+    _, _, rad = calc_olr_batch(
+        np.full(size, SST), gases, RH=RH, Tstrat=Tstrat, qStrat=qStrat, num_lev=num_lev
+    )
+    Ts = find_equilibrium_batch(
+        gases, Tstrat=Tstrat, rel_humidity=RH, qStrat=qStrat, num_lev=num_lev
+    )
+    OLR = np.ravel(rad.OLR)
+    return {
+        "samples": samples,
+        "OLR": OLR,
+        "net_flux": OLR - np.ravel(rad.ASR),
+        "Ts": Ts,
+    }
+
+
+class RunningMoments:
+    """
+    Count, mean and variance updated one batch at a time (Welford's algorithm,
+    with Chan's formula to merge a whole batch).
+    """
+
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        n = values.size
+        if n == 0:
+            return
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """
+    Streaming estimate of the p-quantile with five markers (the P² algorithm of
+    Jain and Chlamtac, 1985).
+    """
+
+    __slots__ = ("p", "_heights", "_positions", "_desired", "_increments")
+
+    def __init__(self, p: float):
+        self.p = p
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def update(self, values):
+        for x in np.asarray(values, dtype=float).ravel().tolist():
+            self._add(x)
+
+    def _add(self, x):
+        q = self._heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        n = self._positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    @property
+    def value(self) -> float:
+        if not self._heights:
+            return float("nan")
+        if len(self._heights) < 5:
+            return float(np.quantile(self._heights, self.p))
+        return self._heights[2]
+
+
+class Histogram:
+    """
+    Counts in fixed bins, plus the values below and above the range.
+    """
+
+    __slots__ = ("edges", "counts", "underflow", "overflow")
+
+    def __init__(self, low: float, high: float, bins: int = HISTOGRAM_BINS):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins, dtype=int)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        self.counts += np.histogram(values, self.edges)[0]
+        self.underflow += int((values < self.edges[0]).sum())
+        self.overflow += int((values > self.edges[-1]).sum())
+
+
+class QuantityStatistics:
+    """
+    Streaming statistics of one quantity; NaN values (e.g. members without an
+    equilibrium) are only counted.
+    """
+
+    def __init__(self, low, high, percentiles=ENSEMBLE_PERCENTILES):
+        self.moments = RunningMoments()
+        self.quantiles = [P2Quantile(p) for p in percentiles]
+        self.histogram = Histogram(low, high)
+        self.missing = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        valid = values[np.isfinite(values)]
+        self.missing += values.size - valid.size
+        self.moments.update(valid)
+        self.histogram.update(valid)
+        for quantile in self.quantiles:
+            quantile.update(valid)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.moments.count,
+            "missing": self.missing,
+            "mean": self.moments.mean if self.moments.count else float("nan"),
+            "std": self.moments.std,
+            "percentiles": {q.p: q.value for q in self.quantiles},
+            "histogram": {
+                "edges": self.histogram.edges.tolist(),
+                "counts": self.histogram.counts.tolist(),
+                "underflow": self.histogram.underflow,
+                "overflow": self.histogram.overflow,
+            },
+        }
+
+
+class EnsembleStatistics:
+    """
+    Streaming statistics of all the ENSEMBLE_QUANTITIES, with the history of the
+    percentiles after each batch (to show how the bands settle).
+    """
+
+    def __init__(self, quantities=ENSEMBLE_QUANTITIES):
+        self.quantities = {
+            name: QuantityStatistics(low, high)
+            for name, (low, high) in quantities.items()
+        }
+        self.members = 0
+        self.history = []
+
+    def update(self, batch: dict):
+        for name, statistics in self.quantities.items():
+            statistics.update(batch[name])
+        self.members += np.size(batch[next(iter(self.quantities))])
+        self.history.append(
+            {
+                "members": self.members,
+                **{
+                    name: {
+                        "mean": statistics.moments.mean,
+                        "percentiles": [q.value for q in statistics.quantiles],
+                    }
+                    for name, statistics in self.quantities.items()
+                },
+            }
+        )
+
+    def summary(self) -> dict:
+        return {
+            "members": self.members,
+            "quantities": {
+                name: statistics.summary()
+                for name, statistics in self.quantities.items()
+            },
+            "history": list(self.history),
+        }
@@ -0,0 +1,1008 @@
+"""
+Model entry points used by the pages.
+
+Model runs are executed by a backend: by default a supervised pool of worker
+processes (see climviz.models.workers), or in the calling thread when
+CLIMVIZ_EXECUTION_BACKEND=inline. Concurrent requests for the same model run
+(several sessions on the defaults, double-clicks on the equilibrium button, ...)
+are coalesced into a single computation whose result is shared by all of them.
+Runs are admitted onto the workers by a priority scheduler (see
+climviz.models.scheduler), so that batch work cannot starve interactive runs.
+
+Callers that must answer quickly (the page callbacks) pass a deadline,
+usually the current time: the run is then started on a request thread, and
+ModelTimeoutError is raised if it is not done by the deadline. The run goes on
+and the same call made again (the page polling) picks its result up, so the
+web server threads never wait for the workers. Long work (sweeps, ensembles)
+is started in the background and polled in the same way.
+"""
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+from climviz.models.distributed import open_queue, run_distributed_sweep
+from climviz.models.engines import VALIDATION_QUANTITIES
+from climviz.models.ensemble import EnsembleStatistics
+from climviz.models.grid import get_grid
+from climviz.models.result import RESULT_FIELDS, ModelResult
+from climviz.models.rrtm import calc_olr, summarize_column
+from climviz.models.scheduler import (
+    INTERACTIVE,
+    OverloadedError,
+    Scheduler,
+    current_session,
+)
+from climviz.models.scenario import (
+    DEFAULT_TOLERANCE,
+    interpolate_steps,
+    select_key_steps,
+    split_chunks,
+)
+from climviz.models.singleflight import SingleFlight, canonical_key
+from climviz.models.sweep import SweepPlan
+from climviz.models.tabulation import NetFluxCurve
+from climviz.models.workers import DEFAULT_TASK_TIMEOUT, WorkerPool, run_task
+
+# "process" (worker pool) or "inline" (run in the request thread)
+EXECUTION_BACKEND = os.environ.get("CLIMVIZ_EXECUTION_BACKEND", "process")
+# Number of model worker processes (defaults to the number of CPUs; at least
+# scheduler.MIN_SLOTS for interactive runs never to wait for batch work)
+NUM_WORKERS = int(os.environ.get("CLIMVIZ_NUM_WORKERS", 0)) or None
+# Time (s) a single model run may take before its worker is restarted
+TASK_TIMEOUT = float(os.environ.get("CLIMVIZ_TASK_TIMEOUT", DEFAULT_TASK_TIMEOUT))
+# Threads waiting for the model runs of requests with a deadline
+REQUEST_THREADS = int(os.environ.get("CLIMVIZ_REQUEST_THREADS", 64))
+# Queue URL of the distributed sweep workers (sweeps run locally when unset;
+# distributed sweeps are not admitted by the local scheduler)
+SWEEP_QUEUE = os.environ.get("CLIMVIZ_SWEEP_QUEUE")
+# Levels of the interactive columns run while the workers are congested
+COARSE_NUM_LEV = 30
+# Equilibria from the tabulated net flux curves kept in memory (one per
+# configuration)
+MAX_CURVES = 256
+# Results of single configurations kept in memory (see run_points)
+MAX_POINTS = 1024
+# Finished runs that missed their deadline, kept until asked for again
+MAX_LATE_RESULTS = 64
+# Members per batch of an ensemble, ensembles running at the same time (in
+# total and per session, more are rejected), and kept in memory once finished
+ENSEMBLE_BATCH_SIZE = 100
+MAX_RUNNING_ENSEMBLES = int(os.environ.get("CLIMVIZ_MAX_RUNNING_ENSEMBLES", 4))
+MAX_SESSION_ENSEMBLES = 1
+MAX_ENSEMBLES = 16
+# Background sweeps running at the same time (more are rejected), and kept in
+# memory once finished
+MAX_RUNNING_SWEEPS = int(os.environ.get("CLIMVIZ_MAX_RUNNING_SWEEPS", 4))
+MAX_SWEEPS = 16
+
+flight = SingleFlight()
+
+
+class ModelTimeoutError(TimeoutError):
+    """
+    A model run did not complete before the deadline of its caller. It goes on
+    in the background: calling again picks up its result.
+    """
+
+
+class InlineBackend:
+    """
+    Runs the model tasks in the calling thread.
+    """
+
+    num_workers = os.cpu_count() or 1
+
+    def run(self, task: str, timeout: float | None = None, **kwargs):
+        return run_task(task, **kwargs)
+
+    def shutdown(self):
+        pass
+
+    def metrics(self) -> dict:
+        return {"workers": 0}
+
+
+_backend = None
+_scheduler = None
+_dispatcher = None
+_request_executor = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    The execution backend, started on first use.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if EXECUTION_BACKEND == "inline":
+                _backend = InlineBackend()
+            elif EXECUTION_BACKEND == "process":
+                _backend = WorkerPool(NUM_WORKERS, task_timeout=TASK_TIMEOUT)
+            else:
+                raise ValueError(
+                    f"Unknown execution backend {EXECUTION_BACKEND!r}, "
+                    "expected 'process' or 'inline'"
+                )
+        return _backend
+
+
+def get_scheduler() -> Scheduler:
+    """
+    The scheduler admitting the runs onto the backend's workers.
+    """
+    global _scheduler
+    backend = get_backend()
+    with _backend_lock:
+        if _scheduler is None:
+            _scheduler = Scheduler(backend.num_workers)
+        return _scheduler
+
+
+def _execute(task: str, **kwargs):
+    return get_scheduler().run(task, get_backend().run, task, **kwargs)
+
+
+# Runs started with a deadline (canonical key -> future), until picked up
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _run(task: str, deadline: float | None = None, **kwargs):
+    """
+    Run a task on the backend, coalesced with identical runs in flight. With a
+    deadline (a time.monotonic() time), the run is started on a request thread
+    and ModelTimeoutError is raised if it is not done by then; calling again
+    returns its result once it is.
+    """
+    key = canonical_key(task, **kwargs)
+    if deadline is None:
+        return flight.do(key, _execute, task, **kwargs)
+    return _poll(key, deadline, flight.do, key, _execute, task, **kwargs)
+
+
+def _poll(key, deadline: float, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs), started on a request thread by the first call with
+    this key; raises ModelTimeoutError if it is not done by the deadline.
+    """
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is None:
+            future = get_request_executor().submit(
+                contextvars.copy_context().run, fn, *args, **kwargs
+            )
+            _pending[key] = future
+            _evict_late_results()
+    try:
+        result = future.result(timeout=max(deadline - time.monotonic(), 0.0))
+    except FutureTimeoutError:
+        raise ModelTimeoutError(
+            "The model is still running; try again in a moment."
+        ) from None
+    finally:
+        if future.done():
+            with _pending_lock:
+                if _pending.get(key) is future:
+                    del _pending[key]
+    return result
+
+
+def _evict_late_results():
+    """
+    Drop the oldest finished runs beyond MAX_LATE_RESULTS (runs still going
+    are kept: the scheduler bounds them).
+    """
+    done = [key for key, future in _pending.items() if future.done()]
+    for key in done[: max(len(done) - MAX_LATE_RESULTS, 0)]:
+        del _pending[key]
+
+
+def get_request_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool in which the runs of the requests with a deadline are waited
+    for (separate from the dispatcher, so that they do not queue behind sweeps
+    and ensembles).
+    """
+    global _request_executor
+    with _backend_lock:
+        if _request_executor is None:
+            _request_executor = ThreadPoolExecutor(
+                max_workers=REQUEST_THREADS, thread_name_prefix="climviz-request"
+            )
+        return _request_executor
+
+
+def get_dispatcher() -> ThreadPoolExecutor:
+    """
+    Thread pool (one thread per worker) used to keep all the workers busy.
+    """
+    global _dispatcher
+    backend = get_backend()
+    with _backend_lock:
+        if _dispatcher is None:
+            _dispatcher = ThreadPoolExecutor(
+                max_workers=backend.num_workers, thread_name_prefix="climviz-model"
+            )
+        return _dispatcher
+
+
+def run_many(fn, items) -> list:
+    """
+    map(fn, items) with the calls spread over the backend's workers.
+    """
+    # Each call runs in (a copy of) the context, i.e. session, of the caller
+    context = contextvars.copy_context()
+    return list(get_dispatcher().map(lambda item: context.copy().run(fn, item), items))
+
+
+def run_column(
+    SST,
+    absorber_vmr,
+    RH=0.8,
+    Tstrat=195,
+    qStrat=5e-06,
+    num_lev=100,
+    bands="both",
+    engine="rrtmg",
+    deadline=None,
+    allow_coarse=False,
+) -> ModelResult:
+    """
+    calc_olr on a worker (see summarize_column). With allow_coarse, the column
+    has COARSE_NUM_LEV levels when the interactive runs are congested.
+    """
+    if allow_coarse and get_scheduler().congested(INTERACTIVE):
+        num_lev = min(num_lev, COARSE_NUM_LEV)
+    return _run(
+        "column",
+        deadline=deadline,
+        SST=SST,
+        absorber_vmr=absorber_vmr,
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        bands=bands,
+        engine=engine,
+    )
+
+
+def preview_column(
+    SST,
+    absorber_vmr,
+    RH=0.8,
+    Tstrat=195,
+    qStrat=5e-06,
+    num_lev=100,
+    engine="gray",
+) -> ModelResult:
+    """
+    calc_olr with a fast engine, in the calling thread: it takes a few
+    milliseconds, less than handing it over to a worker.
+    """
+    _, _, rad = calc_olr(
+        SST,
+        absorber_vmr,
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        engine=engine,
+    )
+    return summarize_column(rad)
+
+
+def run_equilibrium(
+    absorber_vmr,
+    Tstrat=195.0,
+    rel_humidity=0.8,
+    cache_shortwave=False,
+) -> float:
+    """
+    find_equilibrium_surface_temperature on a worker.
+    """
+    return _run(
+        "equilibrium",
+        absorber_vmr=absorber_vmr,
+        Tstrat=Tstrat,
+        rel_humidity=rel_humidity,
+        cache_shortwave=cache_shortwave,
+    )
+
+
+# Configuration key -> equilibrium surface temperature (K) of its curve
+_curves = {}
+_curves_lock = threading.Lock()
+
+
+def run_equilibrium_tabulated(
+    absorber_vmr,
+    Tstrat=195.0,
+    rel_humidity=0.8,
+    qStrat=5e-06,
+    num_lev=100,
+    deadline=None,
+) -> float:
+    """
+    Equilibrium surface temperature from the net flux curve of the
+    configuration (see climviz.models.tabulation). The first query of a
+    configuration tabulates the curve in one batched task and polishes its root
+    with one exact evaluation; later queries are answered from memory.
+    Raises NoSignChangeError when the curve has no stable equilibrium.
+
+    With a deadline, both steps run on a request thread (see _run).
+    """
+    settings = dict(
+        absorber_vmr=absorber_vmr,
+        rel_humidity=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+    key = canonical_key("net_flux_curve", **settings)
+    with _curves_lock:
+        cached = _curves.get(key)
+    if cached is not None:
+        return cached
+    if deadline is not None:
+        return _poll(
+            canonical_key("equilibrium_tabulated", **settings),
+            deadline,
+            run_equilibrium_tabulated,
+            **settings,
+        )
+
+    curve = NetFluxCurve(**_run("net_flux_curve", **settings))
+    Ts = curve.root()
+    exact = run_column(
+        Ts,
+        absorber_vmr,
+        RH=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+    Ts = curve.polish(Ts, -float(exact.net_flux[0]))
+    with _curves_lock:
+        while len(_curves) >= MAX_CURVES:
+            _curves.pop(next(iter(_curves)))
+        _curves[key] = Ts
+    return Ts
+
+
+_points = {}
+_points_lock = threading.Lock()
+
+# Per-point fields of the results cached by run_points
+_POINT_FIELDS = tuple(
+    name for name in RESULT_FIELDS if name not in ("lev", "lev_bounds", "altitude")
+)
+
+
+def run_points(
+    SST,
+    absorber_vmr: dict,
+    RH=0.8,
+    Tstrat=195.0,
+    qStrat=5e-06,
+    num_lev=100,
+    deadline=None,
+) -> dict:
+    """
+    evaluate_points for N configurations. Points evaluated before are taken
+    from memory, as are the equilibria of configurations whose net flux curve
+    is known (see run_equilibrium_tabulated); the rest are evaluated together
+    in one batched task.
+
+    Returns the batched result and Ts_eq, like evaluate_points.
+    """
+    num_points = len(SST)
+    per_point = {
+        "SST": np.asarray(SST, dtype=float),
+        "RH": np.broadcast_to(np.asarray(RH, dtype=float), (num_points,)),
+        **{
+            gas: np.broadcast_to(np.asarray(value, dtype=float), (num_points,))
+            for gas, value in absorber_vmr.items()
+        },
+    }
+
+    def settings(i):
+        return dict(
+            absorber_vmr={gas: float(per_point[gas][i]) for gas in absorber_vmr},
+            rel_humidity=float(per_point["RH"][i]),
+            Tstrat=Tstrat,
+            qStrat=qStrat,
+            num_lev=num_lev,
+        )
+
+    keys = [
+        canonical_key("point", SST=float(per_point["SST"][i]), **settings(i))
+        for i in range(num_points)
+    ]
+    with _points_lock:
+        cached = [_points.get(key) for key in keys]
+    with _curves_lock:
+        equilibria = [
+            _curves.get(canonical_key("net_flux_curve", **settings(i)))
+            for i in range(num_points)
+        ]
+
+    missing = [i for i in range(num_points) if cached[i] is None]
+    if missing:
+        solve = [equilibria[i] is None for i in missing]
+        evaluated = _run(
+            "points",
+            deadline=deadline,
+            SST=per_point["SST"][missing],
+            absorber_vmr={gas: per_point[gas][missing] for gas in absorber_vmr},
+            RH=per_point["RH"][missing],
+            Tstrat=Tstrat,
+            qStrat=qStrat,
+            num_lev=num_lev,
+            equilibrium=np.array(solve),
+        )
+        result = evaluated["result"]
+        for j, i in enumerate(missing):
+            cached[i] = {
+                **{
+                    name: np.array(getattr(result, name)[j])
+                    for name in _POINT_FIELDS
+                    if getattr(result, name) is not None
+                },
+                "Ts_eq": (float(evaluated["Ts_eq"][j]) if solve[j] else equilibria[i]),
+            }
+        with _points_lock:
+            for i in missing:
+                while len(_points) >= MAX_POINTS:
+                    _points.pop(next(iter(_points)))
+                _points[keys[i]] = cached[i]
+
+    grid = get_grid(num_lev)
+    result = ModelResult(
+        **{
+            name: np.stack([point[name] for point in cached])
+            for name in _POINT_FIELDS
+            if name in cached[0]
+        },
+        lev=grid.lev,
+        lev_bounds=grid.lev_bounds,
+        altitude=grid.altitude,
+    )
+    return {"result": result, "Ts_eq": np.array([point["Ts_eq"] for point in cached])}
+
+
+def run_inverse(
+    gas,
+    target,
+    absorber_vmr,
+    quantity="Ts",
+    SST=None,
+    Tstrat=195.0,
+    rel_humidity=0.8,
+    deadline=None,
+) -> dict:
+    """
+    solve_gas_for_target on a worker.
+    """
+    return _run(
+        "inverse",
+        deadline=deadline,
+        gas=gas,
+        target=target,
+        absorber_vmr=absorber_vmr,
+        quantity=quantity,
+        SST=SST,
+        Tstrat=Tstrat,
+        rel_humidity=rel_humidity,
+    )
+
+
+def run_continuation(
+    parameter,
+    start,
+    stop,
+    absorber_vmr,
+    Tstrat=195.0,
+    rel_humidity=0.8,
+    deadline=None,
+) -> dict:
+    """
+    trace_equilibrium on a worker.
+    """
+    return _run(
+        "continuation",
+        deadline=deadline,
+        parameter=parameter,
+        start=start,
+        stop=stop,
+        absorber_vmr=absorber_vmr,
+        Tstrat=Tstrat,
+        rel_humidity=rel_humidity,
+    )
+
+
+def run_diagnostics(
+    absorber_vmr,
+    rel_humidity=0.8,
+    Tstrat=195.0,
+    qStrat=5e-06,
+    num_lev=100,
+    gas="CO2",
+    factor=2.0,
+    deadline=None,
+) -> dict:
+    """
+    radiative_diagnostics on a worker.
+    """
+    return _run(
+        "diagnostics",
+        deadline=deadline,
+        absorber_vmr=absorber_vmr,
+        rel_humidity=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        gas=gas,
+        factor=factor,
+    )
+
+
+def run_feedbacks(
+    absorber_vmr,
+    rel_humidity=0.8,
+    Tstrat=195.0,
+    qStrat=5e-06,
+    num_lev=100,
+    deadline=None,
+) -> dict:
+    """
+    feedback_decomposition on a worker.
+    """
+    return _run(
+        "feedbacks",
+        deadline=deadline,
+        absorber_vmr=absorber_vmr,
+        rel_humidity=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+
+
+def run_latitudes(
+    absorber_vmr,
+    SST_equator=300.0,
+    SST_pole=250.0,
+    RH=0.8,
+    Tstrat=195.0,
+    qStrat=5e-06,
+    num_lev=100,
+    num_lat=90,
+    deadline=None,
+) -> dict:
+    """
+    latitude_profiles on a worker.
+    """
+    return _run(
+        "latitudes",
+        deadline=deadline,
+        absorber_vmr=absorber_vmr,
+        SST_equator=SST_equator,
+        SST_pole=SST_pole,
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        num_lat=num_lat,
+    )
+
+
+# Engine name -> quantities within tolerance of RRTMG (None while validating)
+_validations = {}
+_validations_lock = threading.Lock()
+
+
+def validated_quantities(engine: str) -> set:
+    """
+    The quantities of an engine whose error against RRTMG is within tolerance
+    (see climviz.models.engines.within_tolerance). The first call validates the
+    engine in the background: until then, or if the validation fails, no
+    quantity is.
+    """
+    if engine == "rrtmg":
+        return set(VALIDATION_QUANTITIES)
+    with _validations_lock:
+        if engine in _validations:
+            return set(_validations[engine] or ())
+        _validations[engine] = None
+    thread = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_validate, engine),
+        name=f"climviz-validate-{engine}",
+    )
+    thread.daemon = True
+    thread.start()
+    return set()
+
+
+def _validate(engine: str):
+    try:
+        quantities = _execute("validate_engine", engine=engine)
+    except Exception:
+        quantities = []
+    with _validations_lock:
+        _validations[engine] = quantities
+
+
+def run_scenario(
+    years,
+    concentrations,
+    absorber_vmr,
+    SST=288.0,
+    rel_humidity=0.8,
+    Tstrat=195.0,
+    tolerance=DEFAULT_TOLERANCE,
+    deadline=None,
+) -> dict:
+    """
+    OLR, net flux and equilibrium Ts along a scenario (see
+    climviz.models.scenario): the key steps are split into one chunk per
+    worker, each chunk evaluated in order with warm starts, and the other steps
+    interpolated. concentrations maps gases to their vmr at each year.
+
+    With a deadline, the whole scenario runs on a request thread (see _run).
+    """
+    years = [float(year) for year in years]
+    concentrations = {
+        gas: [float(vmr) for vmr in values] for gas, values in concentrations.items()
+    }
+    if deadline is not None:
+        settings = dict(
+            years=years,
+            concentrations=concentrations,
+            absorber_vmr=absorber_vmr,
+            SST=SST,
+            rel_humidity=rel_humidity,
+            Tstrat=Tstrat,
+            tolerance=tolerance,
+        )
+        return _poll(
+            canonical_key("scenario_run", **settings),
+            deadline,
+            run_scenario,
+            **settings,
+        )
+    key_steps = select_key_steps(concentrations, tolerance)
+    chunks = split_chunks(key_steps, get_backend().num_workers)
+
+    def evaluate(chunk):
+        return _run(
+            "scenario",
+            concentrations={
+                gas: [values[step] for step in chunk]
+                for gas, values in concentrations.items()
+            },
+            absorber_vmr=absorber_vmr,
+            SST=SST,
+            rel_humidity=rel_humidity,
+            Tstrat=Tstrat,
+        )
+
+    results = run_many(evaluate, chunks)
+    values = {
+        name: np.concatenate([result[name] for result in results])
+        for name in results[0]
+    }
+    return {
+        "years": years,
+        "key_steps": key_steps.tolist(),
+        **{
+            name: series.tolist()
+            for name, series in interpolate_steps(years, key_steps, values).items()
+        },
+    }
+
+
+def run_sweep(plan: SweepPlan, on_row, equilibrium=True, rows=None):
+    """
+    Evaluate a sweep plan one row (value of its first dimension) at a time,
+    each row in one batched task and the rows spread over the workers.
+    on_row(i, results) is called with the results of each row, in order, so
+    that large sweeps can be written out without keeping them in memory.
+    rows restricts the evaluation to some of the rows (e.g. those missing from
+    a checkpoint).
+
+    With CLIMVIZ_SWEEP_QUEUE set, the rows are pushed to that queue instead,
+    for the distributed workers (see climviz.models.distributed), and on_row
+    is called as they complete, in any order. Those rows bypass the scheduler:
+    they do not take local workers.
+    """
+    if SWEEP_QUEUE:
+        return run_distributed_sweep(
+            open_queue(SWEEP_QUEUE), plan, on_row, rows=rows, equilibrium=equilibrium
+        )
+
+    rows = list(range(plan.shape[0]) if rows is None else rows)
+    group = get_backend().num_workers
+
+    def evaluate(i):
+        return _run("sweep", plan=plan.select(i).to_dict(), equilibrium=equilibrium)
+
+    for start in range(0, len(rows), group):
+        batch = rows[start : start + group]
+        for i, results in zip(batch, run_many(evaluate, batch)):
+            # Drop the fixed first dimension
+            on_row(i, {name: values[0] for name, values in results.items()})
+
+
+class SweepRun:
+    """
+    A sweep running in the background (see run_sweep), with its progress.
+    """
+
+    def __init__(self, plan: SweepPlan, on_row, rows=None, equilibrium=True, key=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.plan = plan
+        self.on_row = on_row
+        self.rows = list(range(plan.shape[0]) if rows is None else rows)
+        self.equilibrium = equilibrium
+        self.completed = 0
+        self.error = None
+        self.finished = False
+
+    def start(self, on_finish=None):
+        thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run, on_finish),
+            name=f"climviz-sweep-{self.id[:8]}",
+        )
+        thread.daemon = True
+        thread.start()
+
+    def _on_row(self, i, results):
+        self.on_row(i, results)
+        self.completed += 1
+
+    def _run(self, on_finish):
+        try:
+            run_sweep(self.plan, self._on_row, self.equilibrium, self.rows)
+        except Exception as err:
+            self.error = f"{type(err).__name__}: {err}"
+        finally:
+            try:
+                if on_finish is not None:
+                    on_finish()
+            finally:
+                self.finished = True
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "rows": len(self.rows),
+            "completed": self.completed,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+_sweeps = {}
+_sweeps_lock = threading.Lock()
+
+
+def start_sweep(
+    plan: SweepPlan, on_row, rows=None, equilibrium=True, on_finish=None, key=None
+):
+    """
+    Start run_sweep in the background and return its id, to be polled with
+    sweep_status. on_finish() is called once it is over, whether it completed
+    or failed. key (e.g. the dataset written) identifies the sweep for
+    running_sweep. Raises OverloadedError when MAX_RUNNING_SWEEPS are running.
+    """
+    run = SweepRun(plan, on_row, rows=rows, equilibrium=equilibrium, key=key)
+    with _sweeps_lock:
+        if sum(not other.finished for other in _sweeps.values()) >= MAX_RUNNING_SWEEPS:
+            raise OverloadedError(
+                "Too many sensitivity analyses are running, try again later."
+            )
+        # Forget the oldest finished sweeps
+        for run_id in [i for i, other in _sweeps.items() if other.finished]:
+            if len(_sweeps) < MAX_SWEEPS:
+                break
+            del _sweeps[run_id]
+        _sweeps[run.id] = run
+    run.start(on_finish)
+    return run.id
+
+
+def running_sweep(key) -> str | None:
+    """
+    Id of the unfinished sweep started with this key, if any.
+    """
+    with _sweeps_lock:
+        for run in _sweeps.values():
+            if run.key == key and not run.finished:
+                return run.id
+    return None
+
+
+def sweep_status(run_id: str) -> dict:
+    """
+    Progress of a background sweep; raises KeyError for an unknown (or
+    forgotten) sweep.
+    """
+    return _sweeps[run_id].status()
+
+
+class EnsembleRun:
+    """
+    A Monte Carlo ensemble running in the background, batch by batch, with its
+    statistics updated as the batches complete.
+    """
+
+    def __init__(self, size: int, batch_size: int, **settings):
+        self.id = uuid.uuid4().hex
+        self.session = current_session.get()
+        self.size = size
+        self.batch_size = batch_size
+        self.settings = settings
+        self.statistics = EnsembleStatistics()
+        self.error = None
+        self.finished = False
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, seed=None):
+        thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run, seed),
+            name=f"climviz-ensemble-{self.id[:8]}",
+        )
+        thread.daemon = True
+        thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _run(self, seed):
+        dispatcher = get_dispatcher()
+        sizes = [
+            min(self.batch_size, self.size - start)
+            for start in range(0, self.size, self.batch_size)
+        ]
+        # Independent random streams for the batches
+        seeds = [
+            int(child.generate_state(1)[0])
+            for child in np.random.SeedSequence(seed).spawn(len(sizes))
+        ]
+        pending = set()
+        try:
+            # Only one batch per worker is queued at a time, so that other
+            # requests are not stuck behind the whole ensemble
+            while (sizes or pending) and not self._cancelled.is_set():
+                while sizes and len(pending) < get_backend().num_workers:
+                    pending.add(
+                        dispatcher.submit(
+                            contextvars.copy_context().run,
+                            _run,
+                            "ensemble",
+                            size=sizes.pop(0),
+                            seed=seeds.pop(0),
+                            **self.settings,
+                        )
+                    )
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = future.result()
+                    with self._lock:
+                        self.statistics.update(batch)
+        except Exception as err:
+            self.error = f"{type(err).__name__}: {err}"
+        finally:
+            for future in pending:
+                future.cancel()
+            self.finished = True
+
+    def status(self) -> dict:
+        with self._lock:
+            summary = self.statistics.summary()
+        return {
+            "id": self.id,
+            "size": self.size,
+            "finished": self.finished,
+            "error": self.error,
+            **summary,
+        }
+
+
+_ensembles = {}
+_ensembles_lock = threading.Lock()
+
+
+def start_ensemble(
+    distributions,
+    size,
+    absorber_vmr,
+    SST=288.0,
+    rel_humidity=0.8,
+    Tstrat=195.0,
+    qStrat=5e-06,
+    num_lev=100,
+    batch_size=ENSEMBLE_BATCH_SIZE,
+    seed=None,
+) -> str:
+    """
+    Start a Monte Carlo ensemble of size members (see evaluate_members) in the
+    background and return its id, to be polled with ensemble_status. Raises
+    OverloadedError when MAX_RUNNING_ENSEMBLES are running, or
+    MAX_SESSION_ENSEMBLES for the current session.
+    """
+    run = EnsembleRun(
+        int(size),
+        int(batch_size),
+        distributions=distributions,
+        absorber_vmr=absorber_vmr,
+        SST=SST,
+        rel_humidity=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+    with _ensembles_lock:
+        running = [other for other in _ensembles.values() if not other.finished]
+        if len(running) >= MAX_RUNNING_ENSEMBLES:
+            raise OverloadedError("Too many ensembles are running, try again later.")
+        if (
+            sum(other.session == run.session for other in running)
+            >= MAX_SESSION_ENSEMBLES
+        ):
+            raise OverloadedError(
+                "An ensemble is already running, wait for it to finish."
+            )
+        # Forget the oldest finished ensembles
+        for run_id in [i for i, other in _ensembles.items() if other.finished]:
+            if len(_ensembles) < MAX_ENSEMBLES:
+                break
+            del _ensembles[run_id]
+        _ensembles[run.id] = run
+    run.start(seed)
+    return run.id
+
+
+def ensemble_status(run_id: str) -> dict:
+    """
+    Progress and current statistics of an ensemble; raises KeyError for an
+    unknown (or forgotten) ensemble.
+    """
+    return _ensembles[run_id].status()
+
+
+def cancel_ensemble(run_id: str):
+    run = _ensembles.get(run_id)
+    if run is not None and run.session == current_session.get():
+        run.cancel()
+
+
+def execution_metrics() -> dict:
+    """
+    Counters of model calls (requested, actually executed, coalesced into an
+    in-flight computation, failed and currently in flight), of the workers and
+    of the scheduler's priority classes.
+    """
+    backend = _backend
+    scheduler = _scheduler
+    return {
+        **flight.metrics(),
+        "backend": EXECUTION_BACKEND,
+        **(backend.metrics() if backend is not None else {}),
+        **({"scheduler": scheduler.metrics()} if scheduler is not None else {}),
+    }
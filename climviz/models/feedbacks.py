@@ -0,0 +1,168 @@
+"""
+Radiative kernels and the Planck / lapse-rate / water-vapour feedback
+decomposition.
+
+A kernel is the change in net downward TOA flux N = ASR - OLR for a small
+perturbation of one variable at one level, around a base state. All the
+level-by-level perturbations (temperature and specific humidity at each level,
+and the surface temperature) are built as columns of a single batched RRTMG
+run. Kernels are cached per base state; applying them to any perturbation is a
+dot product.
+"""
+
+import functools
+
+import numpy as np
+
+from climviz.models.batch import calc_radiation_batch, make_idealized_columns
+from climviz.models.diagnostics import baseline_column
+from climviz.models.rrtm import hashable, unhashable
+
+# Perturbations used to compute the kernels: temperature (K) and log of the
+# specific humidity
+TEMPERATURE_STEP = 1.0
+LOG_HUMIDITY_STEP = np.log(1.1)
+
+
+class RadiativeKernels:
+    """
+    Net TOA flux kernels around a base state (W/m² per K, or per unit of
+    log specific humidity for the humidity kernel).
+    """
+
+    __slots__ = ("Ts", "Tatm", "q", "net_flux", "surface", "temperature", "humidity")
+
+    def __init__(self, Ts, Tatm, q, net_flux, surface, temperature, humidity):
+        self.Ts = Ts
+        self.Tatm = Tatm
+        self.q = q
+        self.net_flux = net_flux
+        self.surface = surface
+        self.temperature = temperature
+        self.humidity = humidity
+
+    def apply(self, dTs=0.0, dTatm=0.0, dlnq=0.0):
+        """
+        Linear estimate of the change in net flux for perturbations of the
+        surface temperature, the temperature profile and log(q).
+
+        Perturbations can be stacked along leading dimensions (e.g. dTatm of
+        shape (M, num_lev) with dTs of shape (M,)) to evaluate many at once.
+        """
+        num_lev = len(self.temperature)
+        dTatm = np.broadcast_to(dTatm, np.shape(dTatm)[:-1] + (num_lev,))
+        dlnq = np.broadcast_to(dlnq, np.shape(dlnq)[:-1] + (num_lev,))
+        return (
+            self.surface * np.asarray(dTs)
+            + dTatm @ self.temperature
+            + dlnq @ self.humidity
+        )
+
+
+def compute_kernels(Ts, Tatm, q, absorber_vmr: dict) -> RadiativeKernels:
+    """
+    Kernels around the state (Ts, Tatm, q), from one batched radiation run.
+
+    The columns are: the base state, the surface warmed, each level warmed and
+    each level moistened, i.e. 2 * num_lev + 2 columns.
+    """
+    Tatm = np.ravel(Tatm)
+    q = np.ravel(q)
+    num_lev = len(Tatm)
+    num_columns = 2 * num_lev + 2
+
+    Ts_batch = np.full(num_columns, float(Ts))
+    Ts_batch[1] += TEMPERATURE_STEP
+
+    levels = np.arange(num_lev)
+    Tatm_batch = np.tile(Tatm, (num_columns, 1))
+    Tatm_batch[2 + levels, levels] += TEMPERATURE_STEP
+
+    q_batch = np.tile(q, (num_columns, 1))
+    q_batch[2 + num_lev + levels, levels] *= np.exp(LOG_HUMIDITY_STEP)
+
+    rad = calc_radiation_batch(Ts_batch, Tatm_batch, q_batch, absorber_vmr)
+    net_flux = np.ravel(rad.ASR - rad.OLR)
+    change = net_flux - net_flux[0]
+
+    return RadiativeKernels(
+        Ts=float(Ts),
+        Tatm=Tatm,
+        q=q,
+        net_flux=float(net_flux[0]),
+        surface=change[1] / TEMPERATURE_STEP,
+        temperature=change[2 : 2 + num_lev] / TEMPERATURE_STEP,
+        humidity=change[2 + num_lev :] / LOG_HUMIDITY_STEP,
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _configuration_kernels(absorbers, rel_humidity, Tstrat, qStrat, num_lev):
+    absorber_vmr = {gas: unhashable(value) for gas, value in absorbers}
+    Ts, Tatm, q = baseline_column(absorber_vmr, rel_humidity, Tstrat, qStrat, num_lev)
+    return compute_kernels(Ts, Tatm, q, absorber_vmr)
+
+
+def configuration_kernels(
+    absorber_vmr: dict,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+) -> RadiativeKernels:
+    """
+    Kernels around the equilibrium state of a configuration, cached.
+    """
+    absorbers = tuple(
+        sorted((gas, hashable(value)) for gas, value in absorber_vmr.items())
+    )
+    return _configuration_kernels(
+        absorbers, float(rel_humidity), float(Tstrat), float(qStrat), int(num_lev)
+    )
+
+
+def feedback_decomposition(
+    absorber_vmr: dict,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+    warming: float = 1.0,
+) -> dict:
+    """
+    Planck, lapse-rate and water-vapour feedbacks (W/m²/K, as changes of the
+    net downward flux per K of surface warming) of a configuration.
+
+    The response is that of the idealized column (moist adiabat, fixed relative
+    humidity) to a surface warming, around the equilibrium state. The total is
+    also computed directly; the residual measures the non-linearity.
+    """
+    kernels = configuration_kernels(absorber_vmr, rel_humidity, Tstrat, qStrat, num_lev)
+
+    state, h2o = make_idealized_columns(
+        kernels.Ts + warming,
+        RH=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+    Tatm = np.ravel(state["Tatm"])
+    q = np.ravel(h2o.q)
+    dTatm = Tatm - kernels.Tatm
+    dlnq = np.log(q / kernels.q)
+
+    planck = kernels.apply(dTs=warming, dTatm=np.full(num_lev, warming)) / warming
+    lapse_rate = kernels.apply(dTatm=dTatm - warming) / warming
+    water_vapour = kernels.apply(dlnq=dlnq) / warming
+
+    rad = calc_radiation_batch(kernels.Ts + warming, Tatm, q, absorber_vmr)
+    total = (float(np.ravel(rad.ASR - rad.OLR)[0]) - kernels.net_flux) / warming
+
+    return {
+        "Ts": kernels.Ts,
+        "planck": float(planck),
+        "lapse_rate": float(lapse_rate),
+        "water_vapour": float(water_vapour),
+        "total": total,
+        "residual": total - float(planck + lapse_rate + water_vapour),
+    }
@@ -0,0 +1,68 @@
+import functools
+
+import climlab
+import numpy as np
+
+
+class VerticalGrid:
+    """
+    Pressure levels of a climlab column and the derived altitude axes.
+
+    Computed once per number of levels (see get_grid) and shared by the model
+    setup, the figure builders and the exports, so nothing here is recomputed
+    per request. All arrays are read-only.
+    """
+
+    __slots__ = (
+        "num_lev",
+        "lev",
+        "lev_bounds",
+        "altitude",
+        "altitude_bounds",
+        "yaxis",
+    )
+
+    def __init__(self, num_lev: int):
+        from climviz.models.rrtm import convert_pressure_to_altitude
+
+        lev_axis = climlab.column_state(num_lev=num_lev).Tatm.domain.axes["lev"]
+
+        self.num_lev = num_lev
+        # Pressure (hPa) at the levels and at the interfaces
+        self.lev = _read_only(lev_axis.points)
+        self.lev_bounds = _read_only(lev_axis.bounds)
+
+        # Altitude (km) at the levels and at the interfaces. The top interface
+        # (p = 0) is infinitely high, so it is drawn half a layer above the top
+        # level instead.
+        self.altitude = _read_only(
+            convert_pressure_to_altitude(lev_axis.points) / 1000.0
+        )
+        altitude_bounds = (
+            convert_pressure_to_altitude(lev_axis.bounds.clip(min=1e-300)) / 1000.0
+        )
+        altitude_bounds[0] = 2 * self.altitude[0] - altitude_bounds[1]
+        self.altitude_bounds = _read_only(altitude_bounds)
+
+        # Plotly altitude axis covering the whole column
+        self.yaxis = dict(
+            title="Altitude (km)",
+            range=[float(altitude_bounds[-1]), float(altitude_bounds[0])],
+        )
+
+    def __repr__(self):
+        return f"VerticalGrid(num_lev={self.num_lev})"
+
+
+def _read_only(values) -> np.ndarray:
+    values = np.array(values, dtype=float)
+    values.flags.writeable = False
+    return values
+
+
+@functools.lru_cache(maxsize=None)
+def get_grid(num_lev: int = 100) -> VerticalGrid:
+    """
+    The shared VerticalGrid for columns with num_lev levels.
+    """
+    return VerticalGrid(int(num_lev))
@@ -0,0 +1,140 @@
+"""
+Inverse problems: the greenhouse-gas amount giving a target climate.
+
+Given a target equilibrium surface temperature (or a target net flux at a fixed
+surface temperature), solve for the CO2 or CH4 volume mixing ratio. The outer
+root-find works on log(vmr), where the response is close to linear. Each outer
+iterate needs an equilibrium solve; those are cached and warm-started from the
+closest solution found so far, so they only need a few radiation runs each.
+"""
+
+import numpy as np
+import scipy.optimize
+
+from climviz.models.rrtm import (
+    NoSignChangeError,
+    calc_olr,
+    find_equilibrium_surface_temperature,
+)
+
+# Gases that can be solved for
+INVERSE_GASES = ("CO2", "CH4")
+# Quantities that can be targeted
+INVERSE_TARGETS = ("Ts", "net_flux")
+# Default search range of the volume mixing ratio
+DEFAULT_VMR_BOUNDS = (1e-6, 1e-2)
+# Surface temperatures (K) assigned to columns without an equilibrium: below
+# the coldest / above the warmest equilibrium that is searched for
+COLD_LIMIT = 150.0
+RUNAWAY_LIMIT = 400.0
+
+
+class _EquilibriumCache:
+    """
+    Equilibrium surface temperature as a function of one gas' vmr, with cached
+    and warm-started solves.
+    """
+
+    def __init__(self, gas, absorber_vmr, Tstrat, rel_humidity):
+        self.gas = gas
+        self.absorber_vmr = absorber_vmr
+        self.Tstrat = Tstrat
+        self.rel_humidity = rel_humidity
+        self.solutions = {}
+        self.no_solution = {}
+
+    def __call__(self, log_vmr: float) -> float:
+        if log_vmr in self.solutions:
+            return self.solutions[log_vmr]
+        if log_vmr in self.no_solution:
+            return self.no_solution[log_vmr]
+
+        Ts_guess = 275.0
+        if self.solutions:
+            closest = min(self.solutions, key=lambda x: abs(x - log_vmr))
+            Ts_guess = self.solutions[closest]
+
+        try:
+            Ts = find_equilibrium_surface_temperature(
+                {**self.absorber_vmr, self.gas: np.exp(log_vmr)},
+                Tstrat=self.Tstrat,
+                rel_humidity=self.rel_humidity,
+                Ts_guess=Ts_guess,
+            )
+        except NoSignChangeError as err:
+            # Keeps the response monotone, so the outer root-find can go on
+            Ts = RUNAWAY_LIMIT if err.sign > 0 else COLD_LIMIT
+            self.no_solution[log_vmr] = Ts
+            return Ts
+
+        self.solutions[log_vmr] = Ts
+        return Ts
+
+
+def solve_gas_for_target(
+    gas: str,
+    target: float,
+    absorber_vmr: dict,
+    quantity: str = "Ts",
+    SST: float | None = None,
+    Tstrat: float = 195.0,
+    rel_humidity: float = 0.8,
+    vmr_bounds: tuple[float, float] = DEFAULT_VMR_BOUNDS,
+    rtol: float = 1e-4,
+) -> dict:
+    """
+    Volume mixing ratio of gas for which quantity reaches target.
+
+    quantity is "Ts" (equilibrium surface temperature, K) or "net_flux" (OLR -
+    ASR in W/m², at the surface temperature SST). The other absorbers are
+    taken from absorber_vmr and rtol is the relative tolerance on the vmr.
+    Returns the solution with the value reached and the number of outer
+    evaluations; raises ValueError if the target cannot be reached within
+    vmr_bounds.
+    """
+    if gas not in INVERSE_GASES:
+        raise ValueError(f"gas must be one of {INVERSE_GASES}, got {gas!r}")
+    if quantity not in INVERSE_TARGETS:
+        raise ValueError(f"quantity must be one of {INVERSE_TARGETS}, got {quantity!r}")
+
+    if quantity == "Ts":
+        response = _EquilibriumCache(gas, absorber_vmr, Tstrat, rel_humidity)
+    else:
+        if SST is None:
+            raise ValueError("SST is required to target the net flux")
+
+        def response(log_vmr):
+            _, _, rad = calc_olr(
+                SST,
+                {**absorber_vmr, gas: np.exp(log_vmr)},
+                RH=rel_humidity,
+                Tstrat=Tstrat,
+            )
+            return rad.OLR[0] - rad.ASR[0]
+
+    values = {}
+
+    def residual(log_vmr):
+        values[log_vmr] = response(log_vmr)
+        return values[log_vmr] - target
+
+    lower, upper = np.log(vmr_bounds)
+    f_lower, f_upper = residual(lower), residual(upper)
+    if np.sign(f_lower) == np.sign(f_upper):
+        raise ValueError(
+            f"Target {quantity}={target} is not reached for {gas} between "
+            f"{vmr_bounds[0]:g} and {vmr_bounds[1]:g} "
+            f"({quantity} ranges from {f_lower + target:.4g} to {f_upper + target:.4g})"
+        )
+
+    # An absolute tolerance on log(vmr) is a relative one on the vmr
+    log_vmr = scipy.optimize.brentq(residual, lower, upper, xtol=rtol)
+
+    return {
+        "gas": gas,
+        "vmr": float(np.exp(log_vmr)),
+        "quantity": quantity,
+        "target": target,
+        "value": float(values[log_vmr] if log_vmr in values else response(log_vmr)),
+        "evaluations": len(values),
+    }
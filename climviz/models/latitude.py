@@ -0,0 +1,117 @@
+"""
+Latitude-resolved radiation: pole-to-equator OLR, ASR and equilibria.
+
+One multi-latitude state holds a column per latitude, each with its own SST and
+annual-mean insolation (from the latitude and orbital parameters, see
+climlab.radiation.AnnualMeanInsolation), and RRTMG runs once for all of them.
+There is no heat transport between latitudes: the equilibrium of a latitude is
+its local radiative-convective equilibrium, and all of them are solved for at
+once with the batched solver.
+"""
+
+import functools
+
+import climlab
+import numpy as np
+
+from climviz.models.batch import (
+    calc_olr_batch,
+    find_equilibrium_batch,
+    make_idealized_columns,
+    summarize_columns,
+)
+
+# Default number of latitudes (2° resolution)
+DEFAULT_NUM_LAT = 90
+
+
+@functools.lru_cache(maxsize=16)
+def _latitude_insolation(num_lat):
+    domain = climlab.column_state(num_lev=1, num_lat=num_lat)["Ts"].domain
+    solar = climlab.radiation.AnnualMeanInsolation(domains=domain)
+    lat = np.array(domain.axes["lat"].points)
+    insolation = np.ravel(solar.insolation)
+    coszen = np.ravel(solar.coszen)
+    for array in (lat, insolation, coszen):
+        array.flags.writeable = False
+    return lat, insolation, coszen
+
+
+def latitude_insolation(num_lat: int = DEFAULT_NUM_LAT):
+    """
+    Latitudes (degrees, equally spaced cell centres), annual-mean insolation
+    (W/m²) and cosine of the zenith angle of num_lat columns, read-only.
+    """
+    return _latitude_insolation(int(num_lat))
+
+
+def make_sst_profile(lat, SST_equator: float = 300.0, SST_pole: float = 250.0):
+    """
+    Idealized SST, falling off as sin² of the latitude from the equator to the
+    poles.
+    """
+    return SST_equator - (SST_equator - SST_pole) * np.sin(np.deg2rad(lat)) ** 2
+
+
+def latitude_profiles(
+    absorber_vmr: dict,
+    SST_equator: float = 300.0,
+    SST_pole: float = 250.0,
+    RH: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+    num_lat: int = DEFAULT_NUM_LAT,
+    equilibrium: bool = True,
+) -> dict:
+    """
+    Radiation of all latitudes at their SST, in one RRTMG call, and (optionally)
+    their local equilibrium surface temperatures and temperature profiles.
+
+    Returns the latitudes, insolation (W/m²), SST, the batched result of the
+    SST run (see summarize_columns) and, with equilibrium, Ts_equilibrium (NaN
+    where a latitude has no equilibrium) and the equilibrium Tatm profiles
+    (shape (num_lat, num_lev)).
+    """
+    lat, insolation, coszen = latitude_insolation(num_lat)
+    SST = make_sst_profile(lat, SST_equator, SST_pole)
+
+    _, _, rad = calc_olr_batch(
+        SST,
+        absorber_vmr,
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        insolation=insolation,
+        coszen=coszen,
+    )
+    profiles = {
+        "lat": lat,
+        "insolation": insolation,
+        "SST": SST,
+        "result": summarize_columns(rad),
+    }
+    if not equilibrium:
+        return profiles
+
+    Ts = find_equilibrium_batch(
+        absorber_vmr,
+        Tstrat=Tstrat,
+        rel_humidity=RH,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        insolation=insolation,
+        coszen=coszen,
+    )
+    # Latitudes without an equilibrium get no profile
+    valid = np.isfinite(Ts)
+    Tatm = np.full((num_lat, num_lev), np.nan)
+    if valid.any():
+        state, _ = make_idealized_columns(
+            Ts[valid], RH=RH, Tstrat=Tstrat, qStrat=qStrat, num_lev=num_lev
+        )
+        Tatm[valid] = np.asarray(state["Tatm"]).reshape(valid.sum(), num_lev)
+    profiles["Ts_equilibrium"] = Ts
+    profiles["Tatm_equilibrium"] = Tatm
+    return profiles
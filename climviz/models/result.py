@@ -0,0 +1,82 @@
+import numpy as np
+
+from climviz.models.grid import get_grid
+
+# Arrays making up a ModelResult; the band-specific ones are None when the
+# corresponding band was not run
+RESULT_FIELDS = (
+    "OLR",
+    "ASR",
+    "LW_flux_up",
+    "LW_flux_down",
+    "SW_flux_up",
+    "SW_flux_down",
+    "Tatm",
+    "lev",
+    "lev_bounds",
+    "altitude",
+)
+
+
+class ModelResult:
+    """
+    The parts of a radiation run used by the pages, as plain NumPy arrays.
+
+    Much lighter than the climlab processes it is built from (no diagnostics
+    dictionaries, subprocesses or domains), so it is cheap to cache, to pickle
+    between processes and to send to the browser. Fluxes are on the level
+    interfaces (lev_bounds), Tatm and altitude (km) on the levels (lev).
+    """
+
+    __slots__ = RESULT_FIELDS
+
+    def __init__(self, **arrays):
+        for name in RESULT_FIELDS:
+            value = arrays.get(name)
+            setattr(self, name, None if value is None else np.asarray(value))
+
+    @property
+    def grid(self):
+        """
+        The shared VerticalGrid of the column.
+        """
+        return get_grid(len(self.lev))
+
+    @property
+    def net_flux(self):
+        """
+        OLR - ASR (positive when the column loses energy).
+        """
+        return self.OLR - self.ASR
+
+    def arrays(self) -> dict:
+        """
+        The arrays that are set, by name (views, not copies).
+        """
+        return {
+            name: getattr(self, name)
+            for name in RESULT_FIELDS
+            if getattr(self, name) is not None
+        }
+
+    def to_json(self) -> dict:
+        """
+        JSON-serializable version, e.g. for a dcc.Store.
+        """
+        return {name: value.tolist() for name, value in self.arrays().items()}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ModelResult":
+        return cls(**data)
+
+    def __getstate__(self):
+        return self.arrays()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={value.shape}" for name, value in self.arrays().items()
+        )
+        return f"ModelResult({fields})"
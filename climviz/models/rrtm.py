@@ -1,5 +1,7 @@
 # %%
 #
+import functools
+
 import climlab
 import matplotlib.pyplot as plt
 import numpy as np
@@ -13,6 +15,10 @@ from pydantic import Field
 
 import plotly.graph_objects as go
 
+from climviz.models.engines import get_engine
+from climviz.models.grid import get_grid
+from climviz.models.result import ModelResult
+
 
 class RRTMModelOptions(BaseModel):
     """
@@ -67,17 +73,54 @@ def generate_idealized_temp_profile(SST, plevs, Tstrat=190):
     return np.flip(temp)  # need to re-invert the pressure axis
 
 
-def make_idealized_column(SST, num_lev=100, Tstrat=195):
+# Surface temperatures (K) of the tabulated pseudoadiabats (see
+# tabulated_temp_profile)
+ADIABAT_TABLE_SST = np.arange(180.0, 341.0, 1.0)
+
+
+@functools.lru_cache(maxsize=8)
+def _adiabat_table(num_lev):
+    plevs = get_grid(num_lev).lev
+    solution = sp.odeint(pseudoadiabat, ADIABAT_TABLE_SST, np.flip(plevs))
+    return np.flip(solution, axis=0).T
+
+
+def tabulated_temp_profile(SST, num_lev=100, Tstrat=190):
+    """
+    generate_idealized_temp_profile interpolated between pseudoadiabats
+    integrated once for every ADIABAT_TABLE_SST, for the fast engines (the
+    interpolation error is well below 0.1 K).
+    """
+    table = _adiabat_table(num_lev)
+    i = np.clip(
+        np.searchsorted(ADIABAT_TABLE_SST, SST) - 1, 0, len(ADIABAT_TABLE_SST) - 2
+    )
+    weight = (SST - ADIABAT_TABLE_SST[i]) / (
+        ADIABAT_TABLE_SST[i + 1] - ADIABAT_TABLE_SST[i]
+    )
+    temp = (1 - weight) * table[i] + weight * table[i + 1]
+    return np.maximum(temp, Tstrat)
+
+
+def make_idealized_column(SST, num_lev=100, Tstrat=195, tabulated=False):
+    """
+    Column state with surface temperature SST and an idealized temperature
+    profile; with tabulated, the profile is interpolated from precomputed
+    pseudoadiabats (see tabulated_temp_profile).
+    """
     # Set up a column state
     state = climlab.column_state(num_lev=num_lev, num_lat=1)
-    # Extract the pressure levels
-    plevs = state["Tatm"].domain.axes["lev"].points
+    # The pressure levels, shared by all columns with this number of levels
+    plevs = get_grid(num_lev).lev
     # Set the SST
     state["Ts"][:] = SST
     # Set the atmospheric profile to be our idealized profile
-    state["Tatm"][:] = generate_idealized_temp_profile(
-        SST=SST, plevs=plevs, Tstrat=Tstrat
-    )
+    if tabulated:
+        state["Tatm"][:] = tabulated_temp_profile(SST, num_lev=num_lev, Tstrat=Tstrat)
+    else:
+        state["Tatm"][:] = generate_idealized_temp_profile(
+            SST=SST, plevs=plevs, Tstrat=Tstrat
+        )
     return state
 
 
@@ -86,17 +129,113 @@ def find_equilibrium_surface_temperature(
     Tstrat: float = 195.0,
     rel_humidity: float = 0.8,
     options_dict: dict | None = None,
+    cache_shortwave: bool = False,
+    Ts_guess: float | None = None,
 ):
+    """
+    Surface temperature at which the column is in radiative balance (ASR = OLR).
+
+    With cache_shortwave, only the longwave band is run at each iteration and the
+    ASR is taken from the shortwave cache (see calc_shortwave). The cache is
+    keyed on Ts, so this only saves runs when the same surface temperatures are
+    searched again (e.g. from the default bracket across halocarbon
+    perturbations); iterative solvers use full runs. Ts_guess warm
+    starts the search from a nearby known solution (e.g. of a neighbouring
+    configuration) instead of the default bracket.
+    """
+
+    # The bracket ends are evaluated by expand_bracket and again by the
+    # root-finder: each Ts is only run once
+    @functools.cache
     def obj(Ts):
+        if cache_shortwave:
+            _, _, lw = calc_olr(
+                Ts, absorber_vmr, RH=rel_humidity, Tstrat=Tstrat, bands="lw"
+            )
+            sw = calc_shortwave(Ts, absorber_vmr, RH=rel_humidity, Tstrat=Tstrat)
+            return sw.ASR[0] - lw.OLR[0]
+
         state, h2o, rad = calc_olr(Ts, absorber_vmr, RH=rel_humidity, Tstrat=Tstrat)
         net_flux = rad.ASR - rad.OLR
         return net_flux[0]
 
-    Ts_eq = scipy.optimize.root_scalar(obj, x0=275.0, bracket=[250, 300]).root
+    if Ts_guess is None:
+        # Starts from [250, 300], widened if there is no root in it
+        bracket = expand_bracket(obj, 275.0, step=25.0)
+    else:
+        bracket = expand_bracket(obj, Ts_guess, step=2.0)
+    Ts_eq = scipy.optimize.root_scalar(obj, bracket=bracket).root
 
     return Ts_eq
 
 
+class NoSignChangeError(ValueError):
+    """
+    f keeps the same sign over the whole search range.
+
+    sign is that sign: for the net flux ASR - OLR, +1 means the column keeps
+    warming (runaway) and -1 that it keeps cooling.
+    """
+
+    def __init__(self, message, sign):
+        # Both in args, so that the error can be unpickled (from the workers)
+        super().__init__(message, sign)
+        self.sign = sign
+
+    def __str__(self):
+        return str(self.args[0])
+
+
+def expand_bracket(f, x0, step, lower=150.0, upper=400.0, max_iter=20):
+    """
+    Bracket [a, b] around x0 over which f changes sign.
+
+    The side where |f| is smallest (the closest to the root) is pushed outwards
+    with a doubling step, within [lower, upper].
+    """
+    a, b = max(x0 - step, lower), min(x0 + step, upper)
+    fa, fb = f(a), f(b)
+    for _ in range(max_iter):
+        if np.sign(fa) != np.sign(fb):
+            return [a, b]
+        step *= 2
+        if (abs(fa) < abs(fb) or b >= upper) and a > lower:
+            a = max(a - step, lower)
+            fa = f(a)
+        elif b < upper:
+            b = min(b + step, upper)
+            fb = f(b)
+        else:
+            break
+    raise NoSignChangeError(f"No sign change found in [{a}, {b}].", np.sign(fb))
+
+
+def make_radiation(
+    state,
+    specific_humidity,
+    absorber_vmr,
+    bands="both",
+    return_spectral_olr=False,
+    engine="rrtmg",
+    **solar,
+):
+    """
+    Clear-sky radiation process for the bands "both", "lw" or "sw", from the
+    engine of that name (see climviz.models.engines).
+
+    solar are extra shortwave inputs (e.g. insolation and coszen per column),
+    ignored by the longwave.
+    """
+    return get_engine(engine).make(
+        state,
+        specific_humidity,
+        absorber_vmr,
+        bands,
+        return_spectral_olr=return_spectral_olr,
+        **solar,
+    )
+
+
 def calc_olr(
     SST,
     absorber_vmr,
@@ -104,11 +243,25 @@ def calc_olr(
     RH=0.8,
     Tstrat=195,
     qStrat=5e-06,
+    num_lev=100,
+    bands="both",
+    engine="rrtmg",
 ):
+    """
+    Run RRTMG on an idealized column with fixed relative humidity.
+
+    bands selects the radiation code that is run: "both" (full RRTMG), "lw"
+    (RRTMG_LW only, e.g. when only the OLR is needed) or "sw" (RRTMG_SW only).
+    engine replaces RRTMG by another radiation engine, e.g. "gray" for fast
+    approximate previews (see climviz.models.engines), which then also use the
+    tabulated temperature profiles.
+    """
     #  Couple water vapor to radiation
     ## climlab setup
     # create surface and atmosperic domains
-    state = make_idealized_column(SST, Tstrat=Tstrat)
+    state = make_idealized_column(
+        SST, num_lev=num_lev, Tstrat=Tstrat, tabulated=engine != "rrtmg"
+    )
     # state = create_simple_column(num_lev=30, surface_temp=SST, t_strat=Tstrat)
 
     #  fixed relative humidity
@@ -120,17 +273,17 @@ def calc_olr(
         qStrat=qStrat,
     )
 
-    rad = climlab.radiation.rrtm.RRTMG(
-        state=state,
-        specific_humidity=h2o.q,
-        icld=0,  # Clear-sky only!
+    rad = make_radiation(
+        state,
+        h2o.q,
+        absorber_vmr,
+        bands,
         return_spectral_olr=return_spectral_olr,
-        absorber_vmr=absorber_vmr,
+        engine=engine,
     )
     rad.compute_diagnostics()
 
-    net_flux = rad.ASR - rad.OLR
-    # print(f"Ts: {SST}, net_flux: {net_flux[0]} (ASR: {rad.ASR}, OLR: {rad.OLR})")
+    # print(f"Ts: {SST}, (ASR: {rad.ASR}, OLR: {rad.OLR})")
     # print(f"{RH=}")
     # print(f"{Tstrat=}")
     # print(f"{absorber_vmr=}")
@@ -138,6 +291,90 @@ def calc_olr(
     return state, h2o, rad
 
 
+# Absorbers passed to the cached shortwave runs: all the gases RRTMG_SW
+# absorbs, so that the cached ASR is the one of the full run. Only the halocarbons
+# (longwave absorbers only) are left out, so one cached shortwave result is
+# shared by all their perturbations.
+SW_ABSORBERS = ("O2", "O3", "CO2", "CH4", "N2O")
+
+
+@functools.lru_cache(maxsize=512)
+def _cached_shortwave(SST, RH, Tstrat, qStrat, num_lev, sw_absorbers):
+    absorbers = dict.fromkeys(absorber_vmr, 0.0)
+    for gas, value in sw_absorbers:
+        absorbers[gas] = unhashable(value)
+
+    _, _, rad = calc_olr(
+        SST,
+        absorbers,
+        RH=RH,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+        bands="sw",
+    )
+    return rad
+
+
+def calc_shortwave(
+    SST,
+    absorber_vmr,
+    RH=0.8,
+    Tstrat=195,
+    qStrat=5e-06,
+    num_lev=100,
+):
+    """
+    Cached RRTMG_SW run for a column.
+
+    With fixed relative humidity the shortwave only depends on the column
+    temperature, humidity and the SW_ABSORBERS, so results are reused across
+    halocarbon perturbations of a column at the same SST. The returned process
+    must not be modified.
+    """
+    sw_absorbers = tuple(
+        (gas, hashable(absorber_vmr.get(gas, 0.0))) for gas in SW_ABSORBERS
+    )
+    return _cached_shortwave(
+        float(SST), float(RH), float(Tstrat), float(qStrat), int(num_lev), sw_absorbers
+    )
+
+
+def summarize_column(rad) -> ModelResult:
+    """
+    Compact result of a radiation run: the column temperature and vertical axes
+    and the OLR, ASR and flux profiles computed by the bands that were run.
+
+    The arrays are views on the process' own arrays, not copies.
+    """
+    diagnostics = rad.diagnostics
+    grid = get_grid(len(rad.lev))
+    return ModelResult(
+        OLR=diagnostics.get("OLR"),
+        ASR=diagnostics.get("ASR"),
+        LW_flux_up=diagnostics.get("LW_flux_up"),
+        LW_flux_down=diagnostics.get("LW_flux_down"),
+        SW_flux_up=diagnostics.get("SW_flux_up"),
+        SW_flux_down=diagnostics.get("SW_flux_down"),
+        Tatm=rad.Tatm,
+        lev=grid.lev,
+        lev_bounds=grid.lev_bounds,
+        altitude=grid.altitude,
+    )
+
+
+def hashable(value):
+    value = np.asarray(value, dtype=float)
+    return float(value) if value.ndim == 0 else tuple(value.ravel().tolist())
+
+
+def unhashable(value):
+    """
+    Inverse of hashable (profiles come back as flat arrays).
+    """
+    return np.array(value) if isinstance(value, tuple) else value
+
+
 absorber_vmr = {
     "CO2": 0.0,
     "CH4": 0.0,
@@ -151,17 +388,11 @@ absorber_vmr = {
 }
 
 
-def make_fig_atm_profile(state):
-    # Convert state to xarray
-    state_xr = state["Tatm"].to_xarray()
-
-    # convert pressure to altitude
-    altitude = convert_pressure_to_altitude(state_xr["lev"]) / 1000.0
-
+def make_fig_atm_profile(result: ModelResult):
     fig = go.Figure(
         go.Scatter(
-            x=state_xr,
-            y=altitude,
+            x=result.Tatm,
+            y=result.altitude,
             mode="lines",
             name="Temperature",
             line=dict(color="blue"),
@@ -169,33 +400,27 @@ def make_fig_atm_profile(state):
         layout=go.Layout(
             title="Temperature Profile",
             xaxis=dict(title="Temperature (K)"),
-            yaxis=dict(title="Altitude (km)"),
+            yaxis=result.grid.yaxis,
         ),
     ).update_xaxes(range=[170, 310])
 
     return fig
 
 
-def make_fig_rad_profile(state, rad):
-    # Convert state to xarray
-    state_xr = state["Tatm"].to_xarray()
-
-    # convert pressure to altitude
-    altitude = convert_pressure_to_altitude(state_xr["lev"]) / 1000.0
-
+def make_fig_rad_profile(result: ModelResult):
     # Plot radiation profile
     fig2 = go.Figure(
         layout=go.Layout(
             title="Radiation Profile",
             xaxis=dict(title="Radiation (W/m^2)"),
-            yaxis=dict(title="Altitude (km)"),
+            yaxis=result.grid.yaxis,
         ),
     ).update_xaxes(range=[-600, 600])
 
     for values, label in zip(
         [
-            rad.LW_flux_up,
-            rad.SW_flux_up,
+            result.LW_flux_up,
+            result.SW_flux_up,
         ],
         [
             "LW Flux Up",
@@ -205,7 +430,7 @@ def make_fig_rad_profile(state, rad):
         fig2.add_trace(
             go.Scatter(
                 x=values,
-                y=altitude,
+                y=result.grid.altitude_bounds,
                 mode="lines",
                 name=label,
             )
@@ -213,8 +438,8 @@ def make_fig_rad_profile(state, rad):
 
     for values, label in zip(
         [
-            -rad.LW_flux_down,
-            -rad.SW_flux_down,
+            -result.LW_flux_down,
+            -result.SW_flux_down,
         ],
         [
             "LW Flux Down",
@@ -224,7 +449,7 @@ def make_fig_rad_profile(state, rad):
         fig2.add_trace(
             go.Scatter(
                 x=values,
-                y=altitude,
+                y=result.grid.altitude_bounds,
                 mode="lines",
                 name=label,
             )
@@ -260,9 +485,11 @@ if __name__ == "__main__":
 
     for idx1, temp in enumerate(temparray):
         for idx2, co2 in enumerate(co2array):
-            state, h2o, rad = calc_olr(temp, co2, absorber_vmr)
+            # Only the OLR is needed here, so skip the shortwave
+            absorber_vmr_mod = {**absorber_vmr, "CO2": co2 / 1e6}
+            state, h2o, rad = calc_olr(temp, absorber_vmr_mod, bands="lw")
 
-            OLRS[idx1, idx2] = rad.OLR
+            OLRS[idx1, idx2] = rad.OLR[0]
 
     # %%
 
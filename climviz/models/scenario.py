@@ -0,0 +1,124 @@
+"""
+Time-evolving scenarios: OLR and equilibrium Ts along a concentration path.
+
+A scenario is a series of years with the volume mixing ratio of one or more
+gases at each of them (e.g. CO2 and CH4 from 1850 to 2100). Only the "key"
+steps, where the gases have changed by more than a tolerance since the last
+key step, are evaluated; the others are interpolated in time. Consecutive key
+steps are evaluated in order, each equilibrium being warm-started from the
+previous one, and the key steps can be split into chunks evaluated in parallel.
+"""
+
+import numpy as np
+
+from climviz.models.rrtm import (
+    NoSignChangeError,
+    calc_olr,
+    find_equilibrium_surface_temperature,
+)
+
+# Shapes of the idealized trajectories
+TRAJECTORY_SHAPES = ("linear", "exponential", "logistic")
+# Relative change of the gases (in log units) below which a step is interpolated
+DEFAULT_TOLERANCE = 0.01
+# Mixing ratio added before taking logs, so that absent gases can be compared
+VMR_FLOOR = 1e-9
+
+
+def make_trajectory(years, start: float, end: float, shape: str = "exponential"):
+    """
+    Path from start (first year) to end (last year): linear, exponential
+    (constant growth rate) or logistic (slow, fast, then levelling off).
+    """
+    years = np.asarray(years, dtype=float)
+    t = (years - years[0]) / (years[-1] - years[0]) if len(years) > 1 else years * 0
+    if shape == "linear":
+        return start + (end - start) * t
+    if shape == "exponential":
+        if start <= 0 or end <= 0:
+            return start + (end - start) * t
+        return start * (end / start) ** t
+    if shape == "logistic":
+        s = 1 / (1 + np.exp(-12 * (t - 0.5)))
+        s = (s - s[0]) / (s[-1] - s[0]) if len(s) > 1 else s
+        return start + (end - start) * s
+    raise ValueError(f"shape must be one of {TRAJECTORY_SHAPES}, got {shape!r}")
+
+
+def select_key_steps(concentrations: dict, tolerance: float = DEFAULT_TOLERANCE):
+    """
+    Indices of the steps to evaluate: the first and last steps, and every step
+    where a gas has changed by more than tolerance (in log(vmr)) since the
+    previous key step.
+    """
+    log_vmr = np.log(
+        np.stack([np.asarray(v, dtype=float) for v in concentrations.values()])
+        + VMR_FLOOR
+    )
+    num_steps = log_vmr.shape[1]
+    keys = [0]
+    for step in range(1, num_steps - 1):
+        if np.abs(log_vmr[:, step] - log_vmr[:, keys[-1]]).max() > tolerance:
+            keys.append(step)
+    if num_steps > 1:
+        keys.append(num_steps - 1)
+    return np.array(keys)
+
+
+def evaluate_steps(
+    concentrations: dict,
+    absorber_vmr: dict,
+    SST: float = 288.0,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    Ts_guess: float | None = None,
+) -> dict:
+    """
+    OLR and net flux (OLR - ASR, W/m²) at SST and equilibrium Ts (K, NaN when
+    there is none) at consecutive steps, concentrations giving the vmr of the
+    varying gases at each step. Each equilibrium is warm-started from the
+    previous one (or from Ts_guess for the first step).
+    """
+    num_steps = len(next(iter(concentrations.values())))
+    OLR = np.empty(num_steps)
+    net_flux = np.empty(num_steps)
+    Ts = np.empty(num_steps)
+    for step in range(num_steps):
+        vmr = {
+            **absorber_vmr,
+            **{gas: float(values[step]) for gas, values in concentrations.items()},
+        }
+        _, _, rad = calc_olr(SST, vmr, RH=rel_humidity, Tstrat=Tstrat)
+        OLR[step] = rad.OLR[0]
+        net_flux[step] = rad.OLR[0] - rad.ASR[0]
+        try:
+            Ts[step] = Ts_guess = find_equilibrium_surface_temperature(
+                vmr,
+                Tstrat=Tstrat,
+                rel_humidity=rel_humidity,
+                Ts_guess=Ts_guess,
+            )
+        except NoSignChangeError:
+            Ts[step] = np.nan
+            Ts_guess = None
+    return {"OLR": OLR, "net_flux": net_flux, "Ts": Ts}
+
+
+def interpolate_steps(years, key_steps, values: dict) -> dict:
+    """
+    Values known at the key steps, linearly interpolated to all the years.
+    """
+    years = np.asarray(years, dtype=float)
+    key_years = years[key_steps]
+    return {
+        name: np.interp(years, key_years, np.asarray(series, dtype=float))
+        for name, series in values.items()
+    }
+
+
+def split_chunks(key_steps, num_chunks: int) -> list:
+    """
+    Split the key steps into at most num_chunks runs of consecutive steps.
+    """
+    num_chunks = max(1, min(num_chunks, len(key_steps)))
+    return [chunk for chunk in np.array_split(key_steps, num_chunks) if len(chunk)]
@@ -0,0 +1,224 @@
+"""
+Admission control and priority scheduling of the model tasks.
+
+Every model task belongs to a priority class: interactive single-column runs
+(the Exploration tab), equilibrium solves, and batch work (sweeps, ensembles,
+scenarios). A task must be admitted by the scheduler before it takes a worker:
+
+- the classes are served in priority order, so a queued interactive run takes
+  the next free worker whatever batch work is waiting;
+- the lower classes may not take the last workers (RESERVED_SLOTS), so that an
+  interactive run never waits for a whole batch task to finish. This needs at
+  least MIN_SLOTS workers: with fewer, a class whose workers are all reserved
+  still gets one so that it makes progress, but only while the higher classes
+  are idle, and a run arriving meanwhile waits for it;
+- each session may only run a few tasks of a class at a time (SESSION_LIMITS),
+  the rest of its tasks wait while other sessions' tasks go ahead;
+- the queue of each class is bounded (MAX_QUEUED): beyond it tasks are
+  rejected with OverloadedError instead of piling up.
+
+Callers can also ask whether a class is congested, i.e. whether a new task
+would have to queue, to degrade gracefully (e.g. run a coarser column).
+
+Sessions are identified by current_session, a context variable set for each
+web request; it is carried over to the threads running the request's work.
+
+Only the work run on the local workers is admitted here: sweeps pushed to the
+distributed workers (CLIMVIZ_SWEEP_QUEUE, see climviz.models.distributed) run
+on their own machines and bypass the scheduler.
+"""
+
+import contextvars
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+INTERACTIVE = 0
+EQUILIBRIUM = 1
+BATCH = 2
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    EQUILIBRIUM: "equilibrium",
+    BATCH: "batch",
+}
+
+# Priority class of each task (unlisted tasks are batch work)
+TASK_PRIORITIES = {
+    "column": INTERACTIVE,
+    "diagnostics": INTERACTIVE,
+    "points": INTERACTIVE,
+    "equilibrium": EQUILIBRIUM,
+    "net_flux_curve": EQUILIBRIUM,
+    "inverse": EQUILIBRIUM,
+    "continuation": EQUILIBRIUM,
+    "feedbacks": EQUILIBRIUM,
+}
+# Workers the classes may not use: they are kept for the higher classes
+RESERVED_SLOTS = {INTERACTIVE: 0, EQUILIBRIUM: 1, BATCH: 2}
+# Workers needed for every class to have one of its own
+MIN_SLOTS = max(RESERVED_SLOTS.values()) + 1
+# Tasks of a class a single session may run at the same time
+SESSION_LIMITS = {INTERACTIVE: 2, EQUILIBRIUM: 2, BATCH: 4}
+# Tasks of a class that may wait for a worker before new ones are rejected
+MAX_QUEUED = {INTERACTIVE: 64, EQUILIBRIUM: 64, BATCH: 256}
+# Queue waits (s) kept per class for the latency percentiles
+LATENCY_WINDOW = 1000
+
+# Session of the current request (None outside of requests)
+current_session = contextvars.ContextVar("climviz_session", default=None)
+
+
+class OverloadedError(RuntimeError):
+    """
+    A task was rejected because the queue of its class is full.
+    """
+
+
+def task_priority(task: str) -> int:
+    return TASK_PRIORITIES.get(task, BATCH)
+
+
+class _Ticket:
+    __slots__ = ("priority", "session", "admitted")
+
+    def __init__(self, priority: int, session):
+        self.priority = priority
+        self.session = session
+        self.admitted = False
+
+
+class Scheduler:
+    """
+    Admits tasks onto a fixed number of slots (the workers), by priority.
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        reserved: dict = RESERVED_SLOTS,
+        session_limits: dict = SESSION_LIMITS,
+        max_queued: dict = MAX_QUEUED,
+    ):
+        self.slots = slots
+        self.reserved = reserved
+        # A class may always use at least one slot (see _has_slot)
+        self.capacity = {
+            priority: max(slots - reserved[priority], 1) for priority in PRIORITY_NAMES
+        }
+        self.session_limits = session_limits
+        self.max_queued = max_queued
+        self._condition = threading.Condition()
+        self._queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self._running = Counter()
+        self._session_running = Counter()
+        self._waits = {
+            priority: deque(maxlen=LATENCY_WINDOW) for priority in PRIORITY_NAMES
+        }
+        self._stats = Counter()
+
+    def _has_slot(self, priority: int) -> bool:
+        if self.slots <= self.reserved[priority] and any(
+            self._running[p] or self._queues[p] for p in PRIORITY_NAMES if p < priority
+        ):
+            # All the slots are reserved for the higher classes (fewer than
+            # MIN_SLOTS): it only borrows one while they are idle
+            return False
+        # The class shares its capacity with the lower classes
+        return (
+            sum(self._running.values()) < self.slots
+            and sum(self._running[p] for p in PRIORITY_NAMES if p >= priority)
+            < self.capacity[priority]
+        )
+
+    def _eligible(self, ticket: _Ticket) -> bool:
+        return (
+            self._has_slot(ticket.priority)
+            and self._session_running[ticket.priority, ticket.session]
+            < self.session_limits[ticket.priority]
+        )
+
+    def _next(self):
+        """
+        The ticket to admit next: the first eligible one of the highest class.
+        """
+        for priority in PRIORITY_NAMES:
+            for ticket in self._queues[priority]:
+                if self._eligible(ticket):
+                    return ticket
+        return None
+
+    def _admit_waiting(self):
+        while (ticket := self._next()) is not None:
+            self._queues[ticket.priority].remove(ticket)
+            self._running[ticket.priority] += 1
+            self._session_running[ticket.priority, ticket.session] += 1
+            ticket.admitted = True
+        self._condition.notify_all()
+
+    def acquire(self, priority: int, session=None) -> _Ticket:
+        """
+        Wait until a task of the class may run. Raises OverloadedError when the
+        queue of the class is full.
+        """
+        ticket = _Ticket(priority, session)
+        with self._condition:
+            if len(self._queues[priority]) >= self.max_queued[priority]:
+                self._stats["rejected", priority] += 1
+                raise OverloadedError(
+                    f"Too many {PRIORITY_NAMES[priority]} model runs are waiting, "
+                    "try again later."
+                )
+            start = time.monotonic()
+            self._queues[priority].append(ticket)
+            self._admit_waiting()
+            self._condition.wait_for(lambda: ticket.admitted)
+            self._waits[priority].append(time.monotonic() - start)
+            self._stats["admitted", priority] += 1
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        with self._condition:
+            self._running[ticket.priority] -= 1
+            self._session_running[ticket.priority, ticket.session] -= 1
+            if not self._session_running[ticket.priority, ticket.session]:
+                del self._session_running[ticket.priority, ticket.session]
+            self._admit_waiting()
+
+    def run(self, task: str, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) once the task is admitted, in the session of the
+        current context.
+        """
+        ticket = self.acquire(task_priority(task), current_session.get())
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.release(ticket)
+
+    def congested(self, priority: int) -> bool:
+        """
+        Whether a new task of the class would have to wait for a worker.
+        """
+        with self._condition:
+            return bool(self._queues[priority]) or not self._has_slot(priority)
+
+    def metrics(self) -> dict:
+        """
+        Running and queued tasks, admissions, rejections and queue waits (s) of
+        each class.
+        """
+        with self._condition:
+            metrics = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = np.array(self._waits[priority])
+                metrics[name] = {
+                    "running": self._running[priority],
+                    "queued": len(self._queues[priority]),
+                    "admitted": self._stats["admitted", priority],
+                    "rejected": self._stats["rejected", priority],
+                    "wait_p50": float(np.percentile(waits, 50)) if waits.size else 0.0,
+                    "wait_p99": float(np.percentile(waits, 99)) if waits.size else 0.0,
+                }
+            return metrics
@@ -0,0 +1,87 @@
+import threading
+
+import numpy as np
+
+
+def canonical_key(name: str, **kwargs) -> tuple:
+    """
+    Hashable key identifying a model call, independent of argument order and of
+    the container types used (lists vs tuples vs arrays, int vs float).
+    """
+    return (name, _canonical(kwargs))
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        array = np.asarray(value)
+        if array.dtype.kind in "biuf":
+            return tuple(_canonical(v) for v in array.ravel().tolist())
+        return tuple(_canonical(v) for v in value)
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.number)):
+        # Round away float noise (e.g. 400 / 1e6 computed in different ways)
+        return float(f"{float(value):.12g}")
+    return value
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time.
+
+    Callers arriving while a computation with the same key is in flight wait for
+    it and share its result (or its exception) instead of starting their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "executed": 0, "coalesced": 0, "errors": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._stats["executed"] += 1
+                if call.error is not None:
+                    self._stats["errors"] += 1
+            call.done.set()
+
+        return call.result
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
@@ -0,0 +1,366 @@
+"""
+Parameter sweeps over any of the absorbers and column parameters.
+
+A sweep plan is a list of dimensions (a parameter and its values, in display
+units) around a base configuration. Any gas of absorber_vmr can be a dimension,
+as can the surface temperature (SST), relative humidity (RH) and stratospheric
+temperature (Tstrat). Gas values are converted to volume mixing ratios here,
+from the units of the dimension.
+
+The cells of a plan are evaluated with the batched radiation path. The column
+temperature and humidity only depend on SST, RH and Tstrat, so each distinct
+combination is built once and shared by all its gas variants. The variants
+then go through RRTMG together, SWEEP_BATCH_SIZE columns per call. When the
+swept gases are longwave-only absorbers (e.g. a halocarbon sweep), only the
+longwave is run for every cell: the shortwave is run once per distinct column
+and SW_ABSORBERS, and shared by the variants that only differ in the other
+gases. Equilibria do not depend on the SST and are solved once per distinct
+combination of the other parameters.
+"""
+
+import hashlib
+import itertools
+import json
+
+import numpy as np
+
+from climviz.models.batch import (
+    calc_radiation_batch,
+    find_equilibrium_batch,
+    make_idealized_columns,
+    summarize_columns,
+)
+from climviz.models.rrtm import SW_ABSORBERS
+from climviz.models.rrtm import absorber_vmr as default_absorber_vmr
+
+# Concentration units, as a fraction of the volume mixing ratio
+UNITS = {"vmr": 1.0, "%": 1e-2, "ppm": 1e-6, "ppb": 1e-9, "ppt": 1e-12}
+# Usual units of the gases
+GAS_UNITS = {
+    "CO2": "ppm",
+    "CH4": "ppm",
+    "N2O": "ppb",
+    "O2": "%",
+    "CFC11": "ppt",
+    "CFC12": "ppt",
+    "CFC22": "ppt",
+    "CCL4": "ppt",
+    "O3": "ppm",
+}
+# Column parameters that can be swept, with their label and units
+COLUMN_PARAMETERS = {
+    "SST": ("Surface Temperature", "K"),
+    "RH": ("Relative Humidity", "-"),
+    "Tstrat": ("Stratospheric Temperature", "K"),
+}
+# Maximum number of columns per RRTMG call
+SWEEP_BATCH_SIZE = 256
+# Results of a sweep: one value per cell, and one profile per cell
+SWEEP_SCALARS = ("OLR", "ASR", "net_flux", "Ts_eq")
+SWEEP_PROFILES = (
+    "Tatm",
+    "LW_flux_up",
+    "LW_flux_down",
+    "SW_flux_up",
+    "SW_flux_down",
+)
+
+
+def to_vmr(value, units: str):
+    """
+    Concentration(s) in units converted to a volume mixing ratio.
+    """
+    if units not in UNITS:
+        raise ValueError(f"Unknown units {units!r}, expected one of {list(UNITS)}")
+    return np.asarray(value, dtype=float) * UNITS[units]
+
+
+def parameter_label(name: str, units: str | None = None) -> str:
+    """
+    Display label of a sweepable parameter, e.g. "CO2 (ppm)".
+    """
+    if name in COLUMN_PARAMETERS:
+        label, default_units = COLUMN_PARAMETERS[name]
+        return f"{label} ({default_units})"
+    if name in GAS_UNITS:
+        return f"{name} ({units or GAS_UNITS[name]})"
+    raise ValueError(
+        f"Cannot sweep {name!r}: expected one of "
+        f"{list(COLUMN_PARAMETERS) + list(GAS_UNITS)}"
+    )
+
+
+class SweepDimension:
+    """
+    A swept parameter and its values, in display units.
+    """
+
+    __slots__ = ("name", "values", "units")
+
+    def __init__(self, name: str, values, units: str | None = None):
+        if name in GAS_UNITS:
+            units = units or GAS_UNITS[name]
+            to_vmr(1.0, units)
+        elif name in COLUMN_PARAMETERS:
+            units = COLUMN_PARAMETERS[name][1]
+        else:
+            parameter_label(name)
+        self.name = name
+        self.values = np.atleast_1d(np.asarray(values, dtype=float))
+        self.units = units
+
+    @property
+    def is_gas(self) -> bool:
+        return self.name in GAS_UNITS
+
+    @property
+    def label(self) -> str:
+        return parameter_label(self.name, self.units)
+
+    @property
+    def model_values(self) -> np.ndarray:
+        """
+        The values in model units (volume mixing ratios for the gases).
+        """
+        return to_vmr(self.values, self.units) if self.is_gas else self.values
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "values": self.values.tolist(), "units": self.units}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SweepDimension":
+        return cls(data["name"], data["values"], data.get("units"))
+
+
+class SweepPlan:
+    """
+    Cartesian product of the dimensions around a base configuration.
+    """
+
+    def __init__(
+        self,
+        dimensions: list,
+        absorber_vmr: dict | None = None,
+        SST: float = 288.0,
+        RH: float = 0.8,
+        Tstrat: float = 195.0,
+        qStrat: float = 5e-06,
+        num_lev: int = 100,
+    ):
+        names = [dimension.name for dimension in dimensions]
+        if len(set(names)) != len(names):
+            raise ValueError(f"A parameter is swept more than once: {names}")
+        self.dimensions = list(dimensions)
+        self.absorber_vmr = dict(
+            default_absorber_vmr if absorber_vmr is None else absorber_vmr
+        )
+        self.base = {"SST": SST, "RH": RH, "Tstrat": Tstrat}
+        self.qStrat = qStrat
+        self.num_lev = num_lev
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(len(dimension.values) for dimension in self.dimensions)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def cells(self) -> dict:
+        """
+        Model inputs of every cell (flattened in C order): SST, RH, Tstrat and
+        the vmr of each gas, as arrays of length size.
+        """
+        grids = np.meshgrid(
+            *(dimension.model_values for dimension in self.dimensions), indexing="ij"
+        )
+        swept = {
+            dimension.name: grid.ravel()
+            for dimension, grid in zip(self.dimensions, grids)
+        }
+        return {
+            name: swept.get(name, np.full(self.size, float(value)))
+            for name, value in itertools.chain(
+                self.base.items(), self.absorber_vmr.items()
+            )
+        }
+
+    def select(self, index: int, dimension: int = 0) -> "SweepPlan":
+        """
+        The sub-plan where one dimension is fixed at values[index] (kept as a
+        dimension of length 1).
+        """
+        dimensions = list(self.dimensions)
+        fixed = dimensions[dimension]
+        dimensions[dimension] = SweepDimension(
+            fixed.name, fixed.values[index : index + 1], fixed.units
+        )
+        return SweepPlan(
+            dimensions,
+            self.absorber_vmr,
+            qStrat=self.qStrat,
+            num_lev=self.num_lev,
+            **self.base,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "dimensions": [dimension.to_dict() for dimension in self.dimensions],
+            "absorber_vmr": {
+                gas: float(value) for gas, value in self.absorber_vmr.items()
+            },
+            **self.base,
+            "qStrat": self.qStrat,
+            "num_lev": self.num_lev,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SweepPlan":
+        data = dict(data)
+        dimensions = [SweepDimension.from_dict(d) for d in data.pop("dimensions")]
+        return cls(dimensions, **data)
+
+
+def sweep_spec_hash(plan: SweepPlan, equilibrium: bool = True) -> str:
+    """
+    Deterministic hash of everything that determines the results of a sweep,
+    used to find (and resume) an earlier run of the same sweep.
+    """
+    spec = {**plan.to_dict(), "equilibrium": bool(equilibrium)}
+    encoded = json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+def _radiation(columns, Tatm, q, shared, absorbers: dict, bands: str, names):
+    """
+    The results names of the columns[shared] with the absorbers (arrays of the
+    same length), SWEEP_BATCH_SIZE columns per RRTMG call.
+    """
+    results = {}
+    for start in range(0, len(shared), SWEEP_BATCH_SIZE):
+        index = slice(start, start + SWEEP_BATCH_SIZE)
+        rad = calc_radiation_batch(
+            columns[shared[index], 0],
+            Tatm[shared[index]],
+            q[shared[index]],
+            {gas: values[index] for gas, values in absorbers.items()},
+            bands=bands,
+        )
+        batch = summarize_columns(rad)
+        for name in names:
+            results.setdefault(name, []).append(getattr(batch, name))
+    return {name: np.concatenate(values) for name, values in results.items()}
+
+
+def _shares_shortwave(plan: SweepPlan) -> bool:
+    """
+    Whether the cells of the plan share their shortwave runs: gases are swept,
+    and none of them is in SW_ABSORBERS.
+    """
+    gases = [dimension.name for dimension in plan.dimensions if dimension.is_gas]
+    return bool(gases) and all(gas not in SW_ABSORBERS for gas in gases)
+
+
+def evaluate_plan(
+    plan: SweepPlan, equilibrium: bool = True, cache_shortwave: bool | None = None
+) -> dict:
+    """
+    Radiation of every cell of the plan at its SST, and (optionally) its
+    equilibrium surface temperature (K, NaN where there is none).
+
+    With cache_shortwave, the longwave and shortwave are run separately and the
+    shortwave only once per distinct column and SW_ABSORBERS (the results are
+    the same). That only pays off when many cells share their shortwave, so by
+    default it is used when _shares_shortwave(plan), and full runs otherwise.
+
+    Returns SWEEP_SCALARS with the shape of the plan and SWEEP_PROFILES with an
+    extra vertical dimension; net_flux is OLR - ASR (W/m²).
+    """
+    cells = plan.cells()
+    gases = list(plan.absorber_vmr)
+    num_lev = plan.num_lev
+
+    # Columns shared by all the gas variants of an (SST, RH, Tstrat)
+    columns, column_index = np.unique(
+        np.stack([cells["SST"], cells["RH"], cells["Tstrat"]], axis=1),
+        axis=0,
+        return_inverse=True,
+    )
+    column_index = column_index.ravel()
+    state, h2o = make_idealized_columns(
+        columns[:, 0],
+        RH=columns[:, 1],
+        Tstrat=columns[:, 2],
+        qStrat=plan.qStrat,
+        num_lev=num_lev,
+    )
+    Tatm = np.asarray(state["Tatm"]).reshape(len(columns), num_lev)
+    q = np.asarray(h2o.q).reshape(len(columns), num_lev)
+    absorbers = {gas: cells[gas] for gas in gases}
+
+    if cache_shortwave is None:
+        cache_shortwave = _shares_shortwave(plan)
+    if cache_shortwave:
+        results = _radiation(
+            columns,
+            Tatm,
+            q,
+            column_index,
+            absorbers,
+            "lw",
+            ("OLR", "Tatm", "LW_flux_up", "LW_flux_down"),
+        )
+        # Cells sharing their column and shortwave absorbers
+        _, first, sw_index = np.unique(
+            np.stack(
+                [column_index, *(cells[g] for g in gases if g in SW_ABSORBERS)], 1
+            ),
+            axis=0,
+            return_index=True,
+            return_inverse=True,
+        )
+        shortwave = _radiation(
+            columns,
+            Tatm,
+            q,
+            column_index[first],
+            {gas: values[first] for gas, values in absorbers.items()},
+            "sw",
+            ("ASR", "SW_flux_up", "SW_flux_down"),
+        )
+        for name, values in shortwave.items():
+            results[name] = values[sw_index.ravel()]
+    else:
+        results = _radiation(
+            columns,
+            Tatm,
+            q,
+            column_index,
+            absorbers,
+            "both",
+            ("OLR", "ASR", *SWEEP_PROFILES),
+        )
+
+    output = {
+        name: values.reshape(plan.shape + values.shape[1:])
+        for name, values in results.items()
+    }
+    output["net_flux"] = output["OLR"] - output["ASR"]
+
+    Ts_eq = np.full(plan.size, np.nan)
+    if equilibrium:
+        # The equilibrium does not depend on the SST
+        keys, key_index = np.unique(
+            np.stack([cells["RH"], cells["Tstrat"], *(cells[g] for g in gases)], 1),
+            axis=0,
+            return_inverse=True,
+        )
+        Ts_eq = find_equilibrium_batch(
+            {gas: keys[:, 2 + i] for i, gas in enumerate(gases)},
+            Tstrat=keys[:, 1],
+            rel_humidity=keys[:, 0],
+            qStrat=plan.qStrat,
+            num_lev=num_lev,
+        )[key_index.ravel()]
+    output["Ts_eq"] = Ts_eq.reshape(plan.shape)
+    return output
@@ -0,0 +1,87 @@
+"""
+Tabulated net flux curves, for near-instant equilibrium lookups.
+
+For a fixed configuration (gases, relative humidity, stratosphere), the net
+flux ASR - OLR of the idealized column is a smooth function of the surface
+temperature alone. It is evaluated at TABULATION_NODES in one batched RRTMG
+call and interpolated with a monotone (PCHIP) spline. The equilibrium is the
+root of the spline, polished with a single exact evaluation and a Newton step,
+and the result can be cached and reused by every later query (see
+climviz.models.execution.run_equilibrium_tabulated).
+"""
+
+import numpy as np
+import scipy.interpolate
+import scipy.optimize
+
+from climviz.models.batch import calc_olr_batch
+from climviz.models.rrtm import NoSignChangeError
+
+# Surface temperatures (K) at which the net flux is tabulated
+TABULATION_NODES = np.arange(180.0, 361.0, 10.0)
+
+
+def tabulate_net_flux(
+    absorber_vmr: dict,
+    rel_humidity: float = 0.8,
+    Tstrat: float = 195.0,
+    qStrat: float = 5e-06,
+    num_lev: int = 100,
+    nodes=TABULATION_NODES,
+) -> dict:
+    """
+    Net flux ASR - OLR (W/m²) at the surface temperature nodes, in one call.
+    """
+    nodes = np.asarray(nodes, dtype=float)
+    _, _, rad = calc_olr_batch(
+        nodes,
+        absorber_vmr,
+        RH=rel_humidity,
+        Tstrat=Tstrat,
+        qStrat=qStrat,
+        num_lev=num_lev,
+    )
+    return {"Ts": nodes.tolist(), "net_flux": np.ravel(rad.ASR - rad.OLR).tolist()}
+
+
+class NetFluxCurve:
+    """
+    Monotone spline of a tabulated net flux curve.
+    """
+
+    def __init__(self, Ts, net_flux):
+        self.Ts = np.asarray(Ts, dtype=float)
+        self.net_flux = np.asarray(net_flux, dtype=float)
+        self.spline = scipy.interpolate.PchipInterpolator(self.Ts, self.net_flux)
+        self.slope = self.spline.derivative()
+
+    def __call__(self, Ts):
+        return self.spline(Ts)
+
+    def root(self) -> float:
+        """
+        Stable equilibrium on the spline: the first crossing of zero where the
+        net flux decreases with Ts. Raises NoSignChangeError when there is none.
+        """
+        f = self.net_flux
+        crossings = np.flatnonzero((f[:-1] > 0) & (f[1:] <= 0))
+        if crossings.size == 0:
+            raise NoSignChangeError(
+                f"The net flux does not cross zero between {self.Ts[0]:g} K and "
+                f"{self.Ts[-1]:g} K",
+                np.sign(f[np.argmin(np.abs(f))]),
+            )
+        i = crossings[0]
+        return scipy.optimize.brentq(self.spline, self.Ts[i], self.Ts[i + 1])
+
+    def polish(self, Ts: float, exact_net_flux: float) -> float:
+        """
+        Newton step from Ts with the exact net flux there and the slope of the
+        spline, kept only if it stays within the spacing of the nodes.
+        """
+        slope = float(self.slope(Ts))
+        if slope >= 0:
+            return Ts
+        polished = Ts - exact_net_flux / slope
+        spacing = float(np.max(np.diff(self.Ts)))
+        return polished if abs(polished - Ts) < spacing else Ts
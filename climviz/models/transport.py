@@ -0,0 +1,224 @@
+"""
+Zero-copy transport of model results from the workers to the web tier.
+
+A worker writes the arrays of a result (anywhere in nested dicts, lists, tuples
+and ModelResults) into one memory-mapped segment and sends back a descriptor
+instead: the rest of the result, with placeholders for the arrays, and where
+each array lies in the segment. Only the descriptor is pickled. The caller maps
+the segment and rebuilds the result around arrays that are views on it, so
+figures and exports are built without copying the data.
+
+Segments are files in SEGMENT_DIR (/dev/shm, i.e. shared memory, when there is
+one). The receiver unlinks a segment as soon as it has mapped it: the memory is
+freed when the last view on it is garbage collected, whoever holds it. Views
+are copy-on-write, so writing to a result never touches the segment.
+Segments that were never received (a worker killed after writing one) are
+removed by cleanup_segments.
+"""
+
+import mmap
+import os
+import tempfile
+import uuid
+
+import numpy as np
+
+from climviz.models.result import ModelResult
+
+# Directory of the segments
+SEGMENT_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# Prefix of the segment files, followed by the pids of the owner (the process
+# receiving the results) and of the writer
+SEGMENT_PREFIX = "climviz-"
+# Results whose arrays take fewer bytes than this are simply pickled
+SHARED_MIN_BYTES = 4096
+
+
+class ArrayRef:
+    """
+    Placeholder of an array of the segment in a descriptor.
+    """
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class ResultDescriptor:
+    """
+    Where a result lies in its segment: path of the segment, (dtype, shape,
+    offset) of each array and the result with ArrayRefs for the arrays.
+    """
+
+    __slots__ = ("path", "fields", "skeleton")
+
+    def __init__(self, path: str, fields: list, skeleton):
+        self.path = path
+        self.fields = fields
+        self.skeleton = skeleton
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            int(np.prod(shape)) * np.dtype(dtype).itemsize
+            for dtype, shape, _ in self.fields
+        )
+
+    def __repr__(self):
+        return (
+            f"ResultDescriptor({os.path.basename(self.path)}, "
+            f"{len(self.fields)} arrays, {self.nbytes} bytes)"
+        )
+
+
+class _ResultSkeleton:
+    """
+    Placeholder of a ModelResult in a descriptor (which would turn the
+    ArrayRefs into arrays).
+    """
+
+    __slots__ = ("arrays",)
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+
+
+def _map_arrays(value, func):
+    """
+    value with func applied to each of its arrays (and ArrayRefs), through
+    dicts, lists, tuples and ModelResults.
+    """
+    if isinstance(value, (np.ndarray, ArrayRef)):
+        return func(value)
+    if isinstance(value, ModelResult):
+        return _ResultSkeleton(_map_arrays(value.arrays(), func))
+    if isinstance(value, _ResultSkeleton):
+        return ModelResult(**_map_arrays(value.arrays, func))
+    if isinstance(value, dict):
+        return {key: _map_arrays(item, func) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_map_arrays(item, func) for item in value)
+    return value
+
+
+def _is_shareable(value) -> bool:
+    return (
+        isinstance(value, np.ndarray) and value.ndim > 0 and not value.dtype.hasobject
+    )
+
+
+def pack_result(value, owner: int | None = None) -> ResultDescriptor | None:
+    """
+    Write the arrays of a result into a new segment and describe it, or return
+    None when the result has too little array data to be worth it.
+
+    owner is the pid of the process that will receive the result (the parent
+    by default).
+    """
+    arrays = []
+
+    def collect(array):
+        if not _is_shareable(array):
+            return array
+        arrays.append(np.ascontiguousarray(array))
+        return ArrayRef(len(arrays) - 1)
+
+    skeleton = _map_arrays(value, collect)
+    if sum(array.nbytes for array in arrays) < SHARED_MIN_BYTES:
+        return None
+
+    fields = []
+    offset = 0
+    for array in arrays:
+        fields.append((array.dtype.str, array.shape, offset))
+        # Keep every array 8-byte aligned
+        offset += -(-array.nbytes // 8) * 8
+
+    owner = os.getppid() if owner is None else owner
+    path = os.path.join(
+        SEGMENT_DIR, f"{SEGMENT_PREFIX}{owner}-{os.getpid()}-{uuid.uuid4().hex}"
+    )
+    fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_RDWR, 0o600)
+    try:
+        os.ftruncate(fd, offset)
+        segment = mmap.mmap(fd, offset)
+    except BaseException:
+        os.unlink(path)
+        raise
+    finally:
+        os.close(fd)
+    with segment:
+        for (dtype, shape, start), array in zip(fields, arrays):
+            view = np.ndarray(shape, dtype=dtype, buffer=segment, offset=start)
+            view[...] = array
+            del view
+    return ResultDescriptor(path, fields, skeleton)
+
+
+def unpack_result(descriptor: ResultDescriptor):
+    """
+    The result of a descriptor, with its arrays as (copy-on-write) views on
+    the segment. The segment is unlinked: it can only be unpacked once.
+    """
+    fd = os.open(descriptor.path, os.O_RDONLY)
+    try:
+        segment = mmap.mmap(fd, 0, access=mmap.ACCESS_COPY)
+    finally:
+        os.close(fd)
+        os.unlink(descriptor.path)
+
+    # The views keep the mapping alive; it is released with the last of them
+    views = [
+        np.ndarray(shape, dtype=dtype, buffer=segment, offset=start)
+        for dtype, shape, start in descriptor.fields
+    ]
+    return _map_arrays(descriptor.skeleton, lambda ref: views[ref.index])
+
+
+def discard_result(descriptor: ResultDescriptor):
+    """
+    Free the segment of a descriptor that will not be unpacked.
+    """
+    try:
+        os.unlink(descriptor.path)
+    except FileNotFoundError:
+        pass
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def cleanup_segments(owner: int | None = None, writer: int | None = None) -> int:
+    """
+    Remove segments that will never be received: those of an owner (or of one
+    of its writers) when given, otherwise those whose owner is dead. Returns
+    the number of segments removed.
+    """
+    removed = 0
+    for name in os.listdir(SEGMENT_DIR):
+        if not name.startswith(SEGMENT_PREFIX):
+            continue
+        try:
+            segment_owner, segment_writer, _ = name[len(SEGMENT_PREFIX) :].split("-")
+            segment_owner, segment_writer = int(segment_owner), int(segment_writer)
+        except ValueError:
+            continue
+        if owner is None:
+            stale = not _is_alive(segment_owner)
+        else:
+            stale = segment_owner == owner and writer in (None, segment_writer)
+        if stale:
+            try:
+                os.unlink(os.path.join(SEGMENT_DIR, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
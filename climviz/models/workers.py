@@ -0,0 +1,313 @@
+"""
+Supervised pool of long-lived worker processes running the RRTMG model.
+
+RRTMG is a Fortran extension: running it in separate processes keeps the web
+tier responsive under concurrent load and isolates it from crashes in the
+extension. Each worker imports climlab once at start-up and then serves tasks
+over a pipe; the arrays of the results travel back through shared memory and
+only a small descriptor is pickled (see climviz.models.transport).
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+
+from climviz.models.transport import (
+    cleanup_segments,
+    discard_result,
+    pack_result,
+    unpack_result,
+)
+
+# Default time (s) a single task may run before its worker is restarted
+DEFAULT_TASK_TIMEOUT = 300.0
+# How often (s) the supervisor checks that idle workers are still alive
+SUPERVISOR_INTERVAL = 1.0
+
+
+class WorkerError(RuntimeError):
+    """
+    A task failed inside a worker process.
+
+    Exceptions raised by the tasks themselves are re-raised in the caller with
+    their own type; this is only used when they cannot be sent back.
+    """
+
+
+class WorkerCrashedError(WorkerError):
+    """
+    The worker process died while running a task (it has been restarted).
+    """
+
+
+class WorkerTimeoutError(WorkerError):
+    """
+    A task exceeded its timeout (the stuck worker has been restarted).
+    """
+
+
+def _column_task(**kwargs):
+    from climviz.models.rrtm import calc_olr, summarize_column
+
+    _, _, rad = calc_olr(**kwargs)
+    return summarize_column(rad)
+
+
+def _equilibrium_task(**kwargs):
+    from climviz.models.rrtm import find_equilibrium_surface_temperature
+
+    return find_equilibrium_surface_temperature(**kwargs)
+
+
+def _inverse_task(**kwargs):
+    from climviz.models.inverse import solve_gas_for_target
+
+    return solve_gas_for_target(**kwargs)
+
+
+def _continuation_task(**kwargs):
+    from climviz.models.continuation import trace_equilibrium
+
+    return trace_equilibrium(**kwargs)
+
+
+def _diagnostics_task(**kwargs):
+    from climviz.models.diagnostics import radiative_diagnostics
+
+    return radiative_diagnostics(**kwargs)
+
+
+def _feedbacks_task(**kwargs):
+    from climviz.models.feedbacks import feedback_decomposition
+
+    return feedback_decomposition(**kwargs)
+
+
+def _ensemble_task(**kwargs):
+    from climviz.models.ensemble import evaluate_members
+
+    return evaluate_members(**kwargs)
+
+
+def _scenario_task(**kwargs):
+    from climviz.models.scenario import evaluate_steps
+
+    return evaluate_steps(**kwargs)
+
+
+def _latitudes_task(**kwargs):
+    from climviz.models.latitude import latitude_profiles
+
+    return latitude_profiles(**kwargs)
+
+
+def _sweep_task(plan, equilibrium=True):
+    from climviz.models.sweep import SweepPlan, evaluate_plan
+
+    return evaluate_plan(SweepPlan.from_dict(plan), equilibrium=equilibrium)
+
+
+def _net_flux_curve_task(**kwargs):
+    from climviz.models.tabulation import tabulate_net_flux
+
+    return tabulate_net_flux(**kwargs)
+
+
+def _points_task(**kwargs):
+    from climviz.models.batch import evaluate_points
+
+    return evaluate_points(**kwargs)
+
+
+def _validate_engine_task(**kwargs):
+    from climviz.models.engines import validate_engine, within_tolerance
+
+    return sorted(within_tolerance(validate_engine(**kwargs)))
+
+
+TASKS = {
+    "column": _column_task,
+    "equilibrium": _equilibrium_task,
+    "inverse": _inverse_task,
+    "continuation": _continuation_task,
+    "diagnostics": _diagnostics_task,
+    "feedbacks": _feedbacks_task,
+    "ensemble": _ensemble_task,
+    "scenario": _scenario_task,
+    "latitudes": _latitudes_task,
+    "sweep": _sweep_task,
+    "net_flux_curve": _net_flux_curve_task,
+    "points": _points_task,
+    "validate_engine": _validate_engine_task,
+}
+
+
+def run_task(task: str, **kwargs):
+    """
+    Run a task in the current process (used by the inline backend and workers).
+    """
+    return TASKS[task](**kwargs)
+
+
+def _worker_main(conn):
+    # Preload the model (and the Fortran extension) once per worker
+    import climlab  # noqa: F401
+
+    import climviz.models.rrtm  # noqa: F401
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+
+        task, kwargs = message
+        try:
+            result = run_task(task, **kwargs)
+            descriptor = pack_result(result)
+            if descriptor is None:
+                conn.send(("value", result))
+            else:
+                try:
+                    conn.send(("shared", descriptor))
+                except BaseException:
+                    discard_result(descriptor)
+                    raise
+        except Exception as err:
+            # Re-raised as is in the caller, with the worker traceback attached
+            err.add_note(f"Worker traceback:\n{traceback.format_exc()}")
+            try:
+                conn.send(("error", err))
+            except Exception:
+                conn.send(("error", WorkerError(f"{type(err).__name__}: {err}")))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.context = context
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_worker_main, args=(child_conn,), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+    def restart(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+        # A result it was sending will never be received
+        cleanup_segments(owner=os.getpid(), writer=self.process.pid)
+        self.start()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of long-lived model worker processes.
+
+    ``run`` may be called from any number of threads; each call takes an idle
+    worker (waiting if all are busy). Workers that crash or exceed the task
+    timeout are killed and replaced, and a supervisor thread replaces idle
+    workers that died.
+    """
+
+    def __init__(
+        self,
+        num_workers: int | None = None,
+        task_timeout: float = DEFAULT_TASK_TIMEOUT,
+    ):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.task_timeout = task_timeout
+        self.restarts = 0
+        # Workers are spawned (not forked) from the threaded web server
+        self._context = multiprocessing.get_context("spawn")
+        # Segments left behind by earlier servers that died
+        cleanup_segments()
+        self._workers = [_Worker(self._context) for _ in range(self.num_workers)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+        self._closed = threading.Event()
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+
+    def _supervise(self):
+        while not self._closed.wait(SUPERVISOR_INTERVAL):
+            # Only inspect idle workers; busy ones are handled by their caller
+            for _ in range(self._idle.qsize()):
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if not worker.process.is_alive():
+                    worker.restart()
+                    self.restarts += 1
+                self._idle.put(worker)
+
+    def run(self, task: str, timeout: float | None = None, **kwargs):
+        """
+        Run a task on a worker and return its result.
+        """
+        if self._closed.is_set():
+            raise RuntimeError("The worker pool has been shut down.")
+        timeout = self.task_timeout if timeout is None else timeout
+
+        worker = self._idle.get()
+        try:
+            try:
+                worker.conn.send((task, kwargs))
+                ready = worker.conn.poll(timeout)
+                status, payload = worker.conn.recv() if ready else (None, None)
+            except (EOFError, OSError):
+                worker.restart()
+                self.restarts += 1
+                raise WorkerCrashedError(f"Worker crashed while running {task!r}.")
+
+            if not ready:
+                worker.restart()
+                self.restarts += 1
+                raise WorkerTimeoutError(f"Task {task!r} timed out after {timeout}s.")
+        finally:
+            self._idle.put(worker)
+
+        if status == "error":
+            raise payload
+        if status == "shared":
+            return unpack_result(payload)
+        return payload
+
+    def shutdown(self):
+        self._closed.set()
+        for worker in self._workers:
+            worker.stop()
+        cleanup_segments(owner=os.getpid())
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.num_workers,
+            "idle": self._idle.qsize(),
+            "restarts": self.restarts,
+        }
@@ -1,14 +1,54 @@
+import threading
+import time
+
 import dash
 import dash_mantine_components as dmc
 from dash import dash_table
 import numpy as np
+import plotly.colors
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from climviz.helpers.archive import archive, SCALAR_COLUMNS, TABLE_COLUMNS
+from climviz.helpers.datasets import datasets
+from climviz.helpers.export import EXPORT_FORMATS, export_url
 from climviz.helpers.layout import create_grid, make_tabbed_content, graph_in_card
 from climviz.helpers.utils import make_page_id_func
+from climviz.models.execution import (
+    ModelTimeoutError,
+    OverloadedError,
+    preview_column,
+    run_column,
+    run_continuation,
+    ensemble_status,
+    run_diagnostics,
+    run_equilibrium_tabulated,
+    run_feedbacks,
+    run_inverse,
+    run_latitudes,
+    run_points,
+    run_scenario,
+    start_ensemble,
+    running_sweep,
+    start_sweep,
+    sweep_status,
+    validated_quantities,
+)
+from climviz.models.ensemble import ENSEMBLE_PERCENTILES, ENSEMBLE_QUANTITIES
+from climviz.models.grid import get_grid
+from climviz.models.inverse import INVERSE_GASES
+from climviz.models.scenario import DEFAULT_TOLERANCE, make_trajectory
+from climviz.models.scheduler import current_session
+from climviz.models.sweep import (
+    COLUMN_PARAMETERS,
+    GAS_UNITS,
+    SweepDimension,
+    SweepPlan,
+    parameter_label,
+    sweep_spec_hash,
+    to_vmr,
+)
 from climviz.models.rrtm import (
     absorber_vmr,
-    calc_olr,
-    find_equilibrium_surface_temperature,
     make_fig_atm_profile,
     make_fig_rad_profile,
 )
@@ -65,6 +105,34 @@ possible_params = {
 }
 
 
+# Fixed model settings used for the runs (also recorded as export metadata)
+model_settings = {"Tstrat": 195.0, "qStrat": 5e-06, "num_lev": 100}
+sensitivity_model_settings = {**model_settings, "Tstrat": 190.0}
+
+# Maximum number of points per axis drawn in the sensitivity contours
+max_contour_points = 400
+
+# Sensitivity figures already built, by (dataset id, content hash), so that
+# switching, adding or deleting datasets only renders new data
+MAX_CACHED_FIGURES = 32
+# Interval (ms) at which the page asks again for model runs still going
+MODEL_POLL_INTERVAL = 500
+# Message shown while a model run is being polled
+RUNNING_MESSAGE = "Running the model..."
+
+
+def retry_interval(name: str) -> dcc.Interval:
+    """
+    Interval polling the model run of a panel until it is done.
+    """
+    return dcc.Interval(
+        id=id_func(f"{name}-retry"), interval=MODEL_POLL_INTERVAL, disabled=True
+    )
+
+
+_sensitivity_figures = {}
+_sensitivity_figures_lock = threading.Lock()
+
 fig = go.Figure()
 
 # Create a dictionary of selectors for the parameters
@@ -93,6 +161,73 @@ temp_selector_with_button = dmc.Group(
     align="end",
 )
 
+# Sliders of the parameters, kept in sync with the inputs. While a slider is
+# dragged the figures are previewed with the fast gray engine, RRTMG runs when
+# it is released.
+sliders = {}
+for param in possible_params:
+    sliders[param] = dcc.Slider(
+        id=id_func(f"{param}-slider"),
+        min=possible_params[param]["min"],
+        max=possible_params[param]["max"],
+        step=possible_params[param]["step"],
+        value=possible_params[param]["value"],
+        marks=None,
+        updatemode="mouseup",
+    )
+
+
+# Inverse problem: the CO2 or CH4 concentration giving a target climate
+inverse_controls = dmc.Stack(
+    [
+        dmc.Select(
+            id=id_func("inverse-gas"),
+            label="Solve For",
+            data=list(INVERSE_GASES),
+            value="CO2",
+        ),
+        dmc.SegmentedControl(
+            id=id_func("inverse-quantity"),
+            data=[
+                {"label": "Eq. Temp.", "value": "Ts"},
+                {"label": "Net Flux", "value": "net_flux"},
+            ],
+            value="Ts",
+            fullWidth=True,
+        ),
+        dmc.NumberInput(
+            id=id_func("inverse-target"),
+            label="Target (K or W/m²)",
+            value=288.0,
+            step=0.1,
+        ),
+        dmc.Button("Solve", id=id_func("inverse-button"), variant="light"),
+        dmc.Text(id=id_func("inverse-result"), size="sm"),
+        retry_interval("inverse"),
+    ],
+    gap="xs",
+)
+
+# Standard diagnostics (forcing, ECS, Planck response) of the current inputs
+diagnostics_controls = dmc.Stack(
+    [
+        dmc.Button(
+            "Compute 2×CO2 Diagnostics",
+            id=id_func("diagnostics-button"),
+            variant="light",
+        ),
+        dmc.Stack(id=id_func("diagnostics-result"), gap=0),
+        retry_interval("diagnostics"),
+        dmc.Button(
+            "Feedback Decomposition",
+            id=id_func("feedbacks-button"),
+            variant="light",
+        ),
+        dmc.Stack(id=id_func("feedbacks-result"), gap=0),
+        retry_interval("feedbacks"),
+    ],
+    gap="xs",
+)
 
 save_point_button = dmc.Button(
     "Save Current Point",
@@ -111,14 +246,32 @@ options_content = html.Div(
         html.H3("RRTM Model Inputs"),
         dmc.Divider(label="Atmosphere", variant="dashed"),
         dmc.Stack(
-            children=[temp_selector_with_button],
+            children=[
+                temp_selector_with_button,
+                sliders["surface_temperature"],
+                # Shown while a model run is going
+                dmc.Text(id=id_func("model-status"), size="sm", c="orange"),
+                dcc.Interval(
+                    id=id_func("model-retry"),
+                    interval=MODEL_POLL_INTERVAL,
+                    disabled=True,
+                ),
+                dcc.Interval(
+                    id=id_func("eq-retry"),
+                    interval=MODEL_POLL_INTERVAL,
+                    disabled=True,
+                ),
+            ],
         ),
         dmc.Divider(label="Pollutants", variant="dashed"),
         dmc.Stack(
             children=[
                 selectors["co2_concentration"],
+                sliders["co2_concentration"],
                 selectors["ch4_concentration"],
+                sliders["ch4_concentration"],
                 selectors["rel_humidity"],
+                sliders["rel_humidity"],
             ],
             gap="md",
         ),
@@ -126,6 +279,10 @@ options_content = html.Div(
         dmc.Stack(
             children=[],
         ),
+        dmc.Divider(label="Inverse Problem", variant="dashed"),
+        inverse_controls,
+        dmc.Divider(label="Diagnostics", variant="dashed"),
+        diagnostics_controls,
         dmc.Stack(
             children=[
                 save_point_button,
@@ -159,19 +316,23 @@ tab1_content = create_grid(
 )
 
 # Sensitivity Analysis Tab
-sens_param_options = [{"label": s.label, "value": s.id} for s in selectors.values()]
+# Any column parameter or absorber can be swept (values in their usual units)
+sens_param_options = [
+    {"label": parameter_label(name), "value": name}
+    for name in [*COLUMN_PARAMETERS, *GAS_UNITS]
+]
 
 param_selector_1 = dmc.Select(
     id="param-selector-1",
     data=sens_param_options,
     label="Parameter 1",
-    value=selectors["co2_concentration"].id,
+    value="CO2",
 )
 param_selector_2 = dmc.Select(
     id="param-selector-2",
     data=sens_param_options,
     label="Parameter 2",
-    value=selectors["ch4_concentration"].id,
+    value="CH4",
 )
 
 range_inputs_param_1 = dmc.SimpleGrid(
@@ -218,6 +379,58 @@ sensitivity_datasets_list = dmc.List(
     children=[],
 )
 
+dataset_selector = dmc.Select(
+    id=id_func("sensitivity-dataset"),
+    label="Displayed Dataset",
+    placeholder="Run or open a dataset",
+    data=[],
+    value=None,
+)
+
+archive_selector = dmc.Select(
+    id=id_func("archive-selector"),
+    label="Open Archived Dataset",
+    placeholder="Select a dataset",
+    data=[],
+    searchable=True,
+    clearable=True,
+)
+
+# Equilibrium curve: continuation of the equilibrium along one parameter
+curve_param_options = [
+    {"label": selectors["co2_concentration"].label, "value": "CO2"},
+    {"label": selectors["ch4_concentration"].label, "value": "CH4"},
+    {"label": selectors["rel_humidity"].label, "value": "rel_humidity"},
+]
+# Default range of each curve parameter (gases in ppm, continued in log scale)
+curve_ranges = {"CO2": (1.0, 10000.0), "CH4": (0.01, 100.0), "rel_humidity": (0.1, 1.0)}
+
+curve_controls = dmc.Stack(
+    [
+        dmc.Select(
+            id=id_func("curve-param"),
+            data=curve_param_options,
+            label="Parameter",
+            value="CO2",
+        ),
+        dmc.SimpleGrid(
+            cols=2,
+            spacing="md",
+            children=[
+                dmc.NumberInput(
+                    id=id_func("curve-min"), label="Min", value=curve_ranges["CO2"][0]
+                ),
+                dmc.NumberInput(
+                    id=id_func("curve-max"), label="Max", value=curve_ranges["CO2"][1]
+                ),
+            ],
+        ),
+        dmc.Button("Trace Equilibrium Curve", id=id_func("run-curve")),
+        dmc.Text(id=id_func("curve-status"), size="sm", c="orange"),
+        retry_interval("curve"),
+    ]
+)
+
 sensitivity_controls = dmc.Stack(
     [
         param_selector_1,
@@ -226,9 +439,17 @@ sensitivity_controls = dmc.Stack(
         range_inputs_param_2,
         dataset_name_selector,
         run_button,
+        dmc.Text(id=id_func("sensitivity-progress"), size="sm"),
+        dcc.Interval(id=id_func("sensitivity-interval"), interval=1000, disabled=True),
+        # Sweeps running in the background, polled until they finish
+        dcc.Store(id=id_func("sensitivity-run"), data=[]),
         param_selector_desc,
         dmc.Divider(label="Saved Datasets", variant="dashed"),
         sensitivity_datasets_list,
+        dataset_selector,
+        archive_selector,
+        dmc.Divider(label="Equilibrium Curve", variant="dashed"),
+        curve_controls,
     ]
 )
 
@@ -254,6 +475,14 @@ sensitivity_plots = create_grid(
             "content": dcc.Graph(id=id_func("sensitivity-contour-4")),
             "size": 6,
         },
+        {
+            "content": dcc.Graph(id=id_func("sensitivity-profile")),
+            "size": 12,
+        },
+        {
+            "content": dcc.Graph(id=id_func("equilibrium-curve")),
+            "size": 12,
+        },
     ]
 )
 
@@ -264,6 +493,206 @@ sensitivity_layout = create_grid(
     ]
 )
 
+# Ensemble Tab: Monte Carlo uncertainty of the current configuration
+ensemble_controls = dmc.Stack(
+    [
+        dmc.NumberInput(
+            id=id_func("ensemble-size"),
+            label="Members",
+            value=1000,
+            min=10,
+            max=20000,
+            step=100,
+        ),
+        dmc.Text("Relative Humidity (uniform)", size="sm"),
+        dmc.SimpleGrid(
+            cols=2,
+            spacing="md",
+            children=[
+                dmc.NumberInput(
+                    id=id_func("ensemble-rh-low"), label="Min", value=0.6, step=0.05
+                ),
+                dmc.NumberInput(
+                    id=id_func("ensemble-rh-high"), label="Max", value=0.9, step=0.05
+                ),
+            ],
+        ),
+        dmc.NumberInput(
+            id=id_func("ensemble-co2-sigma"),
+            label="CO2 Spread (log-normal σ)",
+            value=0.3,
+            min=0.0,
+            step=0.05,
+        ),
+        dmc.Text("Stratospheric Temperature (normal, K)", size="sm"),
+        dmc.SimpleGrid(
+            cols=2,
+            spacing="md",
+            children=[
+                dmc.NumberInput(
+                    id=id_func("ensemble-tstrat-mean"),
+                    label="Mean",
+                    value=model_settings["Tstrat"],
+                ),
+                dmc.NumberInput(
+                    id=id_func("ensemble-tstrat-std"), label="Std", value=5.0, min=0.0
+                ),
+            ],
+        ),
+        dmc.Button("Run Ensemble", id=id_func("run-ensemble")),
+        dmc.Text(id=id_func("ensemble-progress"), size="sm"),
+        dmc.Blockquote(
+            """The CO2 amount is centred on the Exploration tab value, and OLR and
+            net flux are computed at its surface temperature. The bands fill in
+            as the members complete.""",
+            icon=DashIconify(icon="tabler:info-circle", width=30),
+            color="blue",
+        ),
+        dcc.Interval(id=id_func("ensemble-interval"), interval=1000, disabled=True),
+        dcc.Store(id=id_func("ensemble-run"), data=None),
+    ]
+)
+
+ensemble_layout = create_grid(
+    [
+        {"content": ensemble_controls, "size": 2},
+        {
+            "content": create_grid(
+                [
+                    {"content": dcc.Graph(id=id_func("ensemble-bands")), "size": 12},
+                    {
+                        "content": dcc.Graph(id=id_func("ensemble-histograms")),
+                        "size": 12,
+                    },
+                ]
+            ),
+            "size": 10,
+        },
+    ]
+)
+
+# Scenario Tab: OLR and equilibrium Ts along a concentration path
+scenario_controls = dmc.Stack(
+    [
+        dmc.SimpleGrid(
+            cols=2,
+            spacing="md",
+            children=[
+                dmc.NumberInput(
+                    id=id_func("scenario-start-year"), label="Start Year", value=1850
+                ),
+                dmc.NumberInput(
+                    id=id_func("scenario-end-year"), label="End Year", value=2100
+                ),
+                dmc.NumberInput(
+                    id=id_func("scenario-co2-start"), label="CO2 Start (ppm)", value=280
+                ),
+                dmc.NumberInput(
+                    id=id_func("scenario-co2-end"), label="CO2 End (ppm)", value=1000
+                ),
+                dmc.NumberInput(
+                    id=id_func("scenario-ch4-start"),
+                    label="CH4 Start (ppm)",
+                    value=0.7,
+                    step=0.1,
+                ),
+                dmc.NumberInput(
+                    id=id_func("scenario-ch4-end"),
+                    label="CH4 End (ppm)",
+                    value=2.5,
+                    step=0.1,
+                ),
+            ],
+        ),
+        dmc.Select(
+            id=id_func("scenario-shape"),
+            label="Trajectory",
+            data=[
+                {"label": "Linear", "value": "linear"},
+                {"label": "Exponential", "value": "exponential"},
+                {"label": "Logistic", "value": "logistic"},
+            ],
+            value="exponential",
+        ),
+        dmc.NumberInput(
+            id=id_func("scenario-tolerance"),
+            label="Interpolation Tolerance (relative change)",
+            value=DEFAULT_TOLERANCE,
+            min=0.0,
+            step=0.005,
+        ),
+        dmc.Button("Run Scenario", id=id_func("run-scenario")),
+        dmc.Text(id=id_func("scenario-status"), size="sm", c="orange"),
+        retry_interval("scenario"),
+        dmc.Blockquote(
+            """Yearly steps where the gases change by less than the tolerance
+            since the last evaluated step are interpolated. The relative humidity
+            and surface temperature are taken from the Exploration tab.""",
+            icon=DashIconify(icon="tabler:info-circle", width=30),
+            color="blue",
+        ),
+    ]
+)
+
+scenario_layout = create_grid(
+    [
+        {"content": scenario_controls, "size": 2},
+        {"content": dcc.Graph(id=id_func("scenario-graph")), "size": 10},
+    ]
+)
+
+# Latitudes Tab: pole-to-equator radiation and local equilibria
+latitude_controls = dmc.Stack(
+    [
+        dmc.NumberInput(
+            id=id_func("latitude-sst-equator"), label="Equator SST (K)", value=300
+        ),
+        dmc.NumberInput(
+            id=id_func("latitude-sst-pole"), label="Pole SST (K)", value=250
+        ),
+        dmc.NumberInput(
+            id=id_func("latitude-num-lat"),
+            label="Latitudes",
+            value=90,
+            min=2,
+            max=180,
+        ),
+        dmc.Button("Run Latitudes", id=id_func("run-latitudes")),
+        dmc.Text(id=id_func("latitudes-status"), size="sm", c="orange"),
+        retry_interval("latitudes"),
+        dmc.Blockquote(
+            """Each latitude is a column with its own SST and annual-mean
+            insolation, without heat transport between them. The gases and
+            relative humidity are taken from the Exploration tab.""",
+            icon=DashIconify(icon="tabler:info-circle", width=30),
+            color="blue",
+        ),
+    ]
+)
+
+latitude_layout = create_grid(
+    [
+        {"content": latitude_controls, "size": 2},
+        {
+            "content": create_grid(
+                [
+                    {"content": dcc.Graph(id=id_func("latitude-fluxes")), "size": 6},
+                    {
+                        "content": dcc.Graph(id=id_func("latitude-temperatures")),
+                        "size": 6,
+                    },
+                    {"content": dcc.Graph(id=id_func("latitude-tatm")), "size": 6},
+                    {
+                        "content": dcc.Graph(id=id_func("latitude-tatm-eq")),
+                        "size": 6,
+                    },
+                ]
+            ),
+            "size": 10,
+        },
+    ]
+)
+
 # About this model content
 about_content = html.Div(
     children=[
@@ -289,25 +718,33 @@ saved_points_datatable = dash_table.DataTable(
     ],
     data=[],
 )
+compare_points_button = dmc.Button(
+    "Compare Saved Points", id=id_func("compare-points-button")
+)
+# Results of the saved points, side by side
+COMPARISON_COLUMNS = [
+    "Point",
+    *(params["label"] for params in possible_params.values()),
+    "OLR (W/m²)",
+    "ASR (W/m²)",
+    "Net Flux (W/m²)",
+    "Equilibrium Ts (K)",
+]
+comparison_datatable = dash_table.DataTable(
+    id=id_func("comparison-table"),
+    columns=[{"name": col, "id": col} for col in COMPARISON_COLUMNS],
+    data=[],
+)
 sensitivity_points_datatable = dash_table.DataTable(
     id=id_func("sensitivity-points-table"),
-    columns=[
-        {"name": "param1_label", "id": "param1_label"},
-        {"name": "param2_label", "id": "param2_label"},
-        {"name": "param1_value", "id": "param1_value"},
-        {"name": "param2_value", "id": "param2_value"},
-        {"name": "OLR", "id": "OLR"},
-        {"name": "ASR", "id": "ASR"},
-        {"name": "Net Flux", "id": "Net Flux"},
-        {
-            "name": "Equilibrium Surface Temperature",
-            "id": "Equilibrium Surface Temperature",
-        },
-    ],
+    columns=[{"name": col, "id": col} for col in TABLE_COLUMNS],
     data=[],
     editable=False,
     style_table={"height": "600px", "overflowY": "auto"},
-    export_format="csv",
+    # Rows are read from the archive one page at a time
+    page_action="custom",
+    page_current=0,
+    page_size=50,
 )
 
 
@@ -316,7 +753,13 @@ data_content = dmc.Stack(
         dmc.Title("Sensitivity Points", order=2),
         sensitivity_points_datatable,
         dmc.Title("Saved Points", order=2),
+        dmc.Group(id=id_func("saved-points-downloads"), children=[]),
         saved_points_datatable,
+        compare_points_button,
+        dmc.Text(id=id_func("comparison-status"), size="sm", c="orange"),
+        retry_interval("comparison"),
+        comparison_datatable,
+        dcc.Graph(id=id_func("comparison-profiles")),
         dcc.Store(
             id=id_func("rrtm_options"),
             data={
@@ -335,6 +778,12 @@ data_content = dmc.Stack(
             data=[],
             storage_type="session",
         ),
+        # Server-side dataset id of the saved points (for exports)
+        dcc.Store(
+            id=id_func("saved_points_export_id"),
+            data=None,
+            storage_type="session",
+        ),
         # Store last sensitivity analysis points
         dcc.Store(
             id=id_func("sensitivity_points"),
@@ -360,6 +809,18 @@ layout = make_tabbed_content(
             "children": sensitivity_layout,
             "extra_tab_args": {"leftSection": DashIconify(icon="hugeicons:trade-up")},
         },
+        "Ensemble": {
+            "children": ensemble_layout,
+            "extra_tab_args": {"leftSection": DashIconify(icon="tabler:chart-dots")},
+        },
+        "Scenario": {
+            "children": scenario_layout,
+            "extra_tab_args": {"leftSection": DashIconify(icon="tabler:timeline")},
+        },
+        "Latitudes": {
+            "children": latitude_layout,
+            "extra_tab_args": {"leftSection": DashIconify(icon="tabler:world")},
+        },
         "Data": {
             "children": data_content,
             "extra_tab_args": {"leftSection": DashIconify(icon="tabler:database")},
@@ -400,6 +861,23 @@ layout = make_tabbed_content(
 #     raise PreventUpdate  # Prevent unnecessary updates
 
 
+def make_download_links(dataset_id, name):
+    """
+    Links to the streaming export endpoint, one per available format.
+    """
+    return dmc.Group(
+        [
+            html.A(
+                dmc.Badge(fmt, variant="outline", style={"cursor": "pointer"}),
+                href=export_url(dataset_id, fmt, name),
+                download="",
+            )
+            for fmt in EXPORT_FORMATS
+        ],
+        gap="xs",
+    )
+
+
 # Callback to update the sensitivity datasets list
 @callback(
     Output(id_func("sensitivity-datasets-list"), "children"),
@@ -418,9 +896,10 @@ def update_sensitivity_datasets_list(sensitivity_points):
                     id={"type": "delete-btn", "index": i},
                 ),
                 dmc.Text(item),
+                make_download_links(dataset["id"], item),
             ],
         )
-        for i, item in enumerate(sensitivity_points)
+        for i, (item, dataset) in enumerate(sensitivity_points.items())
     ]
 
 
@@ -446,22 +925,20 @@ def delete_item(sensitivity_points, n_clicks, ids):
 
     # get the key for the nth item (to be deleted)
     key_to_delete = list(sensitivity_points.keys())[triggered_idx[0]]
+    dataset_id = sensitivity_points[key_to_delete]["id"]
+    # Only forget the dataset in this session: the archive is shared by all the
+    # sessions (and identical sweeps share a dataset), so it is kept on disk
+    forget_sensitivity_figures(dataset_id)
     del sensitivity_points[key_to_delete]
 
     return sensitivity_points
 
 
-@callback(
-    Output(id_func("rrtm_graph_temp"), "figure"),
-    Output(id_func("rrtm_graph_rad"), "figure"),
-    Output(id_func("rrtm_graph_ind1"), "figure"),
-    Output(id_func("rrtm_graph_ind2"), "figure"),
-    Output(id_func("rrtm_graph_ind3"), "figure"),
-    Input(id_func("rrtm_options"), "data"),
-)
-def update_rrtm_graph(models_options):
-    rrtm_options = models_options
-
+def exploration_inputs(rrtm_options: dict):
+    """
+    Surface temperature, relative humidity and absorbers of the exploration
+    inputs.
+    """
     absorber_vmr_mod = absorber_vmr.copy()
     absorber_vmr_mod["CO2"] = (
         rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
@@ -471,13 +948,14 @@ def update_rrtm_graph(models_options):
     )
     sst = rrtm_options[selectors["surface_temperature"].id]["value"]
     rel_humidity = rrtm_options[selectors["rel_humidity"].id]["value"]
+    return sst, rel_humidity, absorber_vmr_mod
 
-    state, h2o, rad = calc_olr(sst, absorber_vmr_mod, RH=rel_humidity)
 
-    fig1 = make_fig_atm_profile(state)
-    fig2 = make_fig_rad_profile(state, rad)
+def make_exploration_figures(result):
+    fig1 = make_fig_atm_profile(result)
+    fig2 = make_fig_rad_profile(result)
 
-    net_flux = rad.OLR[0] - rad.ASR[0]
+    net_flux = result.OLR[0] - result.ASR[0]
     # round to 2 decimal places
     net_flux = round(net_flux, 2)
 
@@ -485,7 +963,7 @@ def update_rrtm_graph(models_options):
     fig3.add_trace(
         go.Indicator(
             mode="delta",
-            value=rad.OLR[0],
+            value=result.OLR[0],
             title={"text": "Outgoing Longwave Radiation (W/m²)"},
             domain={"x": [0, 1.0], "y": [0, 1.0]},
             delta={"reference": 0},
@@ -498,7 +976,7 @@ def update_rrtm_graph(models_options):
         go.Indicator(
             mode="delta",
             title={"text": "Incoming Shortwave Radiation (W/m²)"},
-            value=-rad.ASR[0],
+            value=-result.ASR[0],
             domain={"x": [0, 1.0], "y": [0, 1.0]},
             delta={"reference": 0},
         )
@@ -517,19 +995,134 @@ def update_rrtm_graph(models_options):
     )
     fig5.update_layout(height=250)
 
-    # fig4 = indicator_card("Incoming Shortwave Radiation (W/m²)", -rad.ASR[0])
+    # fig4 = indicator_card("Incoming Shortwave Radiation (W/m²)", -result.ASR[0])
 
     return fig1, fig2, fig4, fig3, fig5
 
 
+@callback(
+    Output(id_func("rrtm_graph_temp"), "figure"),
+    Output(id_func("rrtm_graph_rad"), "figure"),
+    Output(id_func("rrtm_graph_ind1"), "figure"),
+    Output(id_func("rrtm_graph_ind2"), "figure"),
+    Output(id_func("rrtm_graph_ind3"), "figure"),
+    Output(id_func("model-status"), "children"),
+    Output(id_func("model-retry"), "disabled"),
+    Input(id_func("rrtm_options"), "data"),
+    Input(id_func("model-retry"), "n_intervals"),
+)
+def update_rrtm_graph(models_options, n_intervals):
+    sst, rel_humidity, absorber_vmr_mod = exploration_inputs(models_options)
+
+    try:
+        result = run_column(
+            sst,
+            absorber_vmr_mod,
+            RH=rel_humidity,
+            # Don't wait for the run: it goes on and model-retry polls it
+            deadline=time.monotonic(),
+            allow_coarse=True,
+            **model_settings,
+        )
+    except ModelTimeoutError:
+        return (dash.no_update,) * 5 + (RUNNING_MESSAGE, False)
+    except OverloadedError:
+        # Keep the current figures and ask again shortly
+        return (dash.no_update,) * 5 + ("The model is busy, updating soon...", False)
+
+    if len(result.lev) < model_settings["num_lev"]:
+        # Degraded while the workers are busy: refine it later
+        status = "The model is busy, showing a coarse column for now."
+        return *make_exploration_figures(result), status, False
+    return *make_exploration_figures(result), "", True
+
+
+@callback(
+    output=[
+        Output(id_func("rrtm_graph_temp"), "figure", allow_duplicate=True),
+        Output(id_func("rrtm_graph_rad"), "figure", allow_duplicate=True),
+        Output(id_func("rrtm_graph_ind1"), "figure", allow_duplicate=True),
+        Output(id_func("rrtm_graph_ind2"), "figure", allow_duplicate=True),
+        Output(id_func("rrtm_graph_ind3"), "figure", allow_duplicate=True),
+    ],
+    inputs=dict(
+        drag_values={
+            param: Input(slider.id, "drag_value") for param, slider in sliders.items()
+        }
+    ),
+    state=dict(
+        values={param: State(slider.id, "value") for param, slider in sliders.items()},
+        models_options=State(id_func("rrtm_options"), "data"),
+    ),
+    prevent_initial_call=True,
+)
+def preview_rrtm_graph(drag_values, values, models_options):
+    """
+    Figures of a slider being dragged, from the fast gray engine. Only the
+    quantities the gray engine gets within tolerance of RRTMG are previewed,
+    the other figures keep showing the last RRTMG run.
+    """
+    param = next(p for p, slider in sliders.items() if slider.id == ctx.triggered_id)
+    drag_value = drag_values[param]
+    # Released: the final value goes through the inputs and RRTMG
+    if drag_value is None or drag_value == values[param]:
+        raise PreventUpdate
+
+    rrtm_options = {**models_options, selectors[param].id: {"value": drag_value}}
+    sst, rel_humidity, absorber_vmr_mod = exploration_inputs(rrtm_options)
+
+    result = preview_column(
+        sst, absorber_vmr_mod, RH=rel_humidity, engine="gray", **model_settings
+    )
+    valid = validated_quantities("gray")
+    shown = (
+        True,
+        {"OLR", "ASR"} <= valid,
+        "ASR" in valid,
+        "OLR" in valid,
+        "net_flux" in valid,
+    )
+    return [
+        figure if show else dash.no_update
+        for figure, show in zip(make_exploration_figures(result), shown)
+    ]
+
+
+def sync_slider(param):
+    """
+    Keep the input and the slider of a parameter showing the same value.
+    """
+
+    @callback(
+        Output(selectors[param].id, "value", allow_duplicate=True),
+        Output(sliders[param].id, "value", allow_duplicate=True),
+        Input(selectors[param].id, "value"),
+        Input(sliders[param].id, "value"),
+        prevent_initial_call=True,
+    )
+    def sync(input_value, slider_value):
+        if ctx.triggered_id == sliders[param].id:
+            return slider_value, dash.no_update
+        if input_value is None or input_value == "":
+            raise PreventUpdate
+        return dash.no_update, input_value
+
+
+for param in possible_params:
+    sync_slider(param)
+
+
 @callback(
     Output(selectors["surface_temperature"].id, "value"),
+    Output(id_func("model-status"), "children", allow_duplicate=True),
+    Output(id_func("eq-retry"), "disabled"),
     Input(id_func("find-eq-button"), "n_clicks"),
+    Input(id_func("eq-retry"), "n_intervals"),
     State(id_func("rrtm_options"), "data"),
     prevent_initial_call=True,
     allow_duplicate=True,
 )
-def eq_temperature_callback(n_clicks, options):
+def eq_temperature_callback(n_clicks, n_intervals, options):
     rrtm_options = options
 
     absorber_vmr_mod = absorber_vmr.copy()
@@ -541,10 +1134,219 @@ def eq_temperature_callback(n_clicks, options):
     )
     rel_humidity = rrtm_options[selectors["rel_humidity"].id]["value"]
 
-    eq_temp = find_equilibrium_surface_temperature(
-        absorber_vmr_mod, rel_humidity=rel_humidity
+    # Answered from the cached net flux curve of the configuration
+    try:
+        eq_temp = run_equilibrium_tabulated(
+            absorber_vmr_mod,
+            rel_humidity=rel_humidity,
+            # Don't wait for the run: it goes on and eq-retry polls it
+            deadline=time.monotonic(),
+            **model_settings,
+        )
+    except ModelTimeoutError:
+        return dash.no_update, "Computing the equilibrium...", False
+    except OverloadedError as err:
+        return dash.no_update, str(err), True
+    except ValueError:
+        return dash.no_update, "No stable equilibrium in the tabulated range.", True
+    return eq_temp, "", True
+
+
+# Callback to solve for the gas concentration giving the target climate
+@callback(
+    Output(selectors["co2_concentration"].id, "value"),
+    Output(selectors["ch4_concentration"].id, "value"),
+    Output(id_func("inverse-result"), "children"),
+    Output(id_func("inverse-retry"), "disabled"),
+    Input(id_func("inverse-button"), "n_clicks"),
+    Input(id_func("inverse-retry"), "n_intervals"),
+    State(id_func("inverse-gas"), "value"),
+    State(id_func("inverse-quantity"), "value"),
+    State(id_func("inverse-target"), "value"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def inverse_callback(n_clicks, n_intervals, gas, quantity, target, rrtm_options):
+    if gas is None or target is None:
+        raise PreventUpdate
+
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = (
+        rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
+    )
+    absorber_vmr_mod["CH4"] = (
+        rrtm_options[selectors["ch4_concentration"].id]["value"] / 1e6
     )
-    return eq_temp
+
+    try:
+        solution = run_inverse(
+            gas,
+            target,
+            absorber_vmr_mod,
+            quantity=quantity,
+            SST=rrtm_options[selectors["surface_temperature"].id]["value"],
+            Tstrat=model_settings["Tstrat"],
+            rel_humidity=rrtm_options[selectors["rel_humidity"].id]["value"],
+            deadline=time.monotonic(),
+        )
+    except ModelTimeoutError:
+        return dash.no_update, dash.no_update, RUNNING_MESSAGE, False
+    except (ValueError, OverloadedError) as err:
+        return dash.no_update, dash.no_update, str(err), True
+
+    ppm = round(solution["vmr"] * 1e6, 2)
+    message = f"{gas} = {ppm} ppm ({solution['evaluations']} evaluations)"
+    if gas == "CO2":
+        return ppm, dash.no_update, message, True
+    return dash.no_update, ppm, message, True
+
+
+# Callback to compute the forcing, ECS and Planck response of the current inputs
+@callback(
+    Output(id_func("diagnostics-result"), "children"),
+    Output(id_func("diagnostics-retry"), "disabled"),
+    Input(id_func("diagnostics-button"), "n_clicks"),
+    Input(id_func("diagnostics-retry"), "n_intervals"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def diagnostics_callback(n_clicks, n_intervals, rrtm_options):
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = (
+        rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
+    )
+    absorber_vmr_mod["CH4"] = (
+        rrtm_options[selectors["ch4_concentration"].id]["value"] / 1e6
+    )
+
+    try:
+        diagnostics = run_diagnostics(
+            absorber_vmr_mod,
+            rel_humidity=rrtm_options[selectors["rel_humidity"].id]["value"],
+            deadline=time.monotonic(),
+            **model_settings,
+        )
+    except ModelTimeoutError:
+        return [dmc.Text(RUNNING_MESSAGE, size="sm", c="orange")], False
+    except (ValueError, OverloadedError) as err:
+        return [dmc.Text(str(err), size="sm", c="red")], True
+
+    rows = [
+        ("Baseline Ts", diagnostics["Ts_baseline"], "K"),
+        ("Forcing", diagnostics["forcing"], "W/m²"),
+        ("ECS", diagnostics["ecs"], "K"),
+        ("Planck response", diagnostics["planck_response"], "W/m²/K"),
+        ("Feedback parameter", diagnostics["feedback_parameter"], "W/m²/K"),
+    ]
+    return [
+        dmc.Text(f"{label}: {value:.2f} {unit}", size="sm")
+        for label, value, unit in rows
+    ], True
+
+
+# Callback to decompose the climate feedback of the current inputs
+@callback(
+    Output(id_func("feedbacks-result"), "children"),
+    Output(id_func("feedbacks-retry"), "disabled"),
+    Input(id_func("feedbacks-button"), "n_clicks"),
+    Input(id_func("feedbacks-retry"), "n_intervals"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def feedbacks_callback(n_clicks, n_intervals, rrtm_options):
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = (
+        rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
+    )
+    absorber_vmr_mod["CH4"] = (
+        rrtm_options[selectors["ch4_concentration"].id]["value"] / 1e6
+    )
+
+    try:
+        feedbacks = run_feedbacks(
+            absorber_vmr_mod,
+            rel_humidity=rrtm_options[selectors["rel_humidity"].id]["value"],
+            deadline=time.monotonic(),
+            **model_settings,
+        )
+    except ModelTimeoutError:
+        return [dmc.Text(RUNNING_MESSAGE, size="sm", c="orange")], False
+    except (ValueError, OverloadedError) as err:
+        return [dmc.Text(str(err), size="sm", c="red")], True
+
+    rows = [
+        ("Planck", feedbacks["planck"]),
+        ("Lapse rate", feedbacks["lapse_rate"]),
+        ("Water vapour", feedbacks["water_vapour"]),
+        ("Total", feedbacks["total"]),
+        ("Residual", feedbacks["residual"]),
+    ]
+    return [
+        dmc.Text(f"{label}: {value:.2f} W/m²/K", size="sm") for label, value in rows
+    ], True
+
+
+# Callback to list the datasets that can be displayed, and pick the one shown
+@callback(
+    Output(id_func("sensitivity-dataset"), "data"),
+    Output(id_func("sensitivity-dataset"), "value"),
+    Input(id_func("sensitivity_points"), "data"),
+    State(id_func("sensitivity-dataset"), "data"),
+    State(id_func("sensitivity-dataset"), "value"),
+)
+def update_dataset_selector(sensitivity_points, options, current):
+    ids = [dataset["id"] for dataset in sensitivity_points.values()]
+    previous = [option["value"] for option in options or []]
+    added = [dataset_id for dataset_id in ids if dataset_id not in previous]
+
+    if added:
+        # A new dataset was run or opened: show it
+        value = added[-1]
+    elif previous and len(ids) == len(previous) and ids[-1] != previous[-1]:
+        # An archived dataset was re-opened (moved to the end)
+        value = ids[-1]
+    elif current in ids:
+        value = current
+    else:
+        value = ids[-1] if ids else None
+
+    data = [
+        {"value": dataset["id"], "label": name}
+        for name, dataset in sensitivity_points.items()
+    ]
+    return data, value
+
+
+def forget_sensitivity_figures(dataset_id: str):
+    with _sensitivity_figures_lock:
+        for key in [key for key in _sensitivity_figures if key[0] == dataset_id]:
+            del _sensitivity_figures[key]
+
+
+def get_sensitivity_figures(dataset_id: str) -> tuple:
+    """
+    The contours of a dataset, built once per content of the dataset.
+    """
+    key = (dataset_id, archive.content_hash(dataset_id))
+    with _sensitivity_figures_lock:
+        figs = _sensitivity_figures.get(key)
+    if figs is not None:
+        return figs
+
+    # One read of all the scalar grids (strided for large sweeps)
+    grid = archive.read_grid(dataset_id, max_points=max_contour_points)
+    figs = tuple(
+        make_sensitivity_contour(grid, title, var)
+        for title, var in SCALAR_COLUMNS.items()
+    )
+
+    # Older contents of the dataset are not needed any more
+    forget_sensitivity_figures(dataset_id)
+    with _sensitivity_figures_lock:
+        while len(_sensitivity_figures) >= MAX_CACHED_FIGURES:
+            _sensitivity_figures.pop(next(iter(_sensitivity_figures)))
+        _sensitivity_figures[key] = figs
+    return figs
 
 
 # callback to create the sensitivity figures
@@ -553,47 +1355,102 @@ def eq_temperature_callback(n_clicks, options):
     Output(id_func("sensitivity-contour-2"), "figure"),
     Output(id_func("sensitivity-contour-3"), "figure"),
     Output(id_func("sensitivity-contour-4"), "figure"),
-    Input(id_func("sensitivity_points"), "data"),
+    Input(id_func("sensitivity-dataset"), "value"),
 )
-def create_sensitivity_figures(sensitivity_points):
-    if len(sensitivity_points) == 0:
+def create_sensitivity_figures(dataset_id):
+    if dataset_id is None or dataset_id not in archive:
         return dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
-    # Get the last dataset
-    sensitivity_points = list(sensitivity_points.values())[-1]
-
-    values1 = [point["param1_value"] for point in sensitivity_points]
-    values2 = [point["param2_value"] for point in sensitivity_points]
-    Z1 = [point["OLR"] for point in sensitivity_points]
-    Z2 = [point["ASR"] for point in sensitivity_points]
-    Z3 = [point["Net Flux"] for point in sensitivity_points]
-    Z4 = [point["Equilibrium Surface Temperature"] for point in sensitivity_points]
+    return get_sensitivity_figures(dataset_id)
 
-    fig1 = go.Figure(go.Contour(x=values1, y=values2, z=Z1))
-    fig2 = go.Figure(go.Contour(x=values1, y=values2, z=Z2))
-    fig3 = go.Figure(go.Contour(x=values1, y=values2, z=Z3))
-    fig4 = go.Figure(go.Contour(x=values1, y=values2, z=Z4))
 
-    for fig, title in zip(
-        [fig1, fig2, fig3, fig4],
-        ["OLR", "ASR", "Net Flux", "Equilibrium Surface Temperature"],
-    ):
-        # Change colormap to Blackbody
-        fig.update_layout(
+def make_sensitivity_contour(grid: dict, title: str, var: str):
+    """
+    Contour of a sweep variable over its regular (param1, param2) grid; the
+    arrays are sent to the browser as binary typed arrays.
+    """
+    return go.Figure(
+        go.Contour(x=grid["param1"], y=grid["param2"], z=grid[var]),
+        layout=go.Layout(
+            # Change colormap to Blackbody
             coloraxis_colorscale="Blackbody",
             title=f"{title} Sensitivity Analysis",
-            xaxis_title=sensitivity_points[0]["param1_label"],
-            yaxis_title=sensitivity_points[0]["param2_label"],
+            xaxis_title=grid["param1_label"],
+            yaxis_title=grid["param2_label"],
             height=600,
             width=600,
+        ),
+    )
+
+
+# Callback to show the vertical profiles of the clicked sweep point
+@callback(
+    Output(id_func("sensitivity-profile"), "figure"),
+    Input(id_func("sensitivity-contour-1"), "clickData"),
+    Input(id_func("sensitivity-contour-2"), "clickData"),
+    Input(id_func("sensitivity-contour-3"), "clickData"),
+    Input(id_func("sensitivity-contour-4"), "clickData"),
+    State(id_func("sensitivity-dataset"), "value"),
+    prevent_initial_call=True,
+)
+def show_sensitivity_profile(click1, click2, click3, click4, dataset_id):
+    click_data = ctx.triggered[0]["value"]
+    if not click_data or dataset_id is None or dataset_id not in archive:
+        raise PreventUpdate
+
+    point = click_data["points"][0]
+
+    with archive.open(dataset_id) as ds:
+        # Read a single cell of the profile variables
+        cell = ds.sel(param1=point["x"], param2=point["y"], method="nearest")
+        grid = get_grid(ds.sizes["lev"])
+
+        fig = make_subplots(
+            rows=1,
+            cols=2,
+            shared_yaxes=True,
+            subplot_titles=["Temperature Profile", "Radiation Profile"],
+        )
+        fig.add_trace(
+            go.Scatter(x=cell["Tatm"].values, y=grid.altitude, name="Temperature"),
+            row=1,
+            col=1,
+        )
+        for var, sign in [
+            ("LW_flux_up", 1),
+            ("SW_flux_up", 1),
+            ("LW_flux_down", -1),
+            ("SW_flux_down", -1),
+        ]:
+            fig.add_trace(
+                go.Scatter(
+                    x=sign * cell[var].values,
+                    y=grid.altitude_bounds,
+                    name=var.replace("_", " "),
+                ),
+                row=1,
+                col=2,
+            )
+        fig.update_layout(
+            title=(
+                f"{ds.attrs['param1_label']}={float(cell['param1']):.4g}, "
+                f"{ds.attrs['param2_label']}={float(cell['param2']):.4g}"
+            ),
+            yaxis=grid.yaxis,
+            height=500,
         )
 
-    return fig1, fig2, fig3, fig4
+    return fig
+
+
+# Sensitivity analysis: start the sweep in the background, then poll it
+_sweep_start_lock = threading.Lock()
 
 
-# Callback for sensitivity analysis
 @callback(
-    Output(id_func("sensitivity_points"), "data"),
+    Output(id_func("sensitivity-run"), "data"),
+    Output(id_func("sensitivity-interval"), "disabled"),
+    Output(id_func("sensitivity-progress"), "children"),
     Input(id_func("run-sensitivity"), "n_clicks"),
     State("param-selector-1", "value"),
     State("param-selector-2", "value"),
@@ -605,9 +1462,8 @@ def create_sensitivity_figures(sensitivity_points):
     State(id_func("n-2"), "value"),
     State(id_func("rrtm_options"), "data"),
     State(id_func("dataset-name"), "value"),
-    State(id_func("sensitivity_points"), "data"),
+    State(id_func("sensitivity-run"), "data"),
     prevent_initial_call=True,
-    allow_duplicate=True,
 )
 def run_sensitivity(
     n_clicks,
@@ -621,105 +1477,821 @@ def run_sensitivity(
     n_2,
     rrtom_options,
     dataset_name,
-    current_sensitivity_points,
+    runs,
 ):
-    values1 = np.linspace(min1, max1, n_1)
-    values2 = np.linspace(min2, max2, n_2)
-    Z1 = np.zeros((n_1, n_2))
-    Z2 = np.zeros((n_1, n_2))
-    Z3 = np.zeros((n_1, n_2))
-    Z4 = np.zeros((n_1, n_2))
+    if param1 == param2:
+        raise PreventUpdate
 
     rrtm_params = {param: val["value"] for param, val in rrtom_options.items()}
 
-    sensitivity_points = []
+    base_absorber_vmr = absorber_vmr.copy()
+    base_absorber_vmr["CO2"] = float(
+        to_vmr(rrtm_params[selectors["co2_concentration"].id], "ppm")
+    )
+    base_absorber_vmr["CH4"] = float(
+        to_vmr(rrtm_params[selectors["ch4_concentration"].id], "ppm")
+    )
+    plan = SweepPlan(
+        [
+            SweepDimension(param1, np.linspace(min1, max1, n_1)),
+            SweepDimension(param2, np.linspace(min2, max2, n_2)),
+        ],
+        base_absorber_vmr,
+        SST=rrtm_params[selectors["surface_temperature"].id],
+        RH=rrtm_params[selectors["rel_humidity"].id],
+        **sensitivity_model_settings,
+    )
+    dimension1, dimension2 = plan.dimensions
+    metadata = {
+        "name": dataset_name,
+        "param1": param1,
+        "param2": param2,
+        "units1": dimension1.units,
+        "units2": dimension2.units,
+        "absorber_vmr": base_absorber_vmr,
+        "rel_humidity": plan.base["RH"],
+        **sensitivity_model_settings,
+    }
+
+    # Results are checkpointed to the on-disk archive one param1 row at a time,
+    # the rows being evaluated concurrently by the model workers. The dataset
+    # is keyed by the sweep spec, so running the same sweep again resumes it.
+    # A sweep that is already running (double-click, another session) is
+    # joined rather than resumed by a second writer.
+    dataset_id = f"sweep-{sweep_spec_hash(plan)}"
+    with _sweep_start_lock:
+        run_id = running_sweep(dataset_id)
+        if run_id is None:
+            if dataset_id in archive:
+                writer = archive.resume(dataset_id)
+            else:
+                grid = get_grid(sensitivity_model_settings["num_lev"])
+                writer = archive.create(
+                    dataset_name,
+                    dimension1.label,
+                    dimension1.values,
+                    dimension2.label,
+                    dimension2.values,
+                    lev=grid.lev,
+                    lev_bounds=grid.lev_bounds,
+                    metadata=metadata,
+                    dataset_id=dataset_id,
+                    owner=current_session.get(),
+                )
+            try:
+                run_id = start_sweep(
+                    plan,
+                    writer.write_row,
+                    rows=writer.missing_rows,
+                    on_finish=writer.close,
+                    key=dataset_id,
+                )
+            except OverloadedError as err:
+                writer.close()
+                return dash.no_update, dash.no_update, str(err)
+
+    runs = list(runs or [])
+    if all(run["id"] != run_id for run in runs):
+        runs.append({"id": run_id, "name": dataset_name, "dataset_id": dataset_id})
+    return runs, False, "Starting..."
 
-    for i, v1 in enumerate(values1):
-        for j, v2 in enumerate(values2):
-            rrtm_params[param1] = v1 / 1e6 if "concentration" in param1 else v1
-            rrtm_params[param2] = v2 / 1e6 if "concentration" in param2 else v2
 
-            absorber_vmr_mod = absorber_vmr.copy()
-            absorber_vmr_mod["CO2"] = (
-                rrtm_params[selectors["co2_concentration"].id] / 1e6
-            )
-            absorber_vmr_mod["CH4"] = (
-                rrtm_params[selectors["ch4_concentration"].id] / 1e6
-            )
+@callback(
+    Output(id_func("sensitivity_points"), "data"),
+    Output(id_func("sensitivity-run"), "data", allow_duplicate=True),
+    Output(id_func("sensitivity-progress"), "children", allow_duplicate=True),
+    Output(id_func("sensitivity-interval"), "disabled", allow_duplicate=True),
+    Input(id_func("sensitivity-interval"), "n_intervals"),
+    State(id_func("sensitivity-run"), "data"),
+    State(id_func("sensitivity_points"), "data"),
+    prevent_initial_call=True,
+)
+def poll_sensitivity(n_intervals, runs, current_sensitivity_points):
+    if not runs:
+        raise PreventUpdate
+
+    running, messages, points_changed = [], [], False
+    for run in runs:
+        try:
+            status = sweep_status(run["id"])
+        except KeyError:
+            messages.append(f"{run['name']}: not available")
+            continue
+        progress = f"{run['name']}: {status['completed']} / {status['rows']} rows"
+        if not status["finished"]:
+            running.append(run)
+            messages.append(progress)
+        elif status["error"]:
+            messages.append(f"{progress} – stopped: {status['error']}")
+        else:
+            current_sensitivity_points[run["name"]] = {"id": run["dataset_id"]}
+            points_changed = True
+
+    return (
+        current_sensitivity_points if points_changed else dash.no_update,
+        running,
+        "; ".join(messages),
+        not running,
+    )
 
-            _, _, rad = calc_olr(
-                rrtm_params[selectors["surface_temperature"].id],
-                absorber_vmr_mod,
-                RH=rrtm_params[selectors["rel_humidity"].id],
-                Tstrat=190.0,
-            )
-            Z1[j, i] = rad.OLR[0]
-            Z2[j, i] = rad.ASR[0]
-            Z3[j, i] = rad.OLR[0] - rad.ASR[0]
-            Z4[j, i] = find_equilibrium_surface_temperature(
-                absorber_vmr_mod, rel_humidity=rrtm_params[selectors["rel_humidity"].id]
-            )
 
-            sensitivity_points.append(
-                {
-                    "param1_value": v1,
-                    "param2_value": v2,
-                    "param1_label": param1,
-                    "param2_label": param2,
-                    "options": rrtm_params,
-                    "OLR": Z1[j, i],
-                    "ASR": Z2[j, i],
-                    "Net Flux": Z3[j, i],
-                    "Equilibrium Surface Temperature": Z4[j, i],
-                }
-            )
-
-    current_sensitivity_points[dataset_name] = sensitivity_points
+# Callback to update the sensitivity points datatable (one page at a time)
+@callback(
+    Output(id_func("sensitivity-points-table"), "data"),
+    Output(id_func("sensitivity-points-table"), "page_count"),
+    Input(id_func("sensitivity-dataset"), "value"),
+    Input(id_func("sensitivity-points-table"), "page_current"),
+    Input(id_func("sensitivity-points-table"), "page_size"),
+    prevent_initial_call=True,
+)
+def update_sensitivity_points_table(dataset_id, page_current, page_size):
+    if dataset_id is None or dataset_id not in archive:
+        return [], 0
 
-    return current_sensitivity_points
+    start = page_current * page_size
+    data = archive.read_records(dataset_id, start, start + page_size)
+    page_count = -(-archive.num_rows(dataset_id) // page_size)
+    return data, page_count
 
 
-# Callback to update the sensitivity points datatable
+# Callbacks to re-open datasets kept in the on-disk archive
 @callback(
-    Output(id_func("sensitivity-points-table"), "data"),
+    Output(id_func("archive-selector"), "data"),
     Input(id_func("sensitivity_points"), "data"),
+)
+def update_archive_selector(sensitivity_points):
+    return [
+        {"value": entry["id"], "label": f"{entry['name']} ({entry['created'][:16]})"}
+        for entry in archive.list_datasets(owner=current_session.get())
+    ]
+
+
+@callback(
+    Output(id_func("sensitivity_points"), "data", allow_duplicate=True),
+    Input(id_func("archive-selector"), "value"),
+    State(id_func("sensitivity_points"), "data"),
     prevent_initial_call=True,
 )
-def update_sensitivity_points_table(sensitivity_points):
-    # Create a dictionary with the data for the datatable
-    data = []
-
-    # Get the last dataset
-    sensitivity_points = list(sensitivity_points.values())[-1]
-
-    for point in sensitivity_points:
-        data.append(
-            {
-                "param1_label": point["param1_label"],
-                "param2_label": point["param2_label"],
-                "param1_value": point["param1_value"],
-                "param2_value": point["param2_value"],
-                "OLR": point["OLR"],
-                "ASR": point["ASR"],
-                "Net Flux": point["Net Flux"],
-                "Equilibrium Surface Temperature": point[
-                    "Equilibrium Surface Temperature"
-                ],
-            }
-        )
-    return data
+def open_archived_dataset(dataset_id, sensitivity_points):
+    if dataset_id is None or dataset_id not in archive:
+        raise PreventUpdate
+    # Sessions only re-open their own sweeps
+    if archive.owner(dataset_id) != current_session.get():
+        raise PreventUpdate
+
+    with archive.open(dataset_id) as ds:
+        name = ds.attrs.get("name", dataset_id)
+
+    # Re-insert so that the opened dataset becomes the displayed (last) one
+    sensitivity_points.pop(name, None)
+    sensitivity_points[name] = {"id": dataset_id}
+    return sensitivity_points
 
 
 @callback(
     Output(id_func("saved_points"), "data"),
+    Output(id_func("saved_points_export_id"), "data"),
     Input(id_func("save-point-button"), "n_clicks"),
     State(id_func("rrtm_options"), "data"),
     State(id_func("saved_points"), "data"),
+    State(id_func("saved_points_export_id"), "data"),
     prevent_initial_call=True,
 )
-def save_point(n_clicks, rrtm_options, saved_points):
+def save_point(n_clicks, rrtm_options, saved_points, export_id):
     if saved_points is None:
         saved_points = []
 
     saved_points.append(rrtm_options)
-    return saved_points
+
+    # Mirror all saved points server-side (re-using the session's dataset id)
+    columns = [s.label for s in selectors.values()]
+    rows = [
+        {s.label: point[s.id]["value"] for s in selectors.values()}
+        for point in saved_points
+    ]
+    export_id = datasets.register(
+        rows,
+        columns=columns,
+        metadata={
+            "name": "saved_points",
+            "absorber_vmr": absorber_vmr,
+            **model_settings,
+        },
+        dataset_id=export_id,
+    )
+
+    return saved_points, export_id
+
+
+@callback(
+    Output(id_func("saved-points-downloads"), "children"),
+    Input(id_func("saved_points_export_id"), "data"),
+)
+def update_saved_points_downloads(export_id):
+    if export_id is None or export_id not in datasets:
+        return []
+
+    return [dmc.Text("Download:"), make_download_links(export_id, "saved_points")]
+
+
+def make_comparison_profiles(result, labels) -> go.Figure:
+    """
+    Temperature and longwave flux profiles of several points, overlaid.
+    """
+    grid = result.grid
+    colors = plotly.colors.qualitative.Plotly
+    fig = make_subplots(
+        rows=1,
+        cols=2,
+        shared_yaxes=True,
+        subplot_titles=["Temperature Profile", "Longwave Flux Profile"],
+    )
+    for i, label in enumerate(labels):
+        line = {"color": colors[i % len(colors)]}
+        fig.add_trace(
+            go.Scatter(
+                x=result.Tatm[i],
+                y=grid.altitude,
+                name=label,
+                legendgroup=label,
+                line=line,
+            ),
+            row=1,
+            col=1,
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=result.LW_flux_up[i],
+                y=grid.altitude_bounds,
+                name=f"{label} LW up",
+                legendgroup=label,
+                showlegend=False,
+                line=line,
+            ),
+            row=1,
+            col=2,
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=-result.LW_flux_down[i],
+                y=grid.altitude_bounds,
+                name=f"{label} LW down",
+                legendgroup=label,
+                showlegend=False,
+                line={**line, "dash": "dot"},
+            ),
+            row=1,
+            col=2,
+        )
+    fig.update_layout(
+        title="Saved Points (LW up solid, LW down dotted)",
+        yaxis=grid.yaxis,
+        height=500,
+    )
+    return fig
+
+
+# Callback to evaluate all the saved points together and compare them
+@callback(
+    Output(id_func("comparison-table"), "data"),
+    Output(id_func("comparison-profiles"), "figure"),
+    Output(id_func("comparison-status"), "children"),
+    Output(id_func("comparison-retry"), "disabled"),
+    Input(id_func("compare-points-button"), "n_clicks"),
+    Input(id_func("comparison-retry"), "n_intervals"),
+    State(id_func("saved_points"), "data"),
+    prevent_initial_call=True,
+)
+def compare_saved_points(n_clicks, n_intervals, saved_points):
+    if not saved_points:
+        raise PreventUpdate
+
+    def values(param):
+        return np.array(
+            [point[selectors[param].id]["value"] for point in saved_points],
+            dtype=float,
+        )
+
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = values("co2_concentration") / 1e6
+    absorber_vmr_mod["CH4"] = values("ch4_concentration") / 1e6
+    # One batched model call for the points that are not cached
+    try:
+        evaluated = run_points(
+            values("surface_temperature"),
+            absorber_vmr_mod,
+            RH=values("rel_humidity"),
+            deadline=time.monotonic(),
+            **model_settings,
+        )
+    except ModelTimeoutError:
+        return dash.no_update, dash.no_update, RUNNING_MESSAGE, False
+    except OverloadedError as err:
+        return dash.no_update, dash.no_update, str(err), True
+    result = evaluated["result"]
+
+    def rounded(value):
+        return None if np.isnan(value) else round(float(value), 2)
+
+    labels = [f"Point {i + 1}" for i in range(len(saved_points))]
+    rows = [
+        {
+            "Point": label,
+            **{s.label: point[s.id]["value"] for s in selectors.values()},
+            "OLR (W/m²)": rounded(result.OLR[i]),
+            "ASR (W/m²)": rounded(result.ASR[i]),
+            "Net Flux (W/m²)": rounded(result.net_flux[i]),
+            "Equilibrium Ts (K)": rounded(evaluated["Ts_eq"][i]),
+        }
+        for i, (label, point) in enumerate(zip(labels, saved_points))
+    ]
+    return rows, make_comparison_profiles(result, labels), "", True
+
+
+@callback(
+    Output(id_func("curve-min"), "value"),
+    Output(id_func("curve-max"), "value"),
+    Input(id_func("curve-param"), "value"),
+    prevent_initial_call=True,
+)
+def reset_curve_range(parameter):
+    if parameter not in curve_ranges:
+        raise PreventUpdate
+    return curve_ranges[parameter]
+
+
+# Callback to trace the equilibrium surface temperature along a parameter
+@callback(
+    Output(id_func("equilibrium-curve"), "figure"),
+    Output(id_func("curve-status"), "children"),
+    Output(id_func("curve-retry"), "disabled"),
+    Input(id_func("run-curve"), "n_clicks"),
+    Input(id_func("curve-retry"), "n_intervals"),
+    State(id_func("curve-param"), "value"),
+    State(id_func("curve-min"), "value"),
+    State(id_func("curve-max"), "value"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def trace_equilibrium_curve(
+    n_clicks, n_intervals, parameter, start, stop, rrtm_options
+):
+    if parameter is None or start is None or stop is None:
+        raise PreventUpdate
+
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = (
+        rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
+    )
+    absorber_vmr_mod["CH4"] = (
+        rrtm_options[selectors["ch4_concentration"].id]["value"] / 1e6
+    )
+    # Gas concentrations are entered in ppm
+    scale = 1e6 if parameter in absorber_vmr else 1.0
+
+    try:
+        curve = run_continuation(
+            parameter,
+            start / scale,
+            stop / scale,
+            absorber_vmr_mod,
+            Tstrat=sensitivity_model_settings["Tstrat"],
+            rel_humidity=rrtm_options[selectors["rel_humidity"].id]["value"],
+            deadline=time.monotonic(),
+        )
+    except ModelTimeoutError:
+        return dash.no_update, RUNNING_MESSAGE, False
+    except (ValueError, OverloadedError) as err:
+        return dash.no_update, str(err), True
+    if not curve["Ts"]:
+        # No equilibrium to start the branch from
+        kind = curve["events"][0]["type"]
+        reason = "runaway warming" if kind == "runaway" else "the column keeps cooling"
+        return (
+            dash.no_update,
+            f"No equilibrium at the start of the range ({reason}).",
+            True,
+        )
+
+    x = np.array(curve["parameter"]) * scale
+    Ts = np.array(curve["Ts"])
+    stable = np.array(curve["stable"], dtype=bool)
+
+    fig = go.Figure()
+    for is_stable, name, dash_style in [
+        (True, "Stable", "solid"),
+        (False, "Unstable", "dash"),
+    ]:
+        # Break the line where the stability changes
+        fig.add_trace(
+            go.Scatter(
+                x=x,
+                y=np.where(stable == is_stable, Ts, np.nan),
+                mode="lines+markers",
+                name=name,
+                line=dict(dash=dash_style),
+            )
+        )
+    log_axis = scale != 1.0
+    for event in curve["events"]:
+        if event["Ts"] is None:
+            continue
+        x_event = event["parameter"] * scale
+        fig.add_annotation(
+            # Annotations on log axes are positioned in log10 units
+            x=np.log10(x_event) if log_axis else x_event,
+            y=event["Ts"],
+            text=event["type"].replace("_", " "),
+        )
+
+    label = next(o["label"] for o in curve_param_options if o["value"] == parameter)
+    fig.update_layout(
+        title=f"Equilibrium Surface Temperature ({curve['evaluations']} evaluations)",
+        xaxis=dict(title=label, type="log" if log_axis else "linear"),
+        yaxis=dict(title="Equilibrium Surface Temperature (K)"),
+    )
+    return fig, "", True
+
+
+# Monte Carlo ensemble: start it in the background, then poll its statistics
+ensemble_labels = {
+    "OLR": "OLR (W/m²)",
+    "net_flux": "Net Flux (W/m²)",
+    "Ts": "Equilibrium Ts (K)",
+}
+
+
+@callback(
+    Output(id_func("ensemble-run"), "data"),
+    Output(id_func("ensemble-interval"), "disabled"),
+    Output(id_func("ensemble-progress"), "children", allow_duplicate=True),
+    Input(id_func("run-ensemble"), "n_clicks"),
+    State(id_func("ensemble-size"), "value"),
+    State(id_func("ensemble-rh-low"), "value"),
+    State(id_func("ensemble-rh-high"), "value"),
+    State(id_func("ensemble-co2-sigma"), "value"),
+    State(id_func("ensemble-tstrat-mean"), "value"),
+    State(id_func("ensemble-tstrat-std"), "value"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def start_ensemble_callback(
+    n_clicks, size, rh_low, rh_high, co2_sigma, tstrat_mean, tstrat_std, rrtm_options
+):
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = (
+        rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
+    )
+    absorber_vmr_mod["CH4"] = (
+        rrtm_options[selectors["ch4_concentration"].id]["value"] / 1e6
+    )
+
+    distributions = {
+        "rel_humidity": {"dist": "uniform", "low": rh_low, "high": rh_high},
+        "CO2": {
+            "dist": "lognormal",
+            "median": absorber_vmr_mod["CO2"],
+            "sigma": co2_sigma,
+        },
+        "Tstrat": {"dist": "normal", "mean": tstrat_mean, "std": tstrat_std},
+    }
+    try:
+        run_id = start_ensemble(
+            distributions,
+            size,
+            absorber_vmr_mod,
+            SST=rrtm_options[selectors["surface_temperature"].id]["value"],
+            qStrat=model_settings["qStrat"],
+            num_lev=model_settings["num_lev"],
+        )
+    except OverloadedError as err:
+        return dash.no_update, dash.no_update, str(err)
+    return run_id, False, ""
+
+
+def make_ensemble_band_figure(status):
+    fig = make_subplots(
+        rows=len(ENSEMBLE_QUANTITIES),
+        cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.05,
+    )
+    history = status["history"]
+    members = [h["members"] for h in history]
+    for row, name in enumerate(ENSEMBLE_QUANTITIES, start=1):
+        percentiles = np.array([h[name]["percentiles"] for h in history]).reshape(
+            len(history), len(ENSEMBLE_PERCENTILES)
+        )
+        # Outer bands first, filled towards the previous trace
+        for outer, opacity in ((0, 0.2), (1, 0.4)):
+            inner = len(ENSEMBLE_PERCENTILES) - 1 - outer
+            fig.add_trace(
+                go.Scatter(
+                    x=members,
+                    y=percentiles[:, inner],
+                    mode="lines",
+                    line=dict(width=0, color="steelblue"),
+                    showlegend=False,
+                    hoverinfo="skip",
+                ),
+                row=row,
+                col=1,
+            )
+            fig.add_trace(
+                go.Scatter(
+                    x=members,
+                    y=percentiles[:, outer],
+                    mode="lines",
+                    line=dict(width=0, color="steelblue"),
+                    fill="tonexty",
+                    fillcolor=f"rgba(70, 130, 180, {opacity})",
+                    name=(
+                        f"{ENSEMBLE_PERCENTILES[outer]:.0%}–"
+                        f"{ENSEMBLE_PERCENTILES[inner]:.0%}"
+                    ),
+                    showlegend=row == 1,
+                ),
+                row=row,
+                col=1,
+            )
+        fig.add_trace(
+            go.Scatter(
+                x=members,
+                y=percentiles[:, len(ENSEMBLE_PERCENTILES) // 2],
+                mode="lines",
+                line=dict(color="steelblue"),
+                name="Median",
+                showlegend=row == 1,
+            ),
+            row=row,
+            col=1,
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=members,
+                y=[h[name]["mean"] for h in history],
+                mode="lines",
+                line=dict(color="firebrick", dash="dash"),
+                name="Mean",
+                showlegend=row == 1,
+            ),
+            row=row,
+            col=1,
+        )
+        fig.update_yaxes(title_text=ensemble_labels[name], row=row, col=1)
+    fig.update_xaxes(title_text="Members", row=len(ENSEMBLE_QUANTITIES), col=1)
+    fig.update_layout(height=700, title="Ensemble Percentiles")
+    return fig
+
+
+def make_ensemble_histogram_figure(status):
+    fig = make_subplots(
+        rows=1,
+        cols=len(ENSEMBLE_QUANTITIES),
+        subplot_titles=[ensemble_labels[name] for name in ENSEMBLE_QUANTITIES],
+    )
+    for col, name in enumerate(ENSEMBLE_QUANTITIES, start=1):
+        histogram = status["quantities"][name]["histogram"]
+        edges = np.array(histogram["edges"])
+        fig.add_trace(
+            go.Bar(
+                x=(edges[:-1] + edges[1:]) / 2,
+                y=histogram["counts"],
+                width=np.diff(edges),
+                marker_color="steelblue",
+                showlegend=False,
+            ),
+            row=1,
+            col=col,
+        )
+    fig.update_layout(height=300, bargap=0)
+    return fig
+
+
+@callback(
+    Output(id_func("ensemble-bands"), "figure"),
+    Output(id_func("ensemble-histograms"), "figure"),
+    Output(id_func("ensemble-progress"), "children"),
+    Output(id_func("ensemble-interval"), "disabled", allow_duplicate=True),
+    Input(id_func("ensemble-interval"), "n_intervals"),
+    State(id_func("ensemble-run"), "data"),
+    prevent_initial_call=True,
+)
+def poll_ensemble(n_intervals, run_id):
+    if run_id is None:
+        raise PreventUpdate
+    try:
+        status = ensemble_status(run_id)
+    except KeyError:
+        return dash.no_update, dash.no_update, "The ensemble is not available.", True
+
+    progress = f"{status['members']} / {status['size']} members"
+    missing = status["quantities"]["Ts"]["missing"]
+    if missing:
+        progress += f" ({missing} without equilibrium)"
+    if status["error"]:
+        progress += f" – stopped: {status['error']}"
+    if not status["history"]:
+        return dash.no_update, dash.no_update, progress, status["finished"]
+
+    return (
+        make_ensemble_band_figure(status),
+        make_ensemble_histogram_figure(status),
+        progress,
+        status["finished"],
+    )
+
+
+# Callback to run a concentration scenario and plot it as time series
+@callback(
+    Output(id_func("scenario-graph"), "figure"),
+    Output(id_func("scenario-status"), "children"),
+    Output(id_func("scenario-retry"), "disabled"),
+    Input(id_func("run-scenario"), "n_clicks"),
+    Input(id_func("scenario-retry"), "n_intervals"),
+    State(id_func("scenario-start-year"), "value"),
+    State(id_func("scenario-end-year"), "value"),
+    State(id_func("scenario-co2-start"), "value"),
+    State(id_func("scenario-co2-end"), "value"),
+    State(id_func("scenario-ch4-start"), "value"),
+    State(id_func("scenario-ch4-end"), "value"),
+    State(id_func("scenario-shape"), "value"),
+    State(id_func("scenario-tolerance"), "value"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def run_scenario_callback(
+    n_clicks,
+    n_intervals,
+    start_year,
+    end_year,
+    co2_start,
+    co2_end,
+    ch4_start,
+    ch4_end,
+    shape,
+    tolerance,
+    rrtm_options,
+):
+    if start_year is None or end_year is None or end_year <= start_year:
+        raise PreventUpdate
+
+    years = np.arange(int(start_year), int(end_year) + 1)
+    concentrations = {
+        "CO2": make_trajectory(years, co2_start, co2_end, shape) / 1e6,
+        "CH4": make_trajectory(years, ch4_start, ch4_end, shape) / 1e6,
+    }
+    try:
+        scenario = run_scenario(
+            years,
+            concentrations,
+            absorber_vmr,
+            SST=rrtm_options[selectors["surface_temperature"].id]["value"],
+            rel_humidity=rrtm_options[selectors["rel_humidity"].id]["value"],
+            Tstrat=model_settings["Tstrat"],
+            tolerance=tolerance or 0.0,
+            deadline=time.monotonic(),
+        )
+    except ModelTimeoutError:
+        return dash.no_update, RUNNING_MESSAGE, False
+    except OverloadedError as err:
+        return dash.no_update, str(err), True
+
+    key_steps = scenario["key_steps"]
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.05)
+    for gas, values in concentrations.items():
+        fig.add_trace(
+            go.Scatter(x=years, y=values * 1e6, mode="lines", name=f"{gas} (ppm)"),
+            row=1,
+            col=1,
+        )
+    for name, label, row in (
+        ("OLR", "OLR", 2),
+        ("net_flux", "Net Flux", 2),
+        ("Ts", "Equilibrium Ts", 3),
+    ):
+        values = np.array(scenario[name])
+        fig.add_trace(
+            go.Scatter(x=years, y=values, mode="lines", name=label), row=row, col=1
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=years[key_steps],
+                y=values[key_steps],
+                mode="markers",
+                marker=dict(size=4, color="black"),
+                name="Evaluated steps",
+                showlegend=name == "OLR",
+            ),
+            row=row,
+            col=1,
+        )
+    fig.update_yaxes(title_text="Concentration (ppm)", type="log", row=1, col=1)
+    fig.update_yaxes(title_text="Flux (W/m²)", row=2, col=1)
+    fig.update_yaxes(title_text="Temperature (K)", row=3, col=1)
+    fig.update_xaxes(title_text="Year", row=3, col=1)
+    fig.update_layout(
+        height=800,
+        title=f"Scenario ({len(key_steps)} of {len(years)} steps evaluated)",
+    )
+    return fig, "", True
+
+
+# Callback to run all the latitudes and draw the latitude-altitude figures
+def make_latitude_section(lat, altitude, values, title, yaxis):
+    return go.Figure(
+        go.Heatmap(
+            x=lat,
+            y=altitude,
+            z=np.asarray(values).T,
+            colorscale="RdBu_r",
+            colorbar=dict(title="K"),
+        ),
+        layout=go.Layout(
+            title=title,
+            xaxis=dict(title="Latitude (°)"),
+            yaxis=yaxis,
+        ),
+    )
+
+
+@callback(
+    Output(id_func("latitude-fluxes"), "figure"),
+    Output(id_func("latitude-temperatures"), "figure"),
+    Output(id_func("latitude-tatm"), "figure"),
+    Output(id_func("latitude-tatm-eq"), "figure"),
+    Output(id_func("latitudes-status"), "children"),
+    Output(id_func("latitudes-retry"), "disabled"),
+    Input(id_func("run-latitudes"), "n_clicks"),
+    Input(id_func("latitudes-retry"), "n_intervals"),
+    State(id_func("latitude-sst-equator"), "value"),
+    State(id_func("latitude-sst-pole"), "value"),
+    State(id_func("latitude-num-lat"), "value"),
+    State(id_func("rrtm_options"), "data"),
+    prevent_initial_call=True,
+)
+def run_latitudes_callback(
+    n_clicks, n_intervals, sst_equator, sst_pole, num_lat, rrtm_options
+):
+    absorber_vmr_mod = absorber_vmr.copy()
+    absorber_vmr_mod["CO2"] = (
+        rrtm_options[selectors["co2_concentration"].id]["value"] / 1e6
+    )
+    absorber_vmr_mod["CH4"] = (
+        rrtm_options[selectors["ch4_concentration"].id]["value"] / 1e6
+    )
+
+    try:
+        profiles = run_latitudes(
+            absorber_vmr_mod,
+            SST_equator=sst_equator,
+            SST_pole=sst_pole,
+            RH=rrtm_options[selectors["rel_humidity"].id]["value"],
+            num_lat=int(num_lat),
+            deadline=time.monotonic(),
+            **model_settings,
+        )
+    except ModelTimeoutError:
+        return (dash.no_update,) * 4 + (RUNNING_MESSAGE, False)
+    except OverloadedError as err:
+        return (dash.no_update,) * 4 + (str(err), True)
+    lat = profiles["lat"]
+    result = profiles["result"]
+    grid = result.grid
+
+    fig_fluxes = go.Figure(
+        [
+            go.Scatter(x=lat, y=profiles["insolation"], name="Insolation"),
+            go.Scatter(x=lat, y=result.ASR, name="ASR"),
+            go.Scatter(x=lat, y=result.OLR, name="OLR"),
+        ],
+        layout=go.Layout(
+            title="Radiation at the SST",
+            xaxis=dict(title="Latitude (°)"),
+            yaxis=dict(title="Flux (W/m²)"),
+        ),
+    )
+    fig_temperatures = go.Figure(
+        [
+            go.Scatter(x=lat, y=profiles["SST"], name="SST"),
+            go.Scatter(
+                x=lat, y=profiles["Ts_equilibrium"], name="Local Equilibrium Ts"
+            ),
+        ],
+        layout=go.Layout(
+            title="Surface Temperature",
+            xaxis=dict(title="Latitude (°)"),
+            yaxis=dict(title="Temperature (K)"),
+        ),
+    )
+    fig_tatm = make_latitude_section(
+        lat, grid.altitude, result.Tatm, "Temperature at the SST", grid.yaxis
+    )
+    fig_tatm_eq = make_latitude_section(
+        lat,
+        grid.altitude,
+        profiles["Tatm_equilibrium"],
+        "Equilibrium Temperature",
+        grid.yaxis,
+    )
+    return fig_fluxes, fig_temperatures, fig_tatm, fig_tatm_eq, "", True